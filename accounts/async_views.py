@@ -0,0 +1,32 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.shortcuts import aget_object_or_404
+
+from social_media.async_views import AsyncAPIView, json_response
+from . import services
+
+# Async version of FollowView, served under /accounts/async/. Same responses as views.py.
+
+
+class AsyncFollowView(AsyncAPIView):
+    """
+    The user lookup is async. The follow itself is services.follow_user /
+    unfollow_user in one sync_to_async call, because the Follow row, the timeline and
+    the suggestions change in one transaction and Django has no async transactions.
+    That call runs in the thread sensitive executor, so like and follow writes of a
+    process run one at a time. This endpoint is no faster than FollowView.
+    """
+
+    async def post(self, request, username):
+        following_instance = await aget_object_or_404(User, username=username, is_active=True)
+        if following_instance == request.user:
+            return json_response({'detail': "You can't follow yourself!"}, status=400)
+        if await sync_to_async(services.follow_user)(request.user, following_instance):
+            return json_response({'detail': f'{following_instance} followed!'}, status=202)
+        return json_response({'detail': f'{following_instance} is already in following.'}, status=200)
+
+    async def delete(self, request, username):
+        following_instance = await aget_object_or_404(User, username=username, is_active=True)
+        if await sync_to_async(services.unfollow_user)(request.user, following_instance):
+            return json_response({'detail': f'{following_instance} unfollowed!'}, status=200)
+        return json_response({'detail': f'You were not following {following_instance}!'}, status=404)
@@ -0,0 +1,206 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+DEFAULT_TOKEN_AUTH_CACHE = {
+    'CACHE_ALIAS': 'shared',
+    'TIMEOUT': 300,
+    'LOCAL_MAXSIZE': 1024,
+    'LOCAL_TIMEOUT': 30,
+}
+
+
+def get_config():
+    return {**DEFAULT_TOKEN_AUTH_CACHE, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+class LocalTTLCache:
+    """A small thread-safe LRU with a per-entry time to live."""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_cache = None
+
+
+def get_local_cache():
+    global _local_cache
+    if _local_cache is None:
+        config = get_config()
+        _local_cache = LocalTTLCache(config['LOCAL_MAXSIZE'], config['LOCAL_TIMEOUT'])
+    return _local_cache
+
+
+def get_shared_cache():
+    return caches[get_config()['CACHE_ALIAS']]
+
+
+def token_cache_key(key):
+    # never put the raw token in a cache key
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def version_key(cache_key):
+    return cache_key + ':version'
+
+
+def _version(shared_cache, key, found):
+    version = found.get(key)
+    if version is None:
+        shared_cache.add(key, time.time_ns(), None)
+        version = shared_cache.get(key)
+    return version
+
+
+async def _aversion(shared_cache, key, found):
+    version = found.get(key)
+    if version is None:
+        await shared_cache.aadd(key, time.time_ns(), None)
+        version = await shared_cache.aget(key)
+    return version
+
+
+def _entry(token, version):
+    # plain values, no password hash: the password stays deferred on the rebuilt user
+    user_fields = {field.attname: getattr(token.user, field.attname)
+                   for field in get_user_model()._meta.concrete_fields if field.attname != 'password'}
+    return user_fields, (token.key, token.created), version
+
+
+def _restore(entry):
+    # new instances for every request, one request can't mutate what another one gets
+    user_fields, (key, created) = entry[0], entry[1]
+    user = get_user_model().from_db(DEFAULT_DB_ALIAS, list(user_fields), list(user_fields.values()))
+    token = Token.from_db(DEFAULT_DB_ALIAS, ['key', 'user_id', 'created'], [key, user.pk, created])
+    token.user = user
+    return user, token
+
+
+def evict_token(key):
+    cache_key = token_cache_key(key)
+    shared_cache = get_shared_cache()
+    # a new version retires the copies in every process, and the one a concurrent
+    # request that read the old row may still be about to store
+    try:
+        shared_cache.incr(version_key(cache_key))
+    except ValueError:
+        shared_cache.set(version_key(cache_key), time.time_ns(), None)
+    shared_cache.delete(cache_key)
+    get_local_cache().delete(cache_key)
+
+
+def evict_user_tokens(user):
+    """Evict the user's tokens once the current transaction commits, call it with the write."""
+    keys = list(Token.objects.filter(user=user).values_list('key', flat=True))
+    transaction.on_commit(lambda: [evict_token(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication with a two tier cache in front of the Token + User lookup.
+
+    Every entry carries the version its token had in the shared cache when the row
+    was read, and is only used while that is still the current version: a hit costs
+    one cache round trip (the version, plus the entry on a local miss) and only a
+    miss touches the database. Logout, password change, profile updates and account
+    deletion bump the version once their write commits (evict_user_tokens), which
+    retires the copies in every process at once.
+
+    Entries hold the user's field values without the password hash, not pickled
+    model instances; reading user.password (e.g. to check the old password) loads
+    it from the database.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        shared_cache = get_shared_cache()
+        local_cache = get_local_cache()
+        cached = local_cache.get(cache_key)
+        # the version is read before the row, so a row read before an eviction is stored under the old one
+        found = shared_cache.get_many([version_key(cache_key)] if cached else [cache_key, version_key(cache_key)])
+        version = _version(shared_cache, version_key(cache_key), found)
+        if cached is None or cached[2] != version:
+            cached = found.get(cache_key)
+            if cached is None or cached[2] != version:
+                # raises AuthenticationFailed for unknown keys and inactive users, those are never cached
+                cached = _entry(super().authenticate_credentials(key)[1], version)
+                shared_cache.set(cache_key, cached, get_config()['TIMEOUT'])
+            local_cache.set(cache_key, cached)
+        return _restore(cached)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views, works on a plain Django HttpRequest."""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. Token string should not contain invalid characters.'))
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        shared_cache = get_shared_cache()
+        local_cache = get_local_cache()
+        cached = local_cache.get(cache_key)
+        found = await shared_cache.aget_many(
+            [version_key(cache_key)] if cached else [cache_key, version_key(cache_key)])
+        version = await _aversion(shared_cache, version_key(cache_key), found)
+        if cached is None or cached[2] != version:
+            cached = found.get(cache_key)
+            if cached is None or cached[2] != version:
+                try:
+                    token = await self.get_model().objects.select_related('user').aget(key=key)
+                except self.get_model().DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                if not token.user.is_active:
+                    raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+                cached = _entry(token, version)
+                await shared_cache.aset(cache_key, cached, get_config()['TIMEOUT'])
+            local_cache.set(cache_key, cached)
+        return _restore(cached)
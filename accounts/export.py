@@ -0,0 +1,43 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from post.models import Post, Comment, Like
+from .models import Follow
+
+# Account data export as NDJSON, one JSON object per line with a "type" key.
+# Every table is walked with iterator(chunk_size), so rows are fetched in chunks
+# from a server-side cursor where the database has them and only one chunk is
+# in memory at a time, whatever the size of the account.
+
+DEFAULT_CHUNK_SIZE = 1000
+CONTENT_TYPE = 'application/x-ndjson'
+
+
+def _sections(user):
+    yield 'post', Post.objects.filter(user=user).values('id', 'title', 'content', 'created', 'updated')
+    yield 'comment', Comment.objects.filter(user=user).values('id', 'post_id', 'parent_id', 'content', 'created')
+    yield 'like', Like.objects.filter(user=user).values('post_id', 'created')
+    yield 'following', Follow.objects.filter(follower=user).values('following_id', username=F('following__username'))
+    yield 'follower', Follow.objects.filter(following=user).values('follower_id', username=F('follower__username'))
+
+
+def export_records(user, chunk_size=DEFAULT_CHUNK_SIZE):
+    yield {'type': 'user', 'id': user.pk, 'username': user.username, 'email': user.email,
+           'first_name': user.first_name, 'last_name': user.last_name, 'date_joined': user.date_joined}
+    for record_type, rows in _sections(user):
+        for row in rows.order_by('pk').iterator(chunk_size=chunk_size):
+            yield {'type': record_type, **row}
+
+
+def export_lines(user, chunk_size=DEFAULT_CHUNK_SIZE):
+    """NDJSON of the user's data, one string of up to chunk_size lines at a time."""
+    lines = []
+    for record in export_records(user, chunk_size):
+        lines.append(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+        if len(lines) == chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
@@ -0,0 +1,192 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .authentication import LocalTTLCache
+from .models import Follow
+
+DEFAULT_FOLLOW_GRAPH = {
+    # the versions, shared by every worker process
+    'CACHE_ALIAS': 'shared',
+    'MAXSIZE': 10000,
+    'TIMEOUT': 300,
+}
+
+
+def get_config():
+    return {**DEFAULT_FOLLOW_GRAPH, **getattr(settings, 'FOLLOW_GRAPH', {})}
+
+
+FOLLOWERS, FOLLOWING = 'followers', 'following'
+
+# direction -> (column of the cached user, column of the ids, the ids' active flag)
+DIRECTIONS = {
+    FOLLOWERS: ('following_id', 'follower_id', 'follower__is_active'),
+    FOLLOWING: ('follower_id', 'following_id', 'following__is_active'),
+}
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def _added(ids, value):
+    index = bisect_left(ids, value)
+    if index < len(ids) and ids[index] == value:
+        return ids
+    return ids[:index] + array('q', [value]) + ids[index:]
+
+
+def _removed(ids, value):
+    index = bisect_left(ids, value)
+    if index == len(ids) or ids[index] != value:
+        return ids
+    return ids[:index] + ids[index + 1:]
+
+
+class Adjacency:
+    """The follower or the following ids of one user as a sorted 64-bit int array (8 bytes per edge)."""
+
+    __slots__ = ('version', 'ids')
+
+    def __init__(self, version, ids):
+        self.version = version
+        self.ids = ids
+
+
+class FollowGraph:
+    """
+    In-process cache of the follow graph: the followers and the following of a
+    user are loaded lazily and separately, one query per direction for any
+    number of users, and kept up to date by follow/unfollow in this process.
+    Deactivated accounts are left out.
+
+    Every user has a version in the shared cache, bumped on each change to their
+    edges. A cached array is only used while its version matches, so a follow
+    made by another worker process is seen on the next request here (one cache
+    round trip, no SQL); LRU size and TTL bound the memory. Arrays are never
+    changed in place, a caller iterating one keeps a consistent snapshot.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self._local = LocalTTLCache(maxsize, timeout)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _shared():
+        return caches[get_config()['CACHE_ALIAS']]
+
+    @staticmethod
+    def _version_key(user_id):
+        return f'follow-graph:{user_id}'
+
+    def _get_versions(self, user_ids):
+        shared = self._shared()
+        keys = {user_id: self._version_key(user_id) for user_id in user_ids}
+        found = shared.get_many(list(keys.values()))
+        versions = {}
+        for user_id, key in keys.items():
+            if key not in found:
+                shared.add(key, time.time_ns(), None)
+                found[key] = shared.get(key)
+            versions[user_id] = found[key]
+        return versions
+
+    def get_many(self, user_ids, direction):
+        """{user_id: sorted array of the follower (or following) ids} for FOLLOWERS or FOLLOWING."""
+        user_ids = set(user_ids)
+        versions = self._get_versions(user_ids)
+        result, missing = {}, []
+        for user_id in user_ids:
+            adjacency = self._local.get((user_id, direction))
+            if adjacency is not None and adjacency.version == versions[user_id]:
+                result[user_id] = adjacency.ids
+            else:
+                missing.append(user_id)
+        if missing:
+            key_column, ids_column, active = DIRECTIONS[direction]
+            ids = {user_id: [] for user_id in missing}
+            # the versions were read before this query, a change committed meanwhile makes them stale again
+            edges = Follow.objects.filter(**{f'{key_column}__in': missing, active: True})
+            for user_id, other_id in edges.values_list(key_column, ids_column):
+                ids[user_id].append(other_id)
+            for user_id in missing:
+                result[user_id] = array('q', sorted(ids[user_id]))
+                self._local.set((user_id, direction), Adjacency(versions[user_id], result[user_id]))
+        return result
+
+    def followers(self, user_id):
+        return self.get_many([user_id], FOLLOWERS)[user_id]
+
+    def following(self, user_id):
+        return self.get_many([user_id], FOLLOWING)[user_id]
+
+    def is_following(self, follower_id, following_id):
+        return _contains(self.following(follower_id), following_id)
+
+    def _bump(self, user_id):
+        shared = self._shared()
+        key = self._version_key(user_id)
+        try:
+            return shared.incr(key)
+        except ValueError:
+            shared.set(key, time.time_ns(), None)
+            return None
+
+    def _apply(self, follower_id, following_id, change):
+        with self._lock:
+            for user_id, direction, other_id in ((follower_id, FOLLOWING, following_id),
+                                                 (following_id, FOLLOWERS, follower_id)):
+                version = self._bump(user_id)
+                for cached in (FOLLOWERS, FOLLOWING):
+                    adjacency = self._local.get((user_id, cached))
+                    if adjacency is None:
+                        continue
+                    if version is not None and adjacency.version == version - 1:
+                        # nobody else changed this user meanwhile, a patched copy replaces the array
+                        ids = change(adjacency.ids, other_id) if cached == direction else adjacency.ids
+                        self._local.set((user_id, cached), Adjacency(version, ids))
+                    else:
+                        self._local.delete((user_id, cached))
+
+    def followed(self, follower_id, following_id):
+        self._apply(follower_id, following_id, _added)
+
+    def unfollowed(self, follower_id, following_id):
+        self._apply(follower_id, following_id, _removed)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._bump(user_id)
+                for direction in (FOLLOWERS, FOLLOWING):
+                    self._local.delete((user_id, direction))
+
+    def clear(self):
+        self._local.clear()
+
+
+_graph = None
+
+
+def get_follow_graph():
+    global _graph
+    if _graph is None:
+        config = get_config()
+        _graph = FollowGraph(config['MAXSIZE'], config['TIMEOUT'])
+    return _graph
+
+
+def on_follow(follower_id, following_id):
+    # after commit, a rolled back follow must not reach the cache
+    transaction.on_commit(lambda: get_follow_graph().followed(follower_id, following_id))
+
+
+def on_unfollow(follower_id, following_id):
+    transaction.on_commit(lambda: get_follow_graph().unfollowed(follower_id, following_id))
@@ -13,3 +13,31 @@ class Follow(models.Model):
         return str(self.follower) + " is following " + str(self.following)
     class Meta:
         unique_together = (('follower', 'following'),)
+
+
+class FollowSuggestion(models.Model):
+    # precomputed "who to follow" row, see accounts/suggestions.py
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # number of accounts the user follows that follow `suggested`
+    score = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (('user', 'suggested'),)
+        indexes = [
+            models.Index(fields=['user', '-score', 'suggested']),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested_id} suggested to {self.user_id} ({self.score})"
+
+
+class FollowSuggestionRefresh(models.Model):
+    # `user` followed or unfollowed someone: their suggestions and their followers' are stale,
+    # recomputed by `compute_follow_suggestions --pending`, see accounts/suggestions.py
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"suggestions of {self.user_id} and their followers are stale"
@@ -1,7 +1,10 @@
 from django.contrib.auth.models import User
-from .models import Follow
+from .models import Follow, FollowSuggestion
+from .viewer import ViewerListSerializer, get_viewer
 from rest_framework import serializers
 
+from social_media.sparse_fields import SparseFieldsMixin
+
 
 class UserCreateSerializer(serializers.ModelSerializer):
     confirm_password = serializers.CharField(write_only=True)
@@ -29,7 +32,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     is_following = serializers.SerializerMethodField()
     is_follower = serializers.SerializerMethodField()
     is_me = serializers.SerializerMethodField()
@@ -38,6 +41,10 @@ class ProfileSerializer(serializers.ModelSerializer):
         # fields = '__all__'
         fields = ('username', 'first_name', 'last_name', 'email', 'is_following', 'is_follower', 'is_me')
         read_only_fields = ('is_following', 'is_follower', 'is_me')
+        list_serializer_class = ViewerListSerializer
+
+    def prime_viewer(self, viewer, users):
+        viewer.prime_users(users, following='is_following' in self.fields, followers='is_follower' in self.fields)
 
     def get_is_me(self, obj):
         request = self.context.get('request')
@@ -47,13 +54,13 @@ class ProfileSerializer(serializers.ModelSerializer):
     def get_is_following(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated and request.user != obj :
-            return obj.following.filter(follower=request.user).exists()
+            return get_viewer(self.context).is_following(obj)
         return False
 
     def get_is_follower(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated and request.user != obj :
-            return obj.follower.filter(following=request.user).exists()
+            return get_viewer(self.context).is_follower(obj)
         return False
 
 
@@ -79,17 +86,31 @@ class ChangePasswordSerializer(serializers.Serializer):
         user.save()
         return user
 
-class FollowerSerializer(serializers.ModelSerializer):
+class FollowerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     follower = serializers.SlugRelatedField(slug_field='username', read_only=True)
 
     class Meta:
         model = Follow
         fields = ('follower',)
+        expandable_fields = {'follower': ProfileSerializer}
+        list_serializer_class = ViewerListSerializer
 
 
 
-class FollowingSerializer(serializers.ModelSerializer):
+class FollowingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     following = serializers.SlugRelatedField(slug_field='username', read_only=True)
     class Meta:
         model = Follow
         fields = ('following',)
+        expandable_fields = {'following': ProfileSerializer}
+        list_serializer_class = ViewerListSerializer
+
+
+
+class FollowSuggestionSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='suggested.username', read_only=True)
+    mutual_count = serializers.IntegerField(source='score', read_only=True)
+
+    class Meta:
+        model = FollowSuggestion
+        fields = ('username', 'mutual_count')
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from post import cache, deletion
+from post.models import Comment, DeletionJob, Post
+from post.timeline import get_timeline_store
+from social_media.db import insert_ignore
+from .authentication import evict_user_tokens
+from .graph import get_follow_graph, on_follow, on_unfollow
+from .models import Follow, FollowSuggestionRefresh
+from .suggestions import on_follow_change
+
+# Write paths for the follow graph and profiles, shared by the sync and async views.
+# The timeline and suggestion changes happen in the same transaction as the Follow
+# row, the follow graph cache (graph.py) is patched once it commits.
+
+
+def follow_user(follower, following):
+    """Returns True when this call created the follow."""
+    with transaction.atomic():
+        created = insert_ignore(Follow, follower=follower, following=following)
+        if created:
+            get_timeline_store().follow(follower, following)
+            on_follow_change(follower.pk, following.pk, 1)
+            on_follow(follower.pk, following.pk)
+    return created
+
+
+def unfollow_user(follower, following):
+    """Returns True when this call removed the follow."""
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(follower=follower, following=following).delete()
+        if deleted:
+            get_timeline_store().unfollow(follower, following)
+            on_follow_change(follower.pk, following.pk, -1)
+            on_unfollow(follower.pk, following.pk)
+    return bool(deleted)
+
+
+def update_profile(serializer):
+    with transaction.atomic():
+        user = serializer.save()
+        evict_user_tokens(user)
+    # cached posts and comments show the username
+    cache.bump(cache.users_resource())
+    return user
+
+
+def delete_user(user):
+    # the account is deactivated (so it can't sign in and its profile is gone) and its posts and
+    # comments are marked deleted, which hides them from the default managers; its rows, follows
+    # and likes included, are removed in batches by the deletion job (post/deletion.py), whose
+    # first phase retires the account from the cached graph of everyone it followed or was
+    # followed by; the suggestions of its followers are recomputed without it
+    with transaction.atomic():
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        Post.all_objects.filter(user=user).update(is_deleted=True)
+        Comment.all_objects.filter(user=user).update(is_deleted=True)
+        deletion.schedule(DeletionJob.USER, user.pk)
+        evict_user_tokens(user)
+        FollowSuggestionRefresh.objects.create(user=user)
+        transaction.on_commit(lambda: get_follow_graph().invalidate(user.pk))
+    user.is_active = False
+    # every cached page that shows one of its posts, comments or its name
+    cache.bump(cache.users_resource())
@@ -0,0 +1,108 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from .graph import FOLLOWING, get_follow_graph
+from .models import Follow, FollowSuggestion, FollowSuggestionRefresh
+
+# "Who to follow": accounts followed by the accounts you follow, ranked by how many
+# of them do (the mutual connections). The top LIMIT rows per user are precomputed in
+# FollowSuggestion - in bulk by the compute_follow_suggestions command, and with
+# --pending for the users a follow/unfollow queued since - so serving them is one
+# indexed query.
+#
+# An account that follows more than HIGH_DEGREE_CAP others says little about any
+# one of them and would make the computation quadratic, it contributes nothing.
+
+DEFAULT_FOLLOW_SUGGESTIONS = {
+    'LIMIT': 50,
+    'HIGH_DEGREE_CAP': 1000,
+    'BATCH_SIZE': 500,
+}
+
+
+def get_config():
+    return {**DEFAULT_FOLLOW_SUGGESTIONS, **getattr(settings, 'FOLLOW_SUGGESTIONS', {})}
+
+
+def rank_candidates(user_id, following, following_of, limit, cap):
+    """
+    Pure ranking used by both the batch job and refresh_user: `following` are the ids
+    the user follows, `following_of` maps each of them to the ids they follow.
+    Returns [(suggested_id, score)], best first.
+    """
+    exclude = set(following)
+    exclude.add(user_id)
+    counts = Counter()
+    for middle_id in following:
+        theirs = following_of.get(middle_id, ())
+        if len(theirs) > cap:
+            continue
+        counts.update(candidate for candidate in theirs if candidate not in exclude)
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def store(rows_by_user, batch_size=500):
+    """Replace the suggestions of every user in `rows_by_user` ({user_id: [(suggested_id, score)]})."""
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__in=list(rows_by_user)).delete()
+        FollowSuggestion.objects.bulk_create(
+            [FollowSuggestion(user_id=user_id, suggested_id=suggested_id, score=score)
+             for user_id, rows in rows_by_user.items() for suggested_id, score in rows],
+            batch_size=batch_size,
+        )
+
+
+def rank_users(user_ids, config):
+    """{user_id: [(suggested_id, score)]} from the follow graph, two queries for any number of users."""
+    graph = get_follow_graph()
+    following = graph.get_many(user_ids, FOLLOWING)
+    following_of = graph.get_many({pk for ids in following.values() for pk in ids}, FOLLOWING)
+    return {user_id: rank_candidates(user_id, ids, following_of, config['LIMIT'], config['HIGH_DEGREE_CAP'])
+            for user_id, ids in following.items()}
+
+
+def refresh_user(user_id):
+    config = get_config()
+    rows = rank_users([user_id], config)[user_id]
+    store({user_id: rows}, config['BATCH_SIZE'])
+    return rows
+
+
+def on_follow_change(follower_id, following_id, delta):
+    """
+    Inside the transaction of a follow (+1) or unfollow (-1): A follows B changes the
+    candidates of A and the score of B for everyone who follows A, which would be
+    O(followers of A) row writes. A is queued instead, refresh_pending recomputes A
+    and A's followers in the background. Only the (A, B) row goes right away, nobody
+    is suggested an account they already follow.
+    """
+    if delta > 0:
+        FollowSuggestion.objects.filter(user_id=follower_id, suggested_id=following_id).delete()
+    FollowSuggestionRefresh.objects.create(user_id=follower_id)
+
+
+def refresh_pending(limit=None):
+    """
+    Recompute the suggestions queued by on_follow_change, the oldest `limit` (BATCH_SIZE)
+    queued rows per call. Returns the number of users refreshed, 0 when the queue is empty.
+    """
+    config = get_config()
+    batch_size = config['BATCH_SIZE']
+    queued = list(FollowSuggestionRefresh.objects.order_by('id').values_list('pk', 'user_id')[:limit or batch_size])
+    if not queued:
+        return 0
+    changed = {user_id for _, user_id in queued}
+    followers = Follow.objects.filter(following_id__in=changed, follower__is_active=True)
+    user_ids = sorted(changed | set(followers.values_list('follower_id', flat=True)))
+    for start in range(0, len(user_ids), batch_size):
+        store(rank_users(user_ids[start:start + batch_size], config), batch_size)
+    # by primary key: a follow queued while this ran keeps its row for the next call
+    FollowSuggestionRefresh.objects.filter(pk__in=[pk for pk, _ in queued]).delete()
+    return len(user_ids)
+
+
+def get_suggestions(user, limit):
+    return (FollowSuggestion.objects.filter(user=user, suggested__is_active=True).select_related('suggested')
+            .order_by('-score', 'suggested_id')[:limit])
@@ -1,3 +1,363 @@
-from django.test import TestCase
+import json
+import random
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.db.models import Count
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from post.models import Comment, Like, Post, TimelineEntry
+from social_media.testing import APITestCase, APITransactionTestCase, reset_caches, run_concurrently, strict_budgets
+from . import export
+from .authentication import evict_token, get_shared_cache, token_cache_key, version_key
+from .graph import get_follow_graph
+from .models import Follow, FollowSuggestion, FollowSuggestionRefresh
+from .suggestions import refresh_pending
+from .viewer import ViewerContext
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice', password='old-pass-123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_after_the_first_request(self):
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+
+    def test_unknown_and_inactive_tokens_are_rejected(self):
+        urls = [reverse('profile'), reverse('async-follow', args=['alice'])]
+        self.client.credentials(HTTP_AUTHORIZATION='Token unknown')
+        self.assertEqual([self.client.post(url).status_code for url in urls], [401, 401])
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual([self.client.post(url).json()['detail'] for url in urls], ['User inactive or deleted.'] * 2)
+
+    def test_logout_revokes_the_cached_token(self):
+        self.client.get(reverse('profile'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+    def test_rolled_back_logout_keeps_the_token(self):
+        self.client.get(reverse('profile'))
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            self.client.post(reverse('logout'))
+            1 / 0
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+        self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+
+    def test_eviction_waits_for_the_commit(self):
+        self.client.get(reverse('profile'))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('logout'))
+        # the token row is gone in this transaction, the cached copy until the commit
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+        callbacks[0]()
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+    def test_other_process_eviction_retires_the_local_copy(self):
+        self.client.get(reverse('profile'))
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        # what evict_token() in another worker leaves behind: a new version, this process' LRU untouched
+        get_shared_cache().incr(version_key(token_cache_key(self.token.key)))
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+    # the injected eviction's UPDATE runs inside the request, one query over the profile budget
+    @override_settings(QUERY_INSTRUMENTATION={**settings.QUERY_INSTRUMENTATION, 'BUDGETS': {'profile': {'GET': 2}}})
+    def test_row_read_before_an_eviction_is_not_served(self):
+        original = TokenAuthentication.authenticate_credentials
+
+        def concurrent_eviction(auth, key):
+            result = original(auth, key)
+            # the account is deactivated and evicted between this request's read and its cache write
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            evict_token(key)
+            return result
+
+        with mock.patch.object(TokenAuthentication, 'authenticate_credentials', concurrent_eviction):
+            self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+    def test_password_change_refreshes_the_cached_user(self):
+        self.client.get(reverse('profile'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('change_password'), {
+                'old_password': 'old-pass-123', 'new_password': 'new-pass-456', 'confirm_password': 'new-pass-456',
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-pass-456'))
+
+    def test_cache_holds_no_password_hash(self):
+        self.client.get(reverse('profile'))
+        cached = get_shared_cache().get(token_cache_key(self.token.key))
+        self.assertNotIn('password', cached[0])
+        self.assertNotIn(self.user.password, repr(cached))
+        # the profile is saved through the cached user, the deferred password is left alone
+        response = self.client.patch(reverse('profile'), {'first_name': 'Alice'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Alice')
+        self.assertTrue(self.user.check_password('old-pass-123'))
+
+
+
+class FollowGraphTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob, self.carol = (User.objects.create_user(name) for name in ('alice', 'bob', 'carol'))
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        Follow.objects.create(follower=self.carol, following=self.bob)
+        self.graph = get_follow_graph()
+
+    def follow(self, follower, username):
+        self.client.force_authenticate(follower)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('follow', args=[username]))
+
+    def test_directions_load_separately(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.graph.followers(self.bob.pk)), [self.alice.pk, self.carol.pk])
+        with self.assertNumQueries(0):
+            self.graph.followers(self.bob.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.graph.following(self.bob.pk)), [])
+
+    def test_a_follow_replaces_the_cached_array(self):
+        before = self.graph.following(self.alice.pk)
+        self.follow(self.alice, 'carol')
+        with self.assertNumQueries(0):
+            self.assertEqual(list(self.graph.following(self.alice.pk)), [self.bob.pk, self.carol.pk])
+        self.assertEqual(list(before), [self.bob.pk])
+
+    def test_other_process_change_retires_the_local_copy(self):
+        self.graph.following(self.alice.pk)
+        Follow.objects.create(follower=self.alice, following=self.carol)
+        # another worker followed and bumped the shared version
+        caches['shared'].incr(f'follow-graph:{self.alice.pk}')
+        self.assertEqual(list(self.graph.following(self.alice.pk)), [self.bob.pk, self.carol.pk])
+
+    def test_inactive_accounts_are_left_out(self):
+        User.objects.filter(pk=self.carol.pk).update(is_active=False)
+        self.assertEqual(list(self.graph.followers(self.bob.pk)), [self.alice.pk])
+        response = self.client.get(reverse('profile_follower', args=['bob']))
+        self.assertEqual(response.data['followers_count'], 1)
+
+    def test_viewer_flags(self):
+        Follow.objects.create(follower=self.bob, following=self.alice)
+        self.client.force_authenticate(self.alice)
+        response = self.client.get(reverse('profile_other', args=['bob']))
+        self.assertEqual((response.data['is_following'], response.data['is_follower']), (True, True))
+        response = self.client.get(reverse('profile_other', args=['carol']))
+        self.assertEqual((response.data['is_following'], response.data['is_follower']), (False, False))
+
+
+
+class ViewerContextTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user('alice')
+        self.posts = [Post.objects.create(user=self.alice, title=f'post {index}', content='content')
+                      for index in range(4)]
+        Like.objects.create(user=self.alice, post=self.posts[1])
+
+    def test_likes_of_a_page_in_one_query(self):
+        viewer = ViewerContext(self.alice)
+        with self.assertNumQueries(1):
+            viewer.prime_posts(self.posts)
+            self.assertEqual([viewer.is_liked(post) for post in self.posts], [False, True, False, False])
+
+    def test_anonymous_viewer_runs_no_queries(self):
+        viewer = ViewerContext(AnonymousUser())
+        with self.assertNumQueries(0):
+            viewer.prime_posts(self.posts)
+            self.assertFalse(viewer.is_liked(self.posts[1]))
+            self.assertFalse(viewer.is_following(self.alice))
+
+    def test_follow_flags_of_a_page_cost_one_query_per_direction(self):
+        def followers_page(count):
+            bob = User.objects.create_user(f'bob{count}')
+            for index in range(count):
+                fan = User.objects.create_user(f'fan{count}-{index}')
+                Follow.objects.create(follower=fan, following=bob)
+                if index % 2:
+                    Follow.objects.create(follower=self.alice, following=fan)
+            with self.assertNumQueries(5):
+                response = self.client.get(reverse('profile_follower', args=[bob.username]) + '?expand=follower')
+            return [follower['follower']['is_following'] for follower in response.data['followers']]
+
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(followers_page(2), [True, False])
+        self.assertEqual(followers_page(5), [False, True, False, True, False])
+
+class AccountExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = User.objects.create_user('alice'), User.objects.create_user('bob')
+        posts = [Post.objects.create(user=self.alice, title=f'post {index}', content='content') for index in range(3)]
+        other = Post.objects.create(user=self.bob, title='bob', content='content', comment_count=1)
+        Comment.objects.create(post=other, user=self.alice, content='comment')
+        Like.objects.create(user=self.alice, post=other)
+        Like.objects.create(user=self.bob, post=posts[0])
+        Follow.objects.create(follower=self.alice, following=self.bob)
+
+    def test_endpoint_streams_the_account(self):
+        self.client.force_authenticate(self.alice)
+        response = self.client.get(reverse('profile_export'))
+        self.assertEqual(response['Content-Type'], export.CONTENT_TYPE)
+        self.assertIn('alice.ndjson', response['Content-Disposition'])
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['type'] for record in records],
+                         ['user', 'post', 'post', 'post', 'comment', 'like', 'following'])
+        self.assertEqual(records[0]['username'], 'alice')
+        self.assertEqual(records[-1], {'type': 'following', 'following_id': self.bob.pk, 'username': 'bob'})
+
+    def test_chunks_hold_chunk_size_lines(self):
+        chunks = list(export.export_lines(self.alice, chunk_size=2))
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [2, 2, 2, 1])
+        self.assertEqual(''.join(chunks), ''.join(export.export_lines(self.alice)))
+
+    def test_command_writes_the_same_lines(self):
+        stdout = StringIO()
+        call_command('export_account_data', 'bob', '--chunk-size', '1', stdout=stdout)
+        self.assertEqual(stdout.getvalue(), ''.join(export.export_lines(self.bob)))
+        with self.assertRaises(CommandError):
+            call_command('export_account_data', 'nobody', stdout=StringIO())
+
+@override_settings(FOLLOW_SUGGESTIONS={'LIMIT': 3, 'HIGH_DEGREE_CAP': 1000, 'BATCH_SIZE': 4})
+class FollowSuggestionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [User.objects.create_user(f'user{index}') for index in range(12)]
+
+    def follow(self, follower, following):
+        self.client.force_authenticate(follower)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('follow', args=[following.username]))
+
+    def unfollow(self, follower, following):
+        self.client.force_authenticate(follower)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('follow', args=[following.username]))
+
+    def rows(self):
+        return set(FollowSuggestion.objects.values_list('user_id', 'suggested_id', 'score'))
+
+    def test_a_follow_queues_instead_of_rewriting_the_followers_rows(self):
+        alice, bob, carol, *fans = self.users
+        Follow.objects.bulk_create([Follow(follower=fan, following=alice) for fan in fans])
+        call_command('compute_follow_suggestions', stdout=mock.MagicMock())
+        with self.assertNumQueries(10):
+            self.follow(alice, bob)
+        self.assertEqual(list(FollowSuggestionRefresh.objects.values_list('user_id', flat=True)), [alice.pk])
+        self.assertFalse(FollowSuggestion.objects.filter(suggested=bob))
+
+        self.assertEqual(refresh_pending(), 1 + len(fans))
+        self.assertEqual(set(FollowSuggestion.objects.filter(suggested=bob).values_list('user_id', flat=True)),
+                         {fan.pk for fan in fans})
+        self.assertFalse(FollowSuggestionRefresh.objects.exists())
+
+    def test_followed_account_is_no_longer_suggested(self):
+        alice, bob, carol = self.users[:3]
+        self.follow(alice, bob)
+        self.follow(bob, carol)
+        refresh_pending()
+        self.assertTrue(FollowSuggestion.objects.filter(user=alice, suggested=carol).exists())
+        self.follow(alice, carol)
+        self.assertFalse(FollowSuggestion.objects.filter(user=alice, suggested=carol).exists())
+
+    def test_pending_refresh_matches_the_batch_job(self):
+        rng = random.Random(7)
+        for _ in range(150):
+            follower, following = rng.sample(self.users, 2)
+            if rng.random() < 0.3:
+                self.unfollow(follower, following)
+            else:
+                self.follow(follower, following)
+            if rng.random() < 0.2:
+                refresh_pending()
+        while refresh_pending():
+            pass
+        incremental = self.rows()
+        self.assertTrue(incremental)
+        self.assertTrue(all(count <= 3 for count in FollowSuggestion.objects.values('user').annotate(
+            n=Count('pk')).values_list('n', flat=True)))
+        call_command('compute_follow_suggestions', stdout=mock.MagicMock())
+        self.assertEqual(incremental, self.rows())
+
+@strict_budgets()
+class QueryBudgetTests(APITestCase):
+    # every request starts with cold caches and a token the cache hasn't seen
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice', password='old-pass-123')
+        self.other = User.objects.create_user('bob')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def request(self, method, url, data=None):
+        reset_caches()
+        response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400)
+        return response
+
+    def test_profile(self):
+        self.request('get', reverse('profile'))
+        self.request('patch', reverse('profile'), {'username': 'alice2', 'first_name': 'Alice'})
+        self.request('get', reverse('profile_other', args=['bob']))
+        self.request('get', reverse('profile_export'))
+        self.request('patch', reverse('change_password'), {
+            'old_password': 'old-pass-123', 'new_password': 'new-pass-456', 'confirm_password': 'new-pass-456'})
+
+    def test_follows(self):
+        self.request('post', reverse('follow', args=['bob']))
+        for query in ('', '?expand=follower,following'):
+            self.request('get', reverse('profile_follower', args=['bob']) + query)
+            self.request('get', reverse('profile_following', args=['alice']) + query)
+        self.request('get', reverse('follow_suggestions'))
+        self.request('delete', reverse('follow', args=['bob']))
+        self.request('post', reverse('async-follow', args=['bob']))
+        self.request('delete', reverse('async-follow', args=['bob']))
+
+    def test_sessions(self):
+        self.client.credentials()
+        self.request('post', reverse('signup'), {
+            'username': 'carol', 'password': 'carol-pass-123', 'confirm_password': 'carol-pass-123'})
+        token = self.request('post', reverse('auth_token'), {'username': 'carol', 'password': 'carol-pass-123'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.data["token"]}')
+        self.request('post', reverse('logout'))
+
+    def test_delete_account(self):
+        self.request('delete', reverse('profile_delete'))
+
+
+class ConcurrentFollowTests(APITransactionTestCase):
+    def test_follow_rows_and_timelines_stay_in_sync(self):
+        author = User.objects.create_user('author')
+        post = Post.objects.create(user=author, title='title', content='content')
+        keys = [Token.objects.create(user=User.objects.create_user(f'user{index}')).key for index in range(3)]
+        url = reverse('follow', args=['author'])
+        rng = random.Random(42)
+        requests = [('delete' if rng.random() < 0.3 else 'post', url, rng.choice(keys)) for _ in range(100)]
+
+        statuses, errors = run_concurrently(requests)
+
+        self.assertEqual(errors, [])
+        self.assertFalse([status for status in statuses if status >= 500])
+        follows = Follow.objects.filter(following=author)
+        self.assertFalse(follows.values('follower').annotate(n=Count('pk')).filter(n__gt=1))
+        self.assertEqual(set(follows.values_list('follower_id', flat=True)),
+                         set(TimelineEntry.objects.filter(post=post).values_list('user_id', flat=True)))
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.authtoken.views import obtain_auth_token
-from . import views
+from . import views, async_views
 from post import views as post_views
 urlpatterns = [
     path('signup/', views.SignupView.as_view(), name='signup'),
@@ -10,9 +10,12 @@ urlpatterns = [
     path('profile/<slug:username>/followers/', views.FollowersView.as_view(), name='profile_follower'),
     path('profile/<slug:username>/following/', views.FollowingView.as_view(), name='profile_following'),
     path('profile/delete/', views.ProfileDeleteView.as_view(), name='profile_delete'),
+    path('profile/export/', views.ProfileExportView.as_view(), name='profile_export'),
     path('change-password/', views.ChangePasswordView.as_view(), name='change_password'),
     path('profile/<slug:username>/', views.ProfileOtherView.as_view(), name='profile_other'),
     path('profile/<slug:username>/follow/', views.FollowView.as_view(), name='follow'),
+    path('suggestions/', views.FollowSuggestionView.as_view(), name='follow_suggestions'),
+    path('async/profile/<slug:username>/follow/', async_views.AsyncFollowView.as_view(), name='async-follow'),
 
 
     #views from post app
@@ -0,0 +1,90 @@
+from rest_framework import serializers
+
+
+class ViewerContext:
+    """
+    Viewer-relative flags (is_liked, is_following, is_follower) for everything
+    serialized in one request.
+
+    Objects are primed in batches - a whole page at once when a ViewerListSerializer
+    is used - so likes cost one `IN (...)` query per page instead of one `exists()`
+    per object, and each follow direction one more, only when its flag is rendered.
+    Single objects are primed lazily on first access.
+    """
+
+    def __init__(self, user):
+        self.user = user if user is not None and user.is_authenticated else None
+        self.liked_post_ids = set()
+        self.following_ids = set()
+        self.follower_ids = set()
+        self._primed_posts = set()
+        self._primed_following = set()
+        self._primed_followers = set()
+
+    def prime_posts(self, posts):
+        from post.models import Like
+
+        ids = {post.pk for post in posts} - self._primed_posts
+        if self.user is None or not ids:
+            return
+        self._primed_posts |= ids
+        self.liked_post_ids.update(
+            Like.objects.filter(user=self.user, post_id__in=ids).values_list('post_id', flat=True))
+
+    def prime_users(self, users, following=True, followers=True):
+        from .models import Follow
+
+        if self.user is None:
+            return
+        ids = {user.pk for user in users}
+        missing = ids - self._primed_following if following else set()
+        if missing:
+            self._primed_following |= missing
+            self.following_ids.update(Follow.objects.filter(
+                follower=self.user, following_id__in=missing).values_list('following_id', flat=True))
+        missing = ids - self._primed_followers if followers else set()
+        if missing:
+            self._primed_followers |= missing
+            self.follower_ids.update(Follow.objects.filter(
+                following=self.user, follower_id__in=missing).values_list('follower_id', flat=True))
+
+    def is_liked(self, post):
+        self.prime_posts([post])
+        return post.pk in self.liked_post_ids
+
+    def is_following(self, user):
+        self.prime_users([user], followers=False)
+        return user.pk in self.following_ids
+
+    def is_follower(self, user):
+        self.prime_users([user], following=False)
+        return user.pk in self.follower_ids
+
+
+def get_viewer(context):
+    # the serializer context dict is shared by the whole serializer tree, so one viewer per request
+    viewer = context.get('viewer')
+    if viewer is None:
+        request = context.get('request')
+        viewer = ViewerContext(getattr(request, 'user', None))
+        context['viewer'] = viewer
+    return viewer
+
+
+def prime(serializer, viewer, items):
+    """Primes `viewer` for `items` and for the nested serializers (e.g. ?expand=user) of the page."""
+    if hasattr(serializer, 'prime_viewer'):
+        serializer.prime_viewer(viewer, items)
+    for field in serializer.fields.values():
+        if isinstance(field, serializers.Serializer):
+            nested = [field.get_attribute(item) for item in items]
+            prime(field, viewer, [item for item in nested if item is not None])
+
+
+class ViewerListSerializer(serializers.ListSerializer):
+    """Primes the viewer context with the whole page before any child is serialized."""
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        prime(self.child, get_viewer(self.context), items)
+        return super().to_representation(items)
@@ -1,5 +1,7 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from drf_spectacular.types import OpenApiTypes
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
@@ -7,13 +9,15 @@ from rest_framework.request import Request
 from rest_framework.views import APIView
 from rest_framework import status, mixins, generics, permissions
 
+from .authentication import evict_user_tokens
 from .models import Follow
 from .permissions import IsNotAuthenticated, IsOwnerOrReadOnly
 from post import serializers as post_serializers
-from . import serializers
+from . import export, serializers, services, suggestions
 from post.models import Post
+from social_media import sparse_fields
 
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiResponse
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiParameter, OpenApiResponse
 
 
 # Create your views here.
@@ -57,11 +61,13 @@ class SignupView(generics.CreateAPIView):
 class LogoutView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
     def post(self, request):
-        try:
-            request.user.auth_token.delete()
-            return Response({'detail':'Logged out successfully.'},status=status.HTTP_200_OK)
-        except Token.DoesNotExist:
+        with transaction.atomic():
+            evict_user_tokens(request.user)
+            # through the queryset, the token instance may be the cached one shared with other requests
+            deleted, _ = Token.objects.filter(user=request.user).delete()
+        if not deleted:
             return Response(status=status.HTTP_400_BAD_REQUEST)
+        return Response({'detail':'Logged out successfully.'},status=status.HTTP_200_OK)
 # endregion
 
 # region Profile template with pure APIView
@@ -84,6 +90,7 @@ class LogoutView(APIView):
     get=extend_schema(
         tags=['Profile - accounts'],
         description='Retrieve logged-in user profile',
+        parameters=sparse_fields.PARAMETERS,
         responses=serializers.ProfileSerializer
     ),
     put=extend_schema(
@@ -124,6 +131,9 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = (permissions.IsAuthenticated,)
     def get_object(self):
         return self.request.user
+
+    def perform_update(self, serializer):
+        services.update_profile(serializer)
 # endregion
 
 # region profile - delete
@@ -134,10 +144,25 @@ class ProfileView(generics.RetrieveUpdateAPIView):
 class ProfileDeleteView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
     def delete(self, request):
-        request.user.delete()
+        services.delete_user(request.user)
         return Response({'detail':'User deleted.'}, status=status.HTTP_200_OK)
 # endregion
 
+# region profile - data export
+@extend_schema(
+    tags=['Profile - accounts'],
+    description='Download all your posts, comments, likes and follows as NDJSON (one JSON object per line)',
+    responses={(200, 'application/x-ndjson'): OpenApiTypes.STR},
+)
+class ProfileExportView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    def get(self, request):
+        # streamed chunk by chunk, the account is never loaded into memory at once
+        response = StreamingHttpResponse(export.export_lines(request.user), content_type=export.CONTENT_TYPE)
+        response['Content-Disposition'] = f'attachment; filename="{request.user.username}.ndjson"'
+        return response
+# endregion
+
 # region change password
 @extend_schema(
     tags=['Profile - accounts'],
@@ -181,16 +206,19 @@ class ChangePasswordView(APIView):
     def patch(self, request):
         serializer = serializers.ChangePasswordSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                evict_user_tokens(request.user)
             return Response({'detail':'Password changed.'})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 # endregion
 
 # region Others profile - (username in url)
-@extend_schema(tags=['Profile others - accounts'])
+@extend_schema(tags=['Profile others - accounts'], parameters=sparse_fields.PARAMETERS,
+               responses=serializers.ProfileSerializer)
 class ProfileOtherView(APIView):
     def get (self, request, username):
-        user = get_object_or_404(User, username=username)
+        user = get_object_or_404(User, username=username, is_active=True)
         serializer = serializers.ProfileSerializer(user, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 # endregion
@@ -199,18 +227,22 @@ class ProfileOtherView(APIView):
 @extend_schema(tags=['Follow - accounts'])
 class FollowersView(generics.ListAPIView):
     serializer_class = serializers.FollowerSerializer
+    ordering = ('-id',)
 
     def get_queryset(self):
-        user = get_object_or_404(User, username=self.kwargs['username'])
-        return Follow.objects.filter(following=user)
+        self.profile_user = get_object_or_404(User, username=self.kwargs['username'], is_active=True)
+        return Follow.objects.filter(following=self.profile_user, follower__is_active=True).select_related('follower')
 
     def list(self, request, *args, **kwargs):
         response = super().list(request, *args, **kwargs)
-        count = self.get_queryset().count()
+        # one COUNT, inactive accounts left out like in the page
+        count = Follow.objects.filter(following=self.profile_user, follower__is_active=True).count()
         return Response(
             {
                 'followers_count': count,
-                'followers':response.data
+                'followers':response.data['results'],
+                'next': response.data['next'],
+                'previous': response.data['previous'],
             }
         )
 # endregion
@@ -219,17 +251,20 @@ class FollowersView(generics.ListAPIView):
 @extend_schema(tags=['Follow - accounts'])
 class FollowingView(generics.ListAPIView):
     serializer_class = serializers.FollowingSerializer
+    ordering = ('-id',)
     def get_queryset(self):
-        user = get_object_or_404(User, username=self.kwargs['username'])
-        return Follow.objects.filter(follower=user)
+        self.profile_user = get_object_or_404(User, username=self.kwargs['username'], is_active=True)
+        return Follow.objects.filter(follower=self.profile_user, following__is_active=True).select_related('following')
 
     def list(self, request, *args, **kwargs):
         response = super().list(request, *args, **kwargs)
-        count = self.get_queryset().count()
+        count = Follow.objects.filter(follower=self.profile_user, following__is_active=True).count()
         return Response(
             {
                 'following_count': count,
-                'following':response.data
+                'following':response.data['results'],
+                'next': response.data['next'],
+                'previous': response.data['previous'],
             }
         )
 # endregion
@@ -240,23 +275,42 @@ class FollowView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
     def post(self, request, username):
 
-        following_instance = get_object_or_404(User, username=username)
+        following_instance = get_object_or_404(User, username=username, is_active=True)
         if following_instance == request.user:
             return Response({'detail': "You can't follow yourself!"}, status=status.HTTP_400_BAD_REQUEST)
 
-        follow, created = Follow.objects.get_or_create(follower=request.user, following=following_instance)
-        if created:
+        if services.follow_user(request.user, following_instance):
             return Response({'detail':f'{following_instance} followed!'},status=status.HTTP_202_ACCEPTED)
 
         else:
             return Response({'detail':f'{following_instance} is already in following.'},status=status.HTTP_200_OK)
 
     def delete(self, request, username):
-        following_instance = get_object_or_404(User, username=username)
-        deleted, _ = Follow.objects.filter(follower=request.user, following=following_instance).delete()
-        if deleted :
+        following_instance = get_object_or_404(User, username=username, is_active=True)
+        if services.unfollow_user(request.user, following_instance):
             return Response({'detail':f'{following_instance} unfollowed!'}, status=status.HTTP_200_OK)
         return Response({'detail':f'You were not following {following_instance}!'}, status=status.HTTP_404_NOT_FOUND)
 # endregion
 
 
+
+# region who to follow - precomputed suggestions of the logged-in user
+@extend_schema(
+    tags=['Follow - accounts'],
+    description='Accounts followed by the accounts you follow, ranked by the number of mutual connections',
+    parameters=[OpenApiParameter('limit', int, description='Number of suggestions (max 50)')],
+    responses=serializers.FollowSuggestionSerializer(many=True),
+)
+class FollowSuggestionView(generics.ListAPIView):
+    serializer_class = serializers.FollowSuggestionSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = None
+
+    def get_queryset(self):
+        config = suggestions.get_config()
+        try:
+            limit = min(int(self.request.query_params.get('limit', 20)), config['LIMIT'])
+        except ValueError:
+            limit = 20
+        return suggestions.get_suggestions(self.request.user, max(limit, 1))
+# endregion
@@ -0,0 +1,47 @@
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404
+
+from social_media.async_views import AsyncAPIView, json_response
+from social_media.pagination import KeysetPagination
+from . import serializers, services
+from .models import Post
+from .timeline import get_timeline_store
+
+# Async versions of the feed and like endpoints, served under /async/. Same
+# queries and response bodies as PostFeedView / PostLikeView in views.py.
+
+
+class AsyncPostFeedView(AsyncAPIView):
+    async def get(self, request):
+        paginator = KeysetPagination()
+        drf_request = self.drf_request()
+        serializer = serializers.PostValuesSerializer({'request': drf_request})
+        feed = get_timeline_store().feed(request.user, ranked=request.GET.get('order') == 'ranked')
+        page = await paginator.apaginate_queryset(serializer.prepare(feed), drf_request, self)
+        data = serializer.serialize(page)
+        return json_response(paginator.get_paginated_data(data))
+
+
+class AsyncPostLikeView(AsyncAPIView):
+    """
+    The post lookup is async. The like itself is services.like_post / unlike_post
+    in one sync_to_async call, because the Like row, the counters and the trending
+    bucket change in one transaction and Django has no async transactions. That call
+    runs in the thread sensitive executor, so at most one like or follow write per
+    process runs at a time. On SQLite that matches its single writer. On a server
+    with concurrent writers this endpoint is no faster than PostLikeView.
+    """
+
+    async def post(self, request, post_id):
+        post = await aget_object_or_404(Post, pk=post_id)
+        created, likes_count = await sync_to_async(services.like_post)(request.user, post)
+        if created:
+            return json_response({'detail': 'Post liked!', 'likes_count': likes_count}, status=201)
+        return json_response({'detail': 'You already liked this post.', 'likes_count': likes_count}, status=200)
+
+    async def delete(self, request, post_id):
+        post = await aget_object_or_404(Post, pk=post_id)
+        deleted, likes_count = await sync_to_async(services.unlike_post)(request.user, post)
+        if deleted:
+            return json_response({'detail': 'Post unliked!', 'likes_count': likes_count}, status=200)
+        return json_response({'detail': 'Not Liked', 'likes_count': likes_count}, status=404)
@@ -0,0 +1,184 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+# Response cache for anonymous reads. Cached pages are keyed by path, query
+# string and the current version of every resource they depend on; writes bump
+# the versions (see post/services.py), so a stale page is never looked up again
+# and simply ages out of the backend. Every page also depends on 'users': they
+# all show usernames, so a profile change or an account deletion retires them all.
+
+DEFAULT_RESPONSE_CACHE = {
+    'CACHE_ALIAS': 'responses',
+    'TIMEOUT': 300,
+    'LOCK_TIMEOUT': 10,
+    'WAIT_TIMEOUT': 2.0,
+    'WAIT_INTERVAL': 0.05,
+}
+
+HIT, MISS, WAITED, BYPASS = 'HIT', 'MISS', 'WAITED', 'BYPASS'
+
+
+def get_config():
+    return {**DEFAULT_RESPONSE_CACHE, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+
+def get_cache():
+    return caches[get_config()['CACHE_ALIAS']]
+
+
+def posts_resource():
+    return 'posts'
+
+
+def post_resource(post_id):
+    return f'post:{post_id}'
+
+
+def users_resource():
+    return 'users'
+
+
+def _version_key(resource):
+    return f'resp-version:{resource}'
+
+
+def get_versions(resources):
+    cache = get_cache()
+    keys = [_version_key(resource) for resource in resources]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # a lost version must never fall back to a value an old page was stored under
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_version(resource):
+    return get_versions([resource])[0]
+
+
+def _changed_key(resource):
+    return f'resp-changed:{resource}'
+
+
+def get_version_and_changed(resource):
+    """(version, time of the last bump) of `resource`, for an ETag and its Last-Modified."""
+    cache = get_cache()
+    found = cache.get_many([_version_key(resource), _changed_key(resource)])
+    version = found.get(_version_key(resource))
+    if version is None:
+        version = get_version(resource)
+    changed = found.get(_changed_key(resource))
+    if changed is None:
+        # unknown, so as recent as it gets: If-Modified-Since can't match it
+        cache.add(_changed_key(resource), time.time(), None)
+        changed = cache.get(_changed_key(resource))
+    return version, datetime.fromtimestamp(changed, tz=timezone.utc)
+
+
+def bump(*resources):
+    cache = get_cache()
+    for resource in resources:
+        key = _version_key(resource)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+        cache.set(_changed_key(resource), time.time(), None)
+
+
+def _count(metric):
+    cache = get_cache()
+    key = f'resp-metrics:{metric}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def get_metrics():
+    cache = get_cache()
+    names = (HIT, MISS, WAITED, BYPASS)
+    values = cache.get_many([f'resp-metrics:{name}' for name in names])
+    return {name.lower(): values.get(f'resp-metrics:{name}', 0) for name in names}
+
+
+def reset_metrics():
+    get_cache().delete_many([f'resp-metrics:{name}' for name in (HIT, MISS, WAITED, BYPASS)])
+
+
+def build_key(request, resources):
+    query = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+    versions = get_versions(resources)
+    raw = repr((request.path, query, list(zip(resources, versions))))
+    return 'resp:' + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def fetch(key, compute):
+    """
+    Single-flight lookup: on a miss only the caller that wins the lock recomputes,
+    concurrent callers wait for its result instead of all hitting the database.
+    `compute` returns the value to cache, or None for responses that must not be cached.
+    """
+    config = get_config()
+    cache = get_cache()
+    value = cache.get(key)
+    if value is not None:
+        return value, HIT
+
+    lock_key = key + ':lock'
+    if not cache.add(lock_key, 1, config['LOCK_TIMEOUT']):
+        deadline = time.monotonic() + config['WAIT_TIMEOUT']
+        while time.monotonic() < deadline:
+            time.sleep(config['WAIT_INTERVAL'])
+            value = cache.get(key)
+            if value is not None:
+                return value, WAITED
+        # the lock holder is too slow, compute without it rather than fail
+        return compute(), MISS
+
+    try:
+        value = compute()
+        if value is not None:
+            cache.set(key, value, config['TIMEOUT'])
+    finally:
+        cache.delete(lock_key)
+    return value, MISS
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Serve GET requests of anonymous users from the response cache.
+    Views list the resources their body depends on in get_cache_resources().
+    """
+
+    def get_cache_resources(self):
+        return [posts_resource()]
+
+    def get(self, request, *args, **kwargs):
+        if request.user and request.user.is_authenticated:
+            _count(BYPASS)
+            return super().get(request, *args, **kwargs)
+
+        response = None
+
+        def compute():
+            nonlocal response
+            response = super(AnonymousResponseCacheMixin, self).get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return None
+            return {'status': response.status_code, 'data': response.data}
+
+        entry, state = fetch(build_key(request, [*self.get_cache_resources(), users_resource()]), compute)
+        _count(state)
+        if response is None:
+            response = Response(entry['data'], status=entry['status'])
+        response['X-Cache'] = state
+        return response
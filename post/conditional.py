@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    return quote_etag('-'.join(str(part) for part in parts))
+
+
+class ConditionalRequestMixin:
+    """
+    ETag / Last-Modified handling driven by cheap version metadata.
+
+    Views implement get_condition_state() returning `(etag, last_modified)` from a
+    single indexed lookup (locking the row when `for_update`), or None when the
+    object doesn't exist. A GET with a
+    matching If-None-Match / If-Modified-Since returns 304 before anything is
+    serialized; a PUT/PATCH whose If-Match no longer matches returns 412.
+    """
+
+    def get_condition_state(self, for_update=False):
+        raise NotImplementedError
+
+    def viewer_key(self):
+        # the representation depends on the viewer (is_liked), so is the tag
+        user = self.request.user
+        return user.pk if user and user.is_authenticated else 0
+
+    def get(self, request, *args, **kwargs):
+        state = self.get_condition_state()
+        if state is not None and self.is_not_modified(request, *state):
+            return self.add_condition_headers(Response(status=status.HTTP_304_NOT_MODIFIED), state)
+        response = super().get(request, *args, **kwargs)
+        if state is not None and response.status_code == status.HTTP_200_OK:
+            self.add_condition_headers(response, state)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        if_match = request.headers.get('If-Match')
+        if not if_match:
+            return super().update(request, *args, **kwargs)
+        with transaction.atomic():
+            state = self.get_condition_state(for_update=True)
+            if state is not None and not self.etag_matches(if_match, state[0]):
+                return Response({'detail': 'The resource has been modified since you fetched it.'},
+                                status=status.HTTP_412_PRECONDITION_FAILED)
+            response = super().update(request, *args, **kwargs)
+        state = self.get_condition_state()
+        if state is not None and response.status_code == status.HTTP_200_OK:
+            self.add_condition_headers(response, state)
+        return response
+
+    @staticmethod
+    def etag_matches(header, etag):
+        etags = parse_etags(header)
+        return '*' in etags or etag in etags
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+            return self.etag_matches(if_none_match, etag)
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+        return if_modified_since is not None and int(last_modified.timestamp()) <= if_modified_since
+
+    @staticmethod
+    def add_condition_headers(response, state):
+        etag, last_modified = state
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
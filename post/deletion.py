@@ -0,0 +1,156 @@
+import datetime
+import traceback
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from accounts.graph import get_follow_graph
+from accounts.models import Follow, FollowSuggestion
+from . import cache, trending
+from .models import Comment, DeletionJob, Like, Post, PostActivityBucket, TimelineEntry
+
+# Deleting a post or an account only hides it (Post.is_deleted / Comment.is_deleted,
+# see the managers in post/models.py, and User.is_active for the account) and queues a DeletionJob. The
+# process_deletions command then removes the rows in phases, BATCH_SIZE rows per
+# transaction, so no request waits for the cascade and no transaction holds
+# locks for long. Every batch stores the job's progress in the same transaction
+# as its deletes: a job interrupted anywhere resumes at the batch it stopped
+# at. Phases delete what is left of their rows, so rerunning one is harmless.
+
+DEFAULT_DELETION = {
+    'BATCH_SIZE': 500,
+    'LEASE_SECONDS': 300,
+    'MAX_ATTEMPTS': 5,
+}
+
+
+def get_config():
+    return {**DEFAULT_DELETION, **getattr(settings, 'DELETION', {})}
+
+
+def schedule(kind, target_id):
+    return DeletionJob.objects.create(kind=kind, target_id=target_id)
+
+
+def _recount(rows):
+    # a batch of likes or comments of other people's posts, their counters follow
+    from .services import reconcile_counters
+
+    post_ids = {row[1] for row in rows}
+    reconcile_counters(Post.all_objects.filter(pk__in=post_ids))
+    transaction.on_commit(lambda: cache.bump(*[cache.post_resource(post_id) for post_id in post_ids]))
+
+
+def _likes_removed(rows):
+    _recount(rows)
+    # the account's likes of posts that stay leave the trending windows too
+    trending.retract_activity([(post_id, created) for _, post_id, created in rows], 'likes')
+
+
+def _comments_removed(rows):
+    _recount(rows)
+    trending.retract_activity([(post_id, created) for _, post_id, created in rows], 'comments')
+
+
+def _unfollowed(rows):
+    user_ids = {user_id for _, follower_id, following_id in rows for user_id in (follower_id, following_id)}
+    transaction.on_commit(lambda: get_follow_graph().invalidate(*user_ids))
+
+
+def get_phases(job):
+    """[(name, queryset of the rows left, extra columns for `after`, after(rows) or None)] in order."""
+    target = job.target_id
+    if job.kind == DeletionJob.POST:
+        return [
+            ('timeline', TimelineEntry.objects.filter(post_id=target), (), None),
+            ('activity', PostActivityBucket.objects.filter(post_id=target), (), None),
+            ('likes', Like.objects.filter(post_id=target), (), None),
+            # replies first, a batch never cascades into the rest of a thread
+            ('comments', Comment.all_objects.filter(post_id=target).order_by('-depth', '-id'), (), None),
+            ('post', Post.all_objects.filter(pk=target), (), None),
+        ]
+    own_posts = Q(post__user_id=target)
+    return [
+        ('follows', Follow.objects.filter(Q(follower_id=target) | Q(following_id=target)),
+         ('follower_id', 'following_id'), _unfollowed),
+        ('suggestions', FollowSuggestion.objects.filter(Q(user_id=target) | Q(suggested_id=target)), (), None),
+        ('timeline', TimelineEntry.objects.filter(Q(user_id=target) | own_posts), (), None),
+        ('activity', PostActivityBucket.objects.filter(own_posts), (), None),
+        ('likes', Like.objects.filter(Q(user_id=target) | own_posts), ('post_id', 'created'), _likes_removed),
+        ('comments', Comment.all_objects.filter(Q(user_id=target) | own_posts).order_by('-depth', '-id'),
+         ('post_id', 'created'), _comments_removed),
+        ('posts', Post.all_objects.filter(user_id=target), (), None),
+        ('user', User.objects.filter(pk=target), (), None),
+    ]
+
+
+def claim(job_id=None):
+    """Take the lease of the next runnable job (or of `job_id`), None when there is none."""
+    config = get_config()
+    now = timezone.now()
+    runnable = Q(status=DeletionJob.PENDING) & (Q(lease_until__isnull=True) | Q(lease_until__lt=now))
+    candidates = DeletionJob.objects.filter(runnable)
+    if job_id is not None:
+        candidates = candidates.filter(pk=job_id)
+    for pk in candidates.order_by('id').values_list('pk', flat=True)[:10]:
+        # the conditional UPDATE decides between workers racing for the same job
+        if DeletionJob.objects.filter(runnable, pk=pk).update(
+                lease_until=now + datetime.timedelta(seconds=config['LEASE_SECONDS']),
+                attempts=F('attempts') + 1):
+            return DeletionJob.objects.get(pk=pk)
+    return None
+
+
+def run(job, max_batches=None, on_batch=None, batch_size=None):
+    """Run `job` from its stored phase, returns True once it is done (False when max_batches ran out)."""
+    config = get_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    phases = get_phases(job)
+    names = [name for name, *_ in phases]
+    start = names.index(job.phase) if job.phase in names else 0
+    batches = 0
+    for name, queryset, columns, after in phases[start:]:
+        if job.phase != name:
+            job.phase = name
+            job.save(update_fields=['phase', 'updated'])
+        while True:
+            if max_batches is not None and batches >= max_batches:
+                return False
+            with transaction.atomic():
+                rows = list(queryset.values_list('pk', *columns)[:batch_size])
+                if not rows:
+                    break
+                _, deleted = queryset.model._base_manager.filter(pk__in=[row[0] for row in rows]).delete()
+                if after is not None:
+                    after(rows)
+                job.progress[name] = job.progress.get(name, 0) + sum(deleted.values())
+                job.lease_until = timezone.now() + datetime.timedelta(seconds=config['LEASE_SECONDS'])
+                job.save(update_fields=['progress', 'lease_until', 'updated'])
+            batches += 1
+            if on_batch is not None:
+                on_batch(job)
+    job.status, job.finished, job.lease_until, job.error = DeletionJob.DONE, timezone.now(), None, ''
+    job.save(update_fields=['status', 'finished', 'lease_until', 'error', 'updated'])
+    return True
+
+
+def release(job):
+    """Give up the lease of a job that made progress, its attempts start over."""
+    job.lease_until, job.attempts = None, 0
+    job.save(update_fields=['lease_until', 'attempts', 'updated'])
+
+
+def run_claimed(job, max_batches=None, on_batch=None, batch_size=None):
+    """run() that records a failure on the job: retried on the next claim, failed after MAX_ATTEMPTS."""
+    try:
+        return run(job, max_batches, on_batch, batch_size)
+    except Exception:
+        job.error = traceback.format_exc()
+        job.lease_until = None
+        if job.attempts >= get_config()['MAX_ATTEMPTS']:
+            job.status = DeletionJob.FAILED
+        job.save(update_fields=['error', 'lease_until', 'status', 'updated'])
+        raise
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import Counter
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from accounts.authentication import get_local_cache
+from social_media.benchmark import asgi_request, build_report, summarize, write_report
+from .run_benchmarks import get_fixtures
+
+
+class Command(BaseCommand):
+    help = ('Compare the sync DRF views with their async versions (feed, like, follow) under the ASGI '
+            'application, at several levels of concurrency. Requests go through social_media.asgi the '
+            'way an ASGI server sends them. Like and follow scenarios undo themselves in the same task, '
+            'so the seeded dataset (see seed_social_graph) is left as it was.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario and concurrency.')
+        parser.add_argument('--concurrency', type=int, action='append', default=[],
+                            help='Concurrent requests in flight, repeatable (default 1, 8 and 32).')
+        parser.add_argument('--only', action='append', default=[], help='Only run scenarios containing this text.')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--label', default='')
+
+    def handle(self, *args, **options):
+        fixtures = get_fixtures()
+        token, _ = Token.objects.get_or_create(user=fixtures['viewer'])
+        headers = {'Authorization': f'Token {token.key}'}
+        scenarios = self.get_scenarios(fixtures)
+        if options['only']:
+            scenarios = {name: steps for name, steps in scenarios.items()
+                         if any(text in name for text in options['only'])}
+        levels = options['concurrency'] or [1, 8, 32]
+
+        app = get_asgi_application()
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for name, steps in scenarios.items():
+                for concurrency in levels:
+                    get_local_cache().clear()
+                    result = asyncio.run(self.run_scenario(app, steps, headers, options['requests'], concurrency))
+                    key = f'{name}@{concurrency}'
+                    results[key] = result
+                    self.stdout.write(f"{key:<28} {result['throughput']:>8.1f} req/s p50={result['p50_ms']:>8.2f}ms "
+                                      f"p99={result['p99_ms']:>8.2f}ms statuses={result['statuses']}")
+
+        for name in scenarios:
+            if not name.startswith('async-'):
+                continue
+            for concurrency in levels:
+                sync, async_ = results.get(f'{name[6:]}@{concurrency}'), results.get(f'{name}@{concurrency}')
+                if sync and async_ and sync['throughput']:
+                    self.stdout.write(f"{name[6:]:<12} c={concurrency:<4} async/sync throughput "
+                                      f"{async_['throughput'] / sync['throughput']:.2f}x")
+
+        if options['output']:
+            write_report(build_report(results, label=options['label'], requests=options['requests'],
+                                      concurrency=levels, server='asgi'), options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def get_scenarios(self, f):
+        post_kwargs = {'post_id': f['post'].pk}
+        follow_kwargs = {'username': f['stranger'].username}
+        # every scenario is a list of (method, url) run in order by one task
+        return {
+            'feed': [('get', reverse('post-feed'))],
+            'async-feed': [('get', reverse('async-post-feed'))],
+            'like': [('post', reverse('post-like', kwargs=post_kwargs)),
+                     ('delete', reverse('post-like', kwargs=post_kwargs))],
+            'async-like': [('post', reverse('async-post-like', kwargs=post_kwargs)),
+                           ('delete', reverse('async-post-like', kwargs=post_kwargs))],
+            'follow': [('post', reverse('follow', kwargs=follow_kwargs)),
+                       ('delete', reverse('follow', kwargs=follow_kwargs))],
+            'async-follow': [('post', reverse('async-follow', kwargs=follow_kwargs)),
+                             ('delete', reverse('async-follow', kwargs=follow_kwargs))],
+        }
+
+    async def run_scenario(self, app, steps, headers, requests, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        statuses = Counter()
+        timings = []
+
+        async def task():
+            async with semaphore:
+                for method, url in steps:
+                    start = time.perf_counter()
+                    status, _ = await asgi_request(app, method, url, headers)
+                    timings.append(time.perf_counter() - start)
+                    statuses[status] += 1
+
+        # one warm up round for the auth cache and the connections
+        await task()
+        timings.clear()
+        statuses.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(task() for _ in range(max(1, requests // len(steps)))))
+        elapsed = time.perf_counter() - start
+        return summarize(timings, throughput=round(len(timings) / elapsed, 1),
+                         statuses=dict(sorted(statuses.items())))
@@ -0,0 +1,75 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from post.models import Post
+from post.serializers import PostDetailSerializer
+from social_media.benchmark import build_report, summarize, write_report
+from social_media.fast_json import FastJSONParser, FastJSONRenderer, is_enabled
+
+
+class Command(BaseCommand):
+    help = ("Time DRF's JSONRenderer/JSONParser against FastJSONRenderer/FastJSONParser on real "
+            "PostDetailSerializer payloads (one post and pages of posts) from the database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--posts', type=int, action='append', default=[],
+                            help='Posts per payload, repeatable (default 1, 20 and 100).')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--label', default='')
+
+    def handle(self, *args, **options):
+        if not is_enabled():
+            self.stdout.write(self.style.WARNING('orjson is not installed or FAST_JSON is disabled, '
+                                                 'both sides use the stdlib json module.'))
+        context = {'request': Request(RequestFactory().get('/'))}
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for count in options['posts'] or [1, 20, 100]:
+                queryset = PostDetailSerializer.setup_queryset(Post.objects.order_by('-id'), None)[:count]
+                data = PostDetailSerializer(list(queryset), many=True, context=context).data
+                if not data:
+                    raise CommandError('No posts, run seed_social_graph first.')
+                payload = data[0] if count == 1 else data
+                body = JSONRenderer().render(payload)
+                if FastJSONRenderer().render(payload) != body or \
+                        FastJSONParser().parse(io.BytesIO(body)) != JSONParser().parse(io.BytesIO(body)):
+                    raise CommandError('The fast renderer or parser output differs from the stdlib one.')
+
+                cases = (
+                    ('render:stdlib', lambda: JSONRenderer().render(payload)),
+                    ('render:fast', lambda: FastJSONRenderer().render(payload)),
+                    ('parse:stdlib', lambda: JSONParser().parse(io.BytesIO(body))),
+                    ('parse:fast', lambda: FastJSONParser().parse(io.BytesIO(body))),
+                )
+                for name, fn in cases:
+                    key = f'{name}@{count}'
+                    results[key] = self.measure(fn, options['iterations'], bytes=len(body))
+                    self.stdout.write(f"{key:<22} p50={results[key]['p50_ms']:>8.4f}ms "
+                                      f"p99={results[key]['p99_ms']:>8.4f}ms bytes={len(body)}")
+                for step in ('render', 'parse'):
+                    stdlib, fast = results[f'{step}:stdlib@{count}'], results[f'{step}:fast@{count}']
+                    if fast['p50_ms']:
+                        self.stdout.write(self.style.SUCCESS(
+                            f'{step} {count} posts: {stdlib["p50_ms"] / fast["p50_ms"]:.1f}x faster'))
+
+        if options['output']:
+            write_report(build_report(results, label=options['label'], iterations=options['iterations']),
+                         options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    @staticmethod
+    def measure(fn, iterations, **extra):
+        fn()
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return summarize(timings, **extra)
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.request import Request
+
+from post.models import Post
+from post.serializers import PostSerializer, PostValuesSerializer
+from social_media.benchmark import build_report, summarize, write_report
+
+
+class Command(BaseCommand):
+    help = ('Compare PostSerializer with the values() based PostValuesSerializer on pages of posts, '
+            'query included. Checks first that both produce the same output.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--page-size', type=int, action='append', default=[],
+                            help='Posts per page, repeatable (default 20 and 100).')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--label', default='')
+
+    def handle(self, *args, **options):
+        request = Request(RequestFactory().get('/'))
+        context = {'request': request}
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for page_size in options['page_size'] or [20, 100]:
+                queryset = Post.objects.select_related('user').order_by('-created', '-id')
+
+                def model_serializer():
+                    return PostSerializer(list(queryset[:page_size]), many=True, context=context).data
+
+                def values_serializer():
+                    serializer = PostValuesSerializer(context)
+                    return serializer.serialize(list(serializer.prepare(queryset)[:page_size]))
+
+                if [dict(row) for row in model_serializer()] != values_serializer():
+                    raise CommandError('PostValuesSerializer output differs from PostSerializer.')
+                for name, fn in (('PostSerializer', model_serializer), ('PostValuesSerializer', values_serializer)):
+                    key = f'{name}@{page_size}'
+                    results[key] = self.measure(fn, options['iterations'])
+                    self.stdout.write(f"{key:<28} p50={results[key]['p50_ms']:>8.3f}ms "
+                                      f"p99={results[key]['p99_ms']:>8.3f}ms")
+                before, after = results[f'PostSerializer@{page_size}'], results[f'PostValuesSerializer@{page_size}']
+                if after['p50_ms']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{page_size} posts: {before["p50_ms"] / after["p50_ms"]:.1f}x faster'))
+
+        if options['output']:
+            write_report(build_report(results, label=options['label'], iterations=options['iterations']),
+                         options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    @staticmethod
+    def measure(fn, iterations):
+        fn()
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return summarize(timings)
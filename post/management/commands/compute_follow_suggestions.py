@@ -0,0 +1,98 @@
+import multiprocessing
+import time
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Follow, FollowSuggestion, FollowSuggestionRefresh
+from accounts.suggestions import get_config, rank_candidates, refresh_pending, store
+
+# The whole follow graph as {user_id: sorted array('q') of followed ids}, set before
+# the pool starts so forked workers share it; spawned workers get it from _init_worker.
+_following_of = None
+
+
+def _init_worker(following_of):
+    global _following_of
+    if following_of is not None:
+        _following_of = following_of
+
+
+def _rank_chunk(user_ids, limit, cap):
+    # runs in a worker process, pure CPU work without database access
+    empty = array('q')
+    return {user_id: rank_candidates(user_id, _following_of.get(user_id, empty), _following_of, limit, cap)
+            for user_id in user_ids}
+
+
+class Command(BaseCommand):
+    help = ('Recompute the "who to follow" suggestions of every user (or --user) from the Follow table. '
+            'The graph is loaded once and ranking runs across a process pool; rows are written in chunks. '
+            'With --pending only the users queued by follows since, run it every minute or so, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=0, help='Worker processes, 0 ranks in this process.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Users per task and per write.')
+        parser.add_argument('--user', type=int, action='append', default=[], help='Only these user ids.')
+        parser.add_argument('--pending', action='store_true',
+                            help='Only the users whose suggestions a follow or unfollow made stale.')
+
+    def handle(self, *args, **options):
+        global _following_of
+        config = get_config()
+        start = time.perf_counter()
+        if options['pending']:
+            return self.refresh_pending(start)
+
+        # everything queued so far is covered by this run
+        queued = FollowSuggestionRefresh.objects.order_by('-id').values_list('pk', flat=True).first()
+
+        following_of = defaultdict(list)
+        for follower_id, following_id in Follow.objects.values_list('follower_id', 'following_id').iterator(
+                chunk_size=10000):
+            following_of[follower_id].append(following_id)
+        _following_of = {user_id: array('q', sorted(ids)) for user_id, ids in following_of.items()}
+        loaded = time.perf_counter()
+
+        # users who follow nobody get their (stale) suggestions cleared too
+        user_ids = sorted(options['user'] or set(_following_of)
+                          | set(FollowSuggestion.objects.values_list('user_id', flat=True).distinct()))
+        chunks = [user_ids[index:index + options['chunk_size']]
+                  for index in range(0, len(user_ids), options['chunk_size'])]
+        args = (config['LIMIT'], config['HIGH_DEGREE_CAP'])
+
+        rows = 0
+        if options['workers']:
+            with ProcessPoolExecutor(options['workers'], initializer=_init_worker,
+                                     initargs=(self.initargs(),)) as pool:
+                for ranked in pool.map(_rank_chunk, chunks, *[[arg] * len(chunks) for arg in args]):
+                    rows += self.write(ranked, config)
+        else:
+            for chunk in chunks:
+                rows += self.write(_rank_chunk(chunk, *args), config)
+
+        if queued is not None and not options['user']:
+            FollowSuggestionRefresh.objects.filter(pk__lte=queued).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {rows} suggestions for {len(user_ids)} users '
+            f'(graph loaded in {loaded - start:.2f}s, ranked and written in {time.perf_counter() - loaded:.2f}s).'))
+
+    def refresh_pending(self, start):
+        users = 0
+        while refreshed := refresh_pending():
+            users += refreshed
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed the suggestions of {users} users in {time.perf_counter() - start:.2f}s.'))
+
+    @staticmethod
+    def initargs():
+        # forked workers inherit the module global, only spawn needs it pickled
+        return None if multiprocessing.get_start_method() == 'fork' else _following_of
+
+    @staticmethod
+    def write(ranked, config):
+        store(ranked, config['BATCH_SIZE'])
+        return sum(len(rows) for rows in ranked.values())
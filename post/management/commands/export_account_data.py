@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.export import DEFAULT_CHUNK_SIZE, export_lines
+
+
+class Command(BaseCommand):
+    help = ("Write a user's posts, comments, likes and follows as NDJSON, the same data as "
+            "GET /accounts/profile/export/. Rows are read in chunks, memory stays flat for any account size.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--output', help='File to write, default stdout.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows per fetch and per write.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user named {options["username"]!r}.')
+        if not options['output']:
+            for chunk in export_lines(user, options['chunk_size']):
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            lines = 0
+            for chunk in export_lines(user, options['chunk_size']):
+                output.write(chunk)
+                lines += chunk.count('\n')
+        self.stderr.write(self.style.SUCCESS(f'Wrote {lines} records to {options["output"]}.'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from post import deletion
+
+
+class Command(BaseCommand):
+    help = ('Remove the rows of deleted posts and accounts in small batches (see post/deletion.py). '
+            'Run it every minute or so, e.g. from cron; an interrupted job resumes where it stopped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Rows per transaction, default DELETION["BATCH_SIZE"]')
+        parser.add_argument('--max-batches', type=int, help='Stop each job after this many batches')
+        parser.add_argument('--job', type=int, help='Only run this job')
+
+    def handle(self, *args, **options):
+        verbose = options['verbosity'] > 1
+        done, unfinished = 0, []
+        while True:
+            job = deletion.claim(options['job'])
+            if job is None:
+                break
+            self.stdout.write(str(job))
+            if deletion.run_claimed(job, options['max_batches'], batch_size=options['batch_size'],
+                                    on_batch=self.report if verbose else None):
+                done += 1
+            else:
+                unfinished.append(job)
+            if options['job'] is not None:
+                break
+        # the jobs cut short by --max-batches are free for the next run right away
+        for job in unfinished:
+            deletion.release(job)
+            self.stdout.write(f'{job}: {job.progress}')
+        self.stdout.write(self.style.SUCCESS(f'Finished {done} deletion jobs, {len(unfinished)} left unfinished.'))
+
+    def report(self, job):
+        self.stdout.write(f'  {job.phase}: {job.progress.get(job.phase, 0)} rows')
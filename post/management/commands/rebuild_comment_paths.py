@@ -0,0 +1,40 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from post.models import Comment, comment_path_segment
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized path and depth of every comment (backfill for existing rows).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        children = defaultdict(list)
+        for pk, parent_id in Comment.all_objects.order_by('pk').values_list('pk', 'parent_id').iterator(chunk_size=batch_size):
+            children[parent_id].append(pk)
+
+        updated = 0
+        batch = []
+        stack = [(pk, '', 0) for pk in reversed(children[None])]
+        with transaction.atomic():
+            while stack:
+                pk, parent_path, depth = stack.pop()
+                path = parent_path + comment_path_segment(pk)
+                batch.append(Comment(pk=pk, path=path, depth=depth))
+                stack.extend((child, path, depth + 1) for child in reversed(children[pk]))
+                if len(batch) >= batch_size:
+                    updated += Comment.all_objects.bulk_update(batch, ['path', 'depth'])
+                    batch = []
+            if batch:
+                updated += Comment.all_objects.bulk_update(batch, ['path', 'depth'])
+
+        total = sum(len(ids) for ids in children.values())
+        if updated != total:
+            self.stderr.write(self.style.WARNING(f'{total - updated} comments are not reachable from a top-level comment.'))
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt paths for {updated} comments.'))
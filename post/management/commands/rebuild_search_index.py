@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from post.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the post full-text search index from the Post table.'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search index ({type(backend).__name__}).'))
@@ -0,0 +1,23 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from post.timeline import get_timeline_store
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every user timeline from the Follow graph (backfill or repair for the feed).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only rebuild these users.')
+
+    def handle(self, *args, **options):
+        store = get_timeline_store()
+        users = User.objects.all()
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        count = 0
+        for user in users.iterator():
+            store.rebuild(user)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} timelines.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from post.services import reconcile_counters, recompute_scores
+
+
+class Command(BaseCommand):
+    help = 'Fix drift between Post.like_count / Post.comment_count and the Like / Comment tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scores', action='store_true',
+                            help='Also recompute every feed ranking score, e.g. after changing FEED_RANKING.')
+
+    def handle(self, *args, **options):
+        drifted = reconcile_counters()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {len(drifted)} posts.'))
+        if options['scores']:
+            self.stdout.write(self.style.SUCCESS(f'Recomputed the score of {recompute_scores()} posts.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from post import trending
+
+
+class Command(BaseCommand):
+    help = ('Recompute the cached top list of every trending window and delete the activity buckets '
+            'older than the longest window. Run it every minute or so, e.g. from cron.')
+
+    def handle(self, *args, **options):
+        pruned = trending.prune()
+        for hours, snapshot in trending.refresh_all().items():
+            self.stdout.write(f'{hours}h: {len(snapshot["items"])} posts')
+        self.stdout.write(self.style.SUCCESS(f'Refreshed trending, pruned {pruned} old buckets.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from post import cache
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the anonymous response cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them.')
+
+    def handle(self, *args, **options):
+        metrics = cache.get_metrics()
+        lookups = metrics['hit'] + metrics['waited'] + metrics['miss']
+        ratio = (metrics['hit'] + metrics['waited']) / lookups if lookups else 0
+        for name, value in metrics.items():
+            self.stdout.write(f'{name}: {value}')
+        self.stdout.write(f'hit ratio: {ratio:.2%}')
+        if options['reset']:
+            cache.reset_metrics()
@@ -0,0 +1,201 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from accounts import urls as accounts_urls
+from accounts.authentication import get_local_cache
+from accounts.models import Follow
+from post import urls as post_urls
+from post.models import Post, Comment
+from social_media.benchmark import build_report, compare_reports, measure, write_report
+from .seed_social_graph import BENCH_PASSWORD, USERNAME_PREFIX
+
+
+def get_fixtures():
+    """The users, posts and comment the benchmark scenarios run against."""
+    users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+    if not users.exists():
+        raise CommandError('No benchmark dataset, run seed_social_graph first.')
+    # related names are inverted on Follow: user.follower are the rows where the user follows someone
+    viewer = users.annotate(n=Count('follower')).order_by('-n', 'pk').first()
+    celebrity = users.annotate(n=Count('following')).order_by('-n', 'pk').first()
+    post = Post.objects.filter(user__in=users).order_by('-comment_count', 'pk').first()
+    if post is None:
+        raise CommandError('The benchmark dataset has no posts.')
+    comment = Comment.objects.filter(post=post, parent=None).order_by('pk').first()
+    followed = Follow.objects.filter(follower=viewer).values_list('following_id', flat=True)
+    stranger = users.exclude(pk=viewer.pk).exclude(pk__in=followed).order_by('pk').first() or celebrity
+    return {
+        'viewer': viewer,
+        'celebrity': celebrity,
+        'stranger': stranger,
+        'post': post,
+        'viewer_post': Post.objects.filter(user=viewer).order_by('pk').first() or post,
+        'comment': comment,
+        'post_ids': list(Post.objects.filter(user__in=users).order_by('-like_count', 'pk')
+                         .values_list('pk', flat=True)[:50]),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Drive every endpoint of post/urls.py and accounts/urls.py through the test client against the '
+            'seeded dataset (see seed_social_graph) and report latency percentiles, query counts and response '
+            'sizes as JSON. Every request runs in a rolled back transaction, so the dataset never changes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--compare', help='Baseline JSON report to compare the p50 latencies against.')
+        parser.add_argument('--label', default='', help='Free-form label stored in the report.')
+        parser.add_argument('--only', action='append', default=[], help='Only run scenarios containing this text.')
+        parser.add_argument('--cold', action='store_true', help='Clear all caches before every request.')
+
+    def handle(self, *args, **options):
+        fixtures = get_fixtures()
+        scenarios = self.get_scenarios(fixtures)
+        self.check_coverage(scenarios)
+        if options['only']:
+            scenarios = [s for s in scenarios if any(text in s['name'] for text in options['only'])]
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for scenario in scenarios:
+                results[scenario['name']] = self.run_scenario(scenario, options)
+                result = results[scenario['name']]
+                self.stdout.write(f"{scenario['name']:<40} {result['status']} p50={result['p50_ms']:>8.2f}ms "
+                                  f"p99={result['p99_ms']:>8.2f}ms queries={result['queries']:>4} "
+                                  f"bytes={result['bytes']}")
+
+        report = build_report(results, label=options['label'], iterations=options['iterations'],
+                              cold=options['cold'], dataset=self.dataset_size())
+        if options['output']:
+            write_report(report, options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                for row in compare_reports(json.load(baseline), report):
+                    self.stdout.write(f"{row['name']:<40} {row['before']:>8.2f} -> {row['after']:>8.2f}ms "
+                                      f"({row['change']}%) queries {row['queries_before']} -> {row['queries_after']}")
+
+    def run_scenario(self, scenario, options):
+        client = Client()
+        headers = {}
+        if scenario.get('user') is not None:
+            token, _ = Token.objects.get_or_create(user=scenario['user'])
+            headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        last = {}
+
+        def request():
+            response = getattr(client, scenario['method'])(
+                scenario['url'], scenario.get('data'), content_type='application/json', **headers)
+            last['status'] = response.status_code
+            if response.streaming:
+                return sum(len(chunk) for chunk in response.streaming_content)
+            return len(response.content)
+
+        result = measure(request, iterations=options['iterations'], warmup=options['warmup'],
+                         rollback=scenario['method'] not in ('get', 'head'),
+                         before=self.clear_caches if options['cold'] else None)
+        result['status'] = last.get('status')
+        return result
+
+    @staticmethod
+    def clear_caches():
+        for cache in caches.all():
+            cache.clear()
+        get_local_cache().clear()
+
+    def get_scenarios(self, f):
+        viewer, post, comment = f['viewer'], f['post'], f['comment']
+        post_kwargs = {'post_id': post.pk}
+        scenarios = [
+            # post/urls.py
+            ('post-list', 'get', reverse('post-list'), None, None),
+            ('post-list:auth', 'get', reverse('post-list'), viewer, None),
+            ('post-list:search', 'get', reverse('post-list') + '?search=django%20cache', None, None),
+            ('post-list:create', 'post', reverse('post-list'), viewer, {'title': 'bench', 'content': 'bench'}),
+            ('post-detail', 'get', reverse('post-detail', kwargs={'pk': post.pk}), None, None),
+            ('post-detail:auth', 'get', reverse('post-detail', kwargs={'pk': post.pk}), viewer, None),
+            ('post-detail:update', 'patch', reverse('post-detail', kwargs={'pk': post.pk}), post.user,
+             {'title': 'bench'}),
+            ('post-detail:delete', 'delete', reverse('post-detail', kwargs={'pk': post.pk}), post.user, None),
+            ('comment-list', 'get', reverse('comment-list', kwargs=post_kwargs), None, None),
+            ('comment-threads', 'get', reverse('comment-threads', kwargs=post_kwargs), None, None),
+            ('comment-list:create', 'post', reverse('comment-list', kwargs=post_kwargs), viewer,
+             {'content': 'bench', 'parent': comment.pk if comment else None}),
+            ('post-like:like', 'post', reverse('post-like', kwargs=post_kwargs), viewer, None),
+            ('post-like:unlike', 'delete', reverse('post-like', kwargs=post_kwargs), viewer, None),
+            ('post-bulk-like:like', 'post', reverse('post-bulk-like'), viewer, {'post_ids': f['post_ids']}),
+            ('post-bulk-like:unlike', 'delete', reverse('post-bulk-like'), viewer, {'post_ids': f['post_ids']}),
+            ('post-feed', 'get', reverse('post-feed'), viewer, None),
+            ('post-feed:ranked', 'get', reverse('post-feed') + '?order=ranked', viewer, None),
+            ('post-trending', 'get', reverse('post-trending'), None, None),
+            ('post-trending:1h', 'get', reverse('post-trending') + '?hours=1', None, None),
+            ('async-post-feed', 'get', reverse('async-post-feed'), viewer, None),
+            ('async-post-like:like', 'post', reverse('async-post-like', kwargs=post_kwargs), viewer, None),
+
+            # accounts/urls.py
+            ('signup', 'post', reverse('signup'), None,
+             {'username': 'bench_signup', 'password': BENCH_PASSWORD, 'confirm_password': BENCH_PASSWORD}),
+            ('auth_token', 'post', reverse('auth_token'), None,
+             {'username': viewer.username, 'password': BENCH_PASSWORD}),
+            ('logout', 'post', reverse('logout'), viewer, None),
+            ('profile', 'get', reverse('profile'), viewer, None),
+            ('profile:update', 'patch', reverse('profile'), viewer, {'first_name': 'bench'}),
+            ('profile_follower', 'get', reverse('profile_follower', kwargs={'username': f['celebrity'].username}),
+             None, None),
+            ('profile_following', 'get', reverse('profile_following', kwargs={'username': viewer.username}),
+             None, None),
+            ('profile_export', 'get', reverse('profile_export'), f['celebrity'], None),
+            ('profile_delete', 'delete', reverse('profile_delete'), viewer, None),
+            ('change_password', 'patch', reverse('change_password'), viewer,
+             {'old_password': BENCH_PASSWORD, 'new_password': BENCH_PASSWORD, 'confirm_password': BENCH_PASSWORD}),
+            ('profile_other', 'get', reverse('profile_other', kwargs={'username': f['celebrity'].username}),
+             viewer, None),
+            ('follow:follow', 'post', reverse('follow', kwargs={'username': f['stranger'].username}), viewer, None),
+            ('follow:unfollow', 'delete', reverse('follow', kwargs={'username': f['celebrity'].username}),
+             viewer, None),
+            ('follow_suggestions', 'get', reverse('follow_suggestions'), viewer, None),
+            ('async-follow:follow', 'post', reverse('async-follow', kwargs={'username': f['stranger'].username}),
+             viewer, None),
+            ('profile-post-list', 'get', reverse('profile-post-list'), viewer, None),
+            ('profile-post-list:create', 'post', reverse('profile-post-list'), viewer,
+             {'title': 'bench', 'content': 'bench'}),
+            ('profile_post_detail', 'get', reverse('profile_post_detail', kwargs={'pk': f['viewer_post'].pk}),
+             f['viewer_post'].user, None),
+            ('profile_other_post_list', 'get',
+             reverse('profile_other_post_list', kwargs={'username': f['celebrity'].username}), None, None),
+        ]
+        if comment is not None:
+            comment_kwargs = {'post_id': post.pk, 'comment_id': comment.pk}
+            scenarios += [
+                ('comment-detail', 'get', reverse('comment-detail', kwargs=comment_kwargs), None, None),
+                ('comment-replies', 'get', reverse('comment-replies', kwargs=comment_kwargs), None, None),
+                ('comment-detail:update', 'patch', reverse('comment-detail', kwargs=comment_kwargs), comment.user,
+                 {'content': 'bench'}),
+            ]
+        return [dict(zip(('name', 'method', 'url', 'user', 'data'), scenario)) for scenario in scenarios]
+
+    def check_coverage(self, scenarios):
+        covered = {scenario['name'].split(':')[0] for scenario in scenarios}
+        names = {pattern.name for pattern in post_urls.urlpatterns + accounts_urls.urlpatterns if pattern.name}
+        missing = sorted(names - covered)
+        if missing:
+            self.stderr.write(self.style.WARNING(f"No benchmark scenario for: {', '.join(missing)}"))
+
+    @staticmethod
+    def dataset_size():
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        return {
+            'users': users.count(),
+            'follows': Follow.objects.filter(follower__in=users).count(),
+            'posts': Post.objects.filter(user__in=users).count(),
+            'comments': Comment.objects.filter(post__user__in=users).count(),
+        }
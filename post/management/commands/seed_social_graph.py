@@ -0,0 +1,167 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Follow
+from post.models import Post, Like, Comment, comment_path_segment
+from post.services import reconcile_counters, recompute_scores
+from post.timeline import get_timeline_store
+
+USERNAME_PREFIX = 'bench_'
+BENCH_PASSWORD = 'bench-password'
+
+
+def power_law(rng, alpha, minimum, maximum):
+    # inverse transform sampling of a truncated Pareto distribution
+    value = minimum * (1 - rng.random()) ** (-1 / alpha)
+    return int(min(value, maximum))
+
+
+class Command(BaseCommand):
+    help = ('Generate a reproducible synthetic dataset: power-law follower graph, posts, likes and deep '
+            'comment threads. All users are named bench_<n> and share the password "bench-password".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--posts-per-user', type=float, default=5, help='Mean number of posts per user.')
+        parser.add_argument('--max-following', type=int, default=200)
+        parser.add_argument('--likes-per-post', type=float, default=8, help='Mean number of likes per post.')
+        parser.add_argument('--threads', type=int, default=50, help='Number of posts that get a comment thread.')
+        parser.add_argument('--comments-per-thread', type=int, default=60)
+        parser.add_argument('--reply-depth-bias', type=float, default=0.6,
+                            help='Probability that a comment replies to the newest comment (deeper threads).')
+        parser.add_argument('--alpha', type=float, default=1.3, help='Power-law exponent of degrees and popularity.')
+        parser.add_argument('--days', type=int, default=30, help='Spread post timestamps over this many days.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated bench_ users first.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        existing = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        if existing.exists():
+            if not options['clear']:
+                raise CommandError('A generated dataset already exists, use --clear to replace it.')
+            existing.delete()
+
+        with transaction.atomic():
+            users = self.create_users(options)
+            self.create_follows(rng, users, options)
+            posts = self.create_posts(rng, users, options)
+            self.create_likes(rng, users, posts, options)
+            comments = self.create_threads(rng, users, posts, options)
+
+        reconcile_counters(Post.objects.filter(user__in=users))
+        recompute_scores(Post.objects.filter(user__in=users))
+        store = get_timeline_store()
+        for user in users:
+            store.rebuild(user)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(users)} users, {Follow.objects.filter(follower__in=users).count()} follows, '
+            f'{len(posts)} posts, {Like.objects.filter(user__in=users).count()} likes, {comments} comments.'))
+
+    def create_users(self, options):
+        password = make_password(BENCH_PASSWORD)
+        users = [User(username=f'{USERNAME_PREFIX}{index}', password=password) for index in range(options['users'])]
+        User.objects.bulk_create(users, batch_size=500)
+        return list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk'))
+
+    @staticmethod
+    def popularity(users, alpha):
+        # Zipf-like weights: a few accounts attract most follows and likes
+        return [1 / (rank + 1) ** alpha for rank in range(len(users))]
+
+    def create_follows(self, rng, users, options):
+        weights = self.popularity(users, options['alpha'])
+        follows = set()
+        for follower in users:
+            degree = power_law(rng, options['alpha'], 1, min(options['max_following'], len(users) - 1))
+            for following in rng.choices(users, weights=weights, k=degree):
+                if following.pk != follower.pk:
+                    follows.add((follower.pk, following.pk))
+        Follow.objects.bulk_create(
+            [Follow(follower_id=follower, following_id=following) for follower, following in sorted(follows)],
+            batch_size=1000,
+        )
+
+    def create_posts(self, rng, users, options):
+        now = timezone.now()
+        span = timedelta(days=options['days']).total_seconds()
+        posts = []
+        for user in users:
+            # Pareto with alpha 2 has a mean of twice its minimum
+            count = power_law(rng, 2.0, options['posts_per_user'] / 2, options['posts_per_user'] * 20)
+            for index in range(count):
+                posts.append(Post(
+                    user=user,
+                    title=f'{user.username} post {index}',
+                    content=' '.join(rng.choices(WORDS, k=rng.randint(10, 80))),
+                ))
+        Post.objects.bulk_create(posts, batch_size=500)
+        # auto_now_add ignores explicit values, spread the timestamps afterwards
+        for post in posts:
+            post.created = now - timedelta(seconds=rng.random() * span)
+        Post.objects.bulk_update(posts, ['created'], batch_size=500)
+        return posts
+
+    def create_likes(self, rng, users, posts, options):
+        if not posts:
+            return
+        weights = self.popularity(users, options['alpha'])
+        mean_weight = sum(weights) / len(weights)
+        rank = {user.pk: index for index, user in enumerate(users)}
+        likes = set()
+        for post in posts:
+            # posts of popular authors get more likes, the mean stays at --likes-per-post
+            expected = options['likes_per_post'] * weights[rank[post.user_id]] / mean_weight
+            count = min(len(users), int(expected) + (rng.random() < expected % 1))
+            for user in rng.sample(users, count):
+                likes.add((user.pk, post.pk))
+        Like.objects.bulk_create([Like(user_id=user, post_id=post) for user, post in sorted(likes)],
+                                 batch_size=1000)
+
+    def create_threads(self, rng, users, posts, options):
+        total = 0
+        for post in rng.sample(posts, min(len(posts), options['threads'])):
+            # decide the tree shape first, then insert level by level so parents have ids
+            parents = []
+            for index in range(options['comments_per_thread']):
+                if index == 0 or rng.random() < 0.15:
+                    parents.append(None)
+                elif rng.random() < options['reply_depth_bias']:
+                    parents.append(index - 1)
+                else:
+                    parents.append(rng.randrange(index))
+            if not parents:
+                continue
+            depth = []
+            for parent in parents:
+                depth.append(0 if parent is None else depth[parent] + 1)
+
+            comments = [Comment(post=post, user=rng.choice(users), content=' '.join(rng.choices(WORDS, k=12)))
+                        for _ in parents]
+            for level in range(max(depth) + 1):
+                batch = [index for index, value in enumerate(depth) if value == level]
+                for index in batch:
+                    if parents[index] is not None:
+                        comments[index].parent_id = comments[parents[index]].pk
+                Comment.objects.bulk_create([comments[index] for index in batch])
+            for index, comment in enumerate(comments):
+                parent_path = '' if parents[index] is None else comments[parents[index]].path
+                comment.path = parent_path + comment_path_segment(comment.pk)
+                comment.depth = depth[index]
+            Comment.objects.bulk_update(comments, ['path', 'depth'], batch_size=500)
+            total += len(comments)
+        return total
+
+
+WORDS = (
+    'django rest api feed post comment like follow timeline cache index query database python '
+    'thread reply user profile search token async stream export trending ranked score window '
+    'the a of and to in is for on with as by at from this that it be are was'
+).split()
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from post.timeline import get_timeline_store
+
+
+class Command(BaseCommand):
+    help = ('Cut the timelines that grew past depth + slack entries back to the newest depth entries. '
+            'Publishing never trims, run it every few minutes, e.g. from cron.')
+
+    def handle(self, *args, **options):
+        trimmed = get_timeline_store().trim_overgrown()
+        self.stdout.write(self.style.SUCCESS(f'Trimmed {trimmed} timelines.'))
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_timelines(apps, schema_editor):
+    depth = getattr(settings, 'TIMELINE', {}).get('OPTIONS', {}).get('depth', 800)
+    Follow = apps.get_model('accounts', 'Follow')
+    Post = apps.get_model('post', 'Post')
+    TimelineEntry = apps.get_model('post', 'TimelineEntry')
+    follower_ids = Follow.objects.values_list('follower_id', flat=True).distinct()
+    for follower_id in follower_ids.iterator():
+        following_ids = Follow.objects.filter(follower_id=follower_id).values_list('following_id', flat=True)
+        posts = Post.objects.filter(user__in=following_ids).order_by('-created').values_list('pk', 'created')[:depth]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=follower_id, post_id=pk, created=created) for pk, created in posts],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('post', '0004_comment_path'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='post.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created', '-post'], name='post_timeli_user_id_64d3a1_idx')],
+                'unique_together': {('user', 'post')},
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
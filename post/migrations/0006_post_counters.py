@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('post', 'Post')
+
+    def counted(model):
+        return Coalesce(Subquery(
+            model.objects.filter(post=OuterRef('pk')).order_by().values('post')
+            .annotate(total=Count('pk')).values('total')
+        ), Value(0))
+
+    Post.objects.update(like_count=counted(apps.get_model('post', 'Like')),
+                        comment_count=counted(apps.get_model('post', 'Comment')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0005_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:48
+
+from django.db import migrations
+
+# a copy of the SQL in post/search.py as it was when this migration was written,
+# SQLiteSearchBackend recreates the triggers from its own copy when they go missing
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE post_post_fts USING fts5(
+        title, content,
+        content='post_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """
+    CREATE TRIGGER post_post_fts_insert AFTER INSERT ON post_post BEGIN
+        INSERT INTO post_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    """
+    CREATE TRIGGER post_post_fts_delete AFTER DELETE ON post_post BEGIN
+        INSERT INTO post_post_fts(post_post_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    """
+    CREATE TRIGGER post_post_fts_update AFTER UPDATE OF title, content ON post_post BEGIN
+        INSERT INTO post_post_fts(post_post_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO post_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    "INSERT INTO post_post_fts(post_post_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS post_post_fts_insert',
+    'DROP TRIGGER IF EXISTS post_post_fts_delete',
+    'DROP TRIGGER IF EXISTS post_post_fts_update',
+    'DROP TABLE IF EXISTS post_post_fts',
+]
+
+# same expression as PostgresSearchBackend.vector(), so the planner can use the index
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX post_post_search_idx ON post_post USING gin ((
+        setweight(to_tsvector('english'::regconfig, COALESCE(title, '')), 'A')
+        || setweight(to_tsvector('english'::regconfig, COALESCE(content, '')), 'B')
+    ))
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    'DROP INDEX IF EXISTS post_post_search_idx',
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0006_post_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run_for_vendor({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:51
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_last_modified(apps, schema_editor):
+    apps.get_model('post', 'Post').objects.update(last_modified=F('updated'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0007_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='last_modified',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(backfill_last_modified, migrations.RunPython.noop),
+    ]
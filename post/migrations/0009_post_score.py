@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:06
+
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_scores(apps, schema_editor):
+    # same formula as post/ranking.py with the settings of the time
+    config = {'LIKE_WEIGHT': 1.0, 'COMMENT_WEIGHT': 2.0, 'GRAVITY': 45000, **getattr(settings, 'FEED_RANKING', {})}
+    Post = apps.get_model('post', 'Post')
+    posts = list(Post.objects.only('pk', 'like_count', 'comment_count', 'created'))
+    for post in posts:
+        engagement = config['LIKE_WEIGHT'] * post.like_count + config['COMMENT_WEIGHT'] * post.comment_count
+        post.score = math.log10(max(engagement, 1)) + post.created.timestamp() / config['GRAVITY']
+    Post.objects.bulk_update(posts, ['score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0008_post_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-score', '-id'], name='post_post_score_f0d1bb_idx'),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
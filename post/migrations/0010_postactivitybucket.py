@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0009_post_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostActivityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('likes', models.PositiveIntegerField(default=0)),
+                ('comments', models.PositiveIntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_buckets', to='post.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket'], name='post_postac_bucket_36aa3c_idx')],
+                'unique_together': {('post', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0012_soft_delete_deletionjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='postactivitybucket',
+            name='comments',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='postactivitybucket',
+            name='likes',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:10
+
+from django.db import migrations, models
+
+
+def hide_pending_accounts(apps, schema_editor):
+    # content of accounts deleted before this migration was hidden through User.is_active
+    DeletionJob = apps.get_model('post', 'DeletionJob')
+    Post = apps.get_model('post', 'Post')
+    Comment = apps.get_model('post', 'Comment')
+    user_ids = list(DeletionJob.objects.filter(kind='user').exclude(status='done').values_list('target_id', flat=True))
+    if user_ids:
+        Post.objects.filter(user_id__in=user_ids).update(is_deleted=True)
+        Comment.objects.filter(user_id__in=user_ids).update(is_deleted=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0013_activity_net_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='is_deleted',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(hide_pending_accounts, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,62 @@
-from datetime import timezone
-
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
 from django.urls import reverse
+from django.utils import timezone
+
+# Every comment stores the ids of its ancestors (and itself) as fixed-width
+# segments, e.g. '0000000003/0000000017/'. A subtree is then a single range
+# scan of the (post, path) index and ordering by path gives thread order.
+COMMENT_PATH_STEP = 10
+COMMENT_MAX_DEPTH = 200
+
+
+def comment_path_segment(pk):
+    return f'{pk:0{COMMENT_PATH_STEP}d}/'
+
+
+def comment_subtree(path, include_self=True):
+    # a range rather than LIKE 'prefix%', which SQLite runs as a full index scan: the
+    # subtree is every path from 'prefix/' up to (excluding) 'prefix0', '0' follows '/'
+    lower = {'path__gte': path} if include_self else {'path__gt': path}
+    return Q(**lower, path__lt=path[:-1] + '0')
+
 
 # Create your models here.
+class VisiblePostManager(models.Manager):
+    # deleted posts (and the posts of deleted accounts) are hidden from every query,
+    # until the deletion job (post/deletion.py) removes them; all_objects sees everything
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 class Post(models.Model):
     title = models.CharField(max_length=200)
     content = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # denormalized counters, only ever changed with F() in post/services.py
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # bumped by every write that changes the detail representation (post, its comments, likes),
+    # source of the ETag / Last-Modified headers in post/conditional.py
+    version = models.PositiveIntegerField(default=1, editable=False)
+    last_modified = models.DateTimeField(default=timezone.now, editable=False)
+    # time-decayed engagement, kept up to date by the like and comment writes in post/services.py
+    score = models.FloatField(default=0, editable=False)
+    # set by services.delete_post, the row and everything under it go in the background
+    is_deleted = models.BooleanField(default=False, editable=False)
+
+    objects = VisiblePostManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', '-id']),
+        ]
 
     def get_absolute_url(self):
         return reverse('post-detail', kwargs={'pk': self.pk})
@@ -18,6 +64,38 @@ class Post(models.Model):
     def __str__(self):
         return f"{self.title} - {self.user}"
 
+class TimelineEntry(models.Model):
+    # one row per (reader, post) written when the post is published, see post/timeline.py
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created = models.DateTimeField()
+
+    class Meta:
+        unique_together = (('user', 'post'),)
+        indexes = [
+            models.Index(fields=['user', '-created', '-post']),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in timeline of {self.user_id}"
+
+class PostActivityBucket(models.Model):
+    # likes and comments a post got in one time bucket, summed over a window for trending, see post/trending.py
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='activity_buckets')
+    bucket = models.DateTimeField()
+    # net counts: an unlike or a deleted comment subtracts in the bucket it happens in
+    likes = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (('post', 'bucket'),)
+        indexes = [
+            models.Index(fields=['bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} at {self.bucket}: {self.likes} likes, {self.comments} comments"
+
 class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
@@ -27,15 +105,111 @@ class Like(models.Model):
     def __str__(self):
         return f"{self.user.username} liked {self.post.title}"
 
+class VisibleCommentManager(models.Manager):
+    # the comments of deleted accounts, until the deletion job removes them
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 class Comment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
     content = models.TextField()
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE)
+    path = models.CharField(max_length=(COMMENT_PATH_STEP + 1) * COMMENT_MAX_DEPTH, db_index=True,
+                            editable=False, default='')
+    depth = models.PositiveIntegerField(default=0, editable=False)
+    # set by accounts.services.delete_user, the row goes with the account's deletion job
+    is_deleted = models.BooleanField(default=False, editable=False)
+
+    objects = VisibleCommentManager()
+    all_objects = models.Manager()
 
     class Meta:
         ordering = ['created']
+        indexes = [
+            models.Index(fields=['post', 'path']),
+            # newest top-level comments of a post, see recent_comments_prefetch()
+            models.Index(fields=['post', 'parent', '-created', '-id']),
+        ]
 
     def __str__(self):
         return f'{self.user.username} comment for {self.post}'
+
+    def build_path(self):
+        if self.parent_id is None:
+            return comment_path_segment(self.pk), 0
+        parent = Comment.all_objects.only('path', 'depth').get(pk=self.parent_id)
+        return parent.path + comment_path_segment(self.pk), parent.depth + 1
+
+    def is_ancestor_of(self, other):
+        return bool(self.path) and other.path.startswith(self.path)
+
+    def get_descendants(self, include_self=False):
+        return (Comment.objects.filter(comment_subtree(self.path, include_self), post_id=self.post_id)
+                .order_by('path'))
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self.path, self.depth = self.build_path()
+                Comment.all_objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            return
+
+        old_parent_id, old_path, old_depth = Comment.all_objects.filter(pk=self.pk).values_list(
+            'parent_id', 'path', 'depth').get()
+        if old_parent_id == self.parent_id or not old_path:
+            super().save(*args, **kwargs)
+            return
+
+        # reparent: the whole subtree moves with a single prefix rewrite
+        if self.parent_id is not None:
+            new_parent = Comment.all_objects.only('path').get(pk=self.parent_id)
+            if new_parent.path.startswith(old_path):
+                raise ValidationError("A comment can't be moved under itself or one of its replies.")
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.path, self.depth = self.build_path()
+            Comment.all_objects.filter(comment_subtree(old_path), post_id=self.post_id).update(
+                path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (self.depth - old_depth),
+            )
+
+    def delete(self, *args, **kwargs):
+        # collect the subtree in one range query instead of one query per level
+        if not self.path:
+            return super().delete(*args, **kwargs)
+        return Comment.all_objects.filter(comment_subtree(self.path), post_id=self.post_id).delete()
+
+
+class DeletionJob(models.Model):
+    # background removal of a deleted post or account in small batches, see post/deletion.py
+    POST, USER = 'post', 'user'
+    KINDS = ((POST, 'Post'), (USER, 'User'))
+    PENDING, DONE, FAILED = 'pending', 'done', 'failed'
+    STATUSES = ((PENDING, 'Pending'), (DONE, 'Done'), (FAILED, 'Failed'))
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    # no foreign key, the target row is deleted by the job itself
+    target_id = models.BigIntegerField()
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    # the phase in progress and the rows deleted so far per phase, a resumed job continues from here
+    phase = models.CharField(max_length=30, blank=True, default='')
+    progress = models.JSONField(default=dict, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    # a worker owns the job until then, an expired lease means the worker died
+    lease_until = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"delete {self.kind} {self.target_id} ({self.status}, {self.phase or 'not started'})"
@@ -0,0 +1,49 @@
+import math
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Log
+
+# Time-decayed engagement score of a post:
+#
+#     score = log10(max(LIKE_WEIGHT * likes + COMMENT_WEIGHT * comments, 1)) + created / GRAVITY
+#
+# The time term grows by 1 every GRAVITY seconds, so a post needs ten times the
+# engagement to outrank one published GRAVITY seconds later. Nothing in the formula
+# depends on the current time, so the stored value never goes stale: it only
+# changes when likes or comments do, and a ranked feed is an ORDER BY score over
+# an index instead of a computation at read time.
+
+DEFAULT_FEED_RANKING = {
+    'LIKE_WEIGHT': 1.0,
+    'COMMENT_WEIGHT': 2.0,
+    'GRAVITY': 45000,
+}
+
+
+def get_config():
+    return {**DEFAULT_FEED_RANKING, **getattr(settings, 'FEED_RANKING', {})}
+
+
+def rank_score(like_count, comment_count, created):
+    config = get_config()
+    engagement = config['LIKE_WEIGHT'] * like_count + config['COMMENT_WEIGHT'] * comment_count
+    return math.log10(max(engagement, 1)) + created.timestamp() / config['GRAVITY']
+
+
+def _engagement(likes, comments):
+    config = get_config()
+    return Greatest(likes * Value(float(config['LIKE_WEIGHT'])) + comments * Value(float(config['COMMENT_WEIGHT'])),
+                    Value(1.0))
+
+
+def score_change(like_delta=0, comment_delta=0, like_count=None):
+    """
+    Expression for the new score after the counters move by the given deltas (or
+    like_count is replaced by an expression), for use in the same UPDATE as the
+    counters. It is computed from the old column values, so pass it first.
+    """
+    new_likes = like_count if like_count is not None else F('like_count') + like_delta
+    old = _engagement(F('like_count'), F('comment_count'))
+    new = _engagement(new_likes, F('comment_count') + comment_delta)
+    return F('score') + Log(Value(10.0), new) - Log(Value(10.0), old)
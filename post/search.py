@@ -0,0 +1,184 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+
+# Full-text search over Post.title / Post.content. The index itself is created
+# by migration 0007 and kept in sync by the database (FTS5 triggers on SQLite,
+# an expression GIN index on PostgreSQL), so post create/update/delete needs
+# no application code.
+#
+# Snippets come back from the database with the matches between two control
+# characters instead of markup; highlight() escapes the post text and only then
+# turns them into <mark> tags, so a snippet is safe to render as HTML.
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 8
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+# created by migration 0007 (which has its own copy), recreated by SQLiteSearchBackend.ensure_triggers()
+SQLITE_FTS_TABLE = """
+    CREATE VIRTUAL TABLE post_post_fts USING fts5(
+        title, content,
+        content='post_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )"""
+SQLITE_TRIGGERS = {
+    'post_post_fts_insert': """
+        CREATE TRIGGER post_post_fts_insert AFTER INSERT ON post_post BEGIN
+            INSERT INTO post_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END""",
+    'post_post_fts_delete': """
+        CREATE TRIGGER post_post_fts_delete AFTER DELETE ON post_post BEGIN
+            INSERT INTO post_post_fts(post_post_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+        END""",
+    # only text changes touch the index, counter updates on post_post don't
+    'post_post_fts_update': """
+        CREATE TRIGGER post_post_fts_update AFTER UPDATE OF title, content ON post_post BEGIN
+            INSERT INTO post_post_fts(post_post_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO post_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END""",
+}
+
+
+def search_terms(query):
+    return TERM_RE.findall(query)[:MAX_TERMS]
+
+
+def highlight(snippet):
+    """HTML of a backend snippet: the text escaped, the matches wrapped in <mark>."""
+    if not snippet:
+        return ''
+    return escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+class SQLiteSearchBackend:
+    table = 'post_post_fts'
+    triggers = SQLITE_TRIGGERS
+
+    def search(self, queryset, terms):
+        # every term is a quoted prefix query: "foo"* "bar"* (implicit AND)
+        match = ' '.join(f'"{term}"*' for term in terms)
+        lookup = f'FROM {self.table} WHERE {self.table} MATCH %s AND {self.table}.rowid = "post_post"."id"'
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', (match,))
+        ).annotate(
+            # bm25 is "lower is better" - negate so both backends rank descending, title weighs more than content
+            search_rank=RawSQL(f'SELECT -bm25({self.table}, 4.0, 1.0) {lookup}', (match,)),
+            search_snippet=RawSQL(f"SELECT snippet({self.table}, -1, %s, %s, '…', 16) {lookup}",
+                                  (MATCH_START, MATCH_END, match)),
+        )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')")
+
+    def ensure_triggers(self):
+        # SQLite drops triggers whenever a migration rebuilds post_post, put them back and reindex
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", [self.table])
+            if not cursor.fetchone():
+                return
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'post_post'")
+            existing = {name for name, in cursor.fetchall()}
+            missing = [sql for name, sql in self.triggers.items() if name not in existing]
+            for sql in missing:
+                cursor.execute(sql)
+        if missing:
+            self.rebuild()
+
+
+class PostgresSearchBackend:
+    config = 'english'
+    index_name = 'post_post_search_idx'
+
+    def vector(self):
+        from django.contrib.postgres.search import SearchVector
+
+        # must stay identical to the indexed expression in migration 0007
+        return (SearchVector('title', weight='A', config=self.config)
+                + SearchVector('content', weight='B', config=self.config))
+
+    def search(self, queryset, terms):
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+
+        query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=self.config)
+        return queryset.annotate(search_vector=self.vector()).filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            search_snippet=SearchHeadline('content', query, config=self.config, start_sel=MATCH_START,
+                                          stop_sel=MATCH_END, max_words=16, min_words=8),
+        )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'REINDEX INDEX {self.index_name}')
+
+
+class LikeSearchBackend:
+    # other databases: no index, same contract as DRF's SearchFilter
+    def search(self, queryset, terms):
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(content__icontains=term)
+        return queryset.filter(condition).annotate(search_rank=F('id'), search_snippet=F('title'))
+
+    def rebuild(self):
+        pass
+
+
+def ensure_search_index(sender, using='default', **kwargs):
+    if connection.vendor == 'sqlite' and using == connection.alias:
+        SQLiteSearchBackend().ensure_triggers()
+
+
+VENDOR_BACKENDS = {
+    'sqlite': 'post.search.SQLiteSearchBackend',
+    'postgresql': 'post.search.PostgresSearchBackend',
+}
+
+
+def get_search_backend():
+    path = getattr(settings, 'POST_SEARCH_BACKEND', None)
+    path = path or VENDOR_BACKENDS.get(connection.vendor, 'post.search.LikeSearchBackend')
+    return import_string(path)()
+
+
+class PostSearchFilter(BaseFilterBackend):
+    """
+    Ranked full-text search with `?search=`. Every term is matched as a prefix, results
+    come ordered by relevance (unless `?ordering=` is given) and carry a highlighted snippet.
+    """
+    search_param = 'search'
+    ordering_param = 'ordering'
+
+    def get_search_terms(self, request):
+        return search_terms(request.query_params.get(self.search_param, ''))
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        queryset = get_search_backend().search(queryset, terms)
+        if not request.query_params.get(self.ordering_param):
+            queryset = queryset.order_by('-search_rank', '-id')
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Full-text search in title and content, every word is matched as a prefix.',
+                'schema': {
+                    'type': 'string',
+                },
+            },
+        ]
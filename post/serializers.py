@@ -1,6 +1,20 @@
+from django.db.models import Count, OuterRef, Prefetch, Subquery, Value, prefetch_related_objects
+from django.db.models.functions import Coalesce
+from django.urls import reverse
 from rest_framework import serializers
 
-from post.models import Post, Comment, Like
+from accounts.viewer import ViewerListSerializer, get_viewer
+from social_media.fast_serializers import ValuesSerializer, url_builder
+from social_media.pagination import KeysetPagination
+from social_media.sparse_fields import SparseFieldsMixin, wants_field
+
+from post.models import Post, Comment, Like, COMMENT_MAX_DEPTH
+from post.search import highlight
+from post.threads import REPLY_ORDERING
+
+BULK_LIKE_LIMIT = 100
+# top-level comments embedded in a post detail, the rest is paged through comments_url
+RECENT_COMMENTS_LIMIT = 5
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -13,30 +27,74 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'user', 'created', 'post')
 
     def validate_parent(self, value):
-        request = self.context.get('request')
-        post = self.context.get('post')
-        if value and value.post_id != post.pk:
+        # an update stays within the comment's post, a new comment gets its post from the view
+        post_id = self.instance.post_id if self.instance else self.context['post'].pk
+        if value and value.post_id != post_id:
             raise serializers.ValidationError("Parent comment does not belong to this post.")
+        if value and self.instance and self.instance.is_ancestor_of(value):
+            raise serializers.ValidationError("A comment can't be moved under itself or one of its replies.")
+        if value and value.depth + 1 >= COMMENT_MAX_DEPTH:
+            raise serializers.ValidationError("This thread is too deep to reply to.")
         return value
 
 
-def get_descendants(comment):
-    descendants = []
-    children = Comment.objects.filter(parent=comment)
-    for child in children:
-        descendants.append(child)
-        descendants.extend(get_descendants(child))
-    return descendants
+class CommentTreeSerializer(CommentSerializer):
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ('depth',)
+        read_only_fields = CommentSerializer.Meta.read_only_fields + ('depth',)
+
+
+class CommentPreviewSerializer(CommentSerializer):
+    reply_count = serializers.IntegerField(read_only=True)
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ('reply_count',)
+        read_only_fields = fields
+
+
+def recent_comments_prefetch(limit=RECENT_COMMENTS_LIMIT):
+    """
+    Newest `limit` top-level comments of every post with their authors and direct reply
+    counts, in one query for all posts (a sliced Prefetch is a ROW_NUMBER() window).
+    """
+    replies = Comment.objects.filter(parent=OuterRef('pk')).order_by().values('parent').annotate(
+        total=Count('pk')).values('total')
+    comments = (Comment.objects.filter(parent=None).select_related('user')
+                .annotate(reply_count=Coalesce(Subquery(replies), Value(0)))
+                .order_by('-created', '-id')[:limit])
+    return Prefetch('comment_set', queryset=comments, to_attr='recent_comments')
+
+
+class CommentThreadSerializer(CommentSerializer):
+    # the first comments of the subtree, see post/threads.py
+    replies = CommentTreeSerializer(source='first_replies', many=True, read_only=True)
+    more_replies = serializers.SerializerMethodField()
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ('replies', 'more_replies')
+        read_only_fields = fields
+
+    def get_more_replies(self, obj) -> str | None:
+        if not obj.has_more_replies:
+            return None
+        url = reverse('comment-replies', kwargs={'post_id': obj.post_id, 'comment_id': obj.pk})
+        request = self.context.get('request')
+        if request:
+            url = request.build_absolute_uri(url)
+        return KeysetPagination().get_link_after(url, REPLY_ORDERING, obj.first_replies[-1])
+
 
-class CommentDetailSerializer(serializers.ModelSerializer):
+class CommentDetailSerializer(CommentSerializer):
     children = serializers.SerializerMethodField()
 
     class Meta(CommentSerializer.Meta):
-        fields = CommentSerializer.Meta.fields + ('children',)
+        fields = CommentSerializer.Meta.fields + ('depth', 'children',)
+        read_only_fields = CommentSerializer.Meta.read_only_fields + ('depth',)
 
     def get_children(self, obj):
-        descendants = get_descendants(obj)
-        return CommentSerializer(descendants, many=True).data
+        # whole subtree in one indexed range query, already in thread order
+        descendants = obj.get_descendants().select_related('user')
+        return CommentTreeSerializer(descendants, many=True).data
 
 
 class CommentFlatSerializer(serializers.ModelSerializer):
@@ -49,7 +107,7 @@ class CommentFlatSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'user', 'created', 'post')
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.SlugRelatedField(slug_field='username', read_only=True)
     detail_url = serializers.SerializerMethodField()
 
@@ -57,6 +115,8 @@ class PostSerializer(serializers.ModelSerializer):
         model = Post
         fields = ('title', 'user', 'detail_url')
         read_only_fields = ('user', 'detail_url')
+        list_serializer_class = ViewerListSerializer
+        expandable_fields = {'user': 'accounts.serializers.ProfileSerializer'}
 
     def get_detail_url(self, obj):
         request = self.context.get('request')
@@ -65,6 +125,37 @@ class PostSerializer(serializers.ModelSerializer):
         return obj.get_absolute_url()
 
 
+class PostValuesSerializer(ValuesSerializer):
+    """Same output as PostSerializer from values() rows, for list views (see social_media/fast_serializers.py)."""
+    lookups = ('title', 'user__username')
+
+    def serialize(self, rows):
+        detail_url = url_builder(self.context.get('request'), 'post-detail', 'pk')
+        return [{'title': row['title'], 'user': row['user__username'], 'detail_url': detail_url(row['id'])}
+                for row in rows]
+
+
+class PostSearchSerializer(PostSerializer):
+    # HTML, see post/search.py
+    snippet = serializers.SerializerMethodField()
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ('snippet',)
+        read_only_fields = PostSerializer.Meta.read_only_fields + ('snippet',)
+
+    def get_snippet(self, obj) -> str:
+        return highlight(getattr(obj, 'search_snippet', ''))
+
+
+class TrendingPostSerializer(PostSerializer):
+    likes = serializers.IntegerField(source='activity_likes', read_only=True)
+    comments = serializers.IntegerField(source='activity_comments', read_only=True)
+    score = serializers.FloatField(source='activity_score', read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ('likes', 'comments', 'score')
+
+
 class PostCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
@@ -72,23 +163,65 @@ class PostCreateSerializer(serializers.ModelSerializer):
         read_only_fields = ('user',)
 
 
+class PostBulkLikeSerializer(serializers.Serializer):
+    post_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                     max_length=BULK_LIKE_LIMIT)
+
+    def validate_post_ids(self, value):
+        # keep the request order, drop duplicates
+        return list(dict.fromkeys(value))
+
+
+class PostBulkLikeResultSerializer(serializers.Serializer):
+    post_id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=('liked', 'already_liked', 'unliked', 'not_liked', 'not_found'))
+    likes_count = serializers.IntegerField(allow_null=True)
+
+
 class PostDetailSerializer(PostSerializer):
     user = serializers.SlugRelatedField(slug_field='username', read_only=True)
     is_liked = serializers.SerializerMethodField()
-    comment_set = CommentSerializer(many=True, read_only=True)
-    # for nested serializers must use related name for nested field.
-    comment_count = serializers.IntegerField(source='comment_set.count', read_only=True)
-    like_count = serializers.IntegerField(source='like_set.count', read_only=True)
+    # only the newest top-level comments, see recent_comments_prefetch()
+    comment_set = CommentPreviewSerializer(source='recent_comments', many=True, read_only=True)
+    comments_url = serializers.SerializerMethodField()
+    comment_count = serializers.IntegerField(read_only=True)
+    like_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Post
-        fields = ('title', 'content', 'user', 'created', 'comment_set', 'comment_count', 'is_liked', 'like_count')
+        fields = ('title', 'content', 'user', 'created', 'comment_set', 'comments_url', 'comment_count', 'is_liked',
+                  'like_count')
         read_only_fields = ('user', 'created')
+        list_serializer_class = ViewerListSerializer
+        expandable_fields = {'user': 'accounts.serializers.ProfileSerializer'}
+
+    @staticmethod
+    def setup_queryset(queryset, request):
+        """Joins and prefetches for the fields the request will render, see social_media/sparse_fields.py."""
+        if wants_field(request, 'user'):
+            queryset = queryset.select_related('user')
+        if wants_field(request, 'comment_set'):
+            queryset = queryset.prefetch_related(recent_comments_prefetch())
+        return queryset
+
+    def to_representation(self, instance):
+        if 'comment_set' in self.fields and not hasattr(instance, 'recent_comments'):
+            # e.g. the response of an update, the view's queryset prefetches them
+            prefetch_related_objects([instance], recent_comments_prefetch())
+        return super().to_representation(instance)
+
+    def get_comments_url(self, obj):
+        url = reverse('comment-list', kwargs={'post_id': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def prime_viewer(self, viewer, posts):
+        if 'is_liked' in self.fields:
+            viewer.prime_posts(posts)
 
     def get_is_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            liked = obj.like_set.filter(user=request.user).exists()
-            # liked = Like.objects.filter(post=obj, user=request.user).exists()
-            return liked
+            # answered from a per-request set, see accounts/viewer.py
+            return get_viewer(self.context).is_liked(obj)
         return False
@@ -0,0 +1,201 @@
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from social_media.db import insert_ignore
+from . import cache, deletion, trending
+from .models import Post, Like, Comment, DeletionJob
+from .ranking import rank_score, score_change
+from .timeline import get_timeline_store
+
+# Write paths for posts, likes and comments. Each one keeps the denormalized
+# counters on Post in the same transaction (so reads never count rows) and
+# bumps the response cache versions of what it changed.
+
+
+def adjust_counters(post_id, **deltas):
+    # the score reads the old counters, so it goes first (MySQL assigns left to right)
+    score = {}
+    if deltas:
+        score['score'] = score_change(deltas.get('like_count', 0), deltas.get('comment_count', 0))
+    Post.all_objects.filter(pk=post_id).update(
+        **score,
+        version=F('version') + 1,
+        last_modified=timezone.now(),
+        **{field: F(field) + delta for field, delta in deltas.items()},
+    )
+
+
+def touch_post(post_id):
+    adjust_counters(post_id)
+
+
+def get_like_count(post_id):
+    return Post.objects.filter(pk=post_id).values_list('like_count', flat=True).get()
+
+
+def create_post(serializer, user):
+    # a post is published with its timeline entries or not at all
+    with transaction.atomic():
+        post = serializer.save(user=user, score=rank_score(0, 0, timezone.now()))
+        get_timeline_store().fan_out(post)
+    cache.bump(cache.posts_resource())
+    return post
+
+
+def update_post(serializer, **kwargs):
+    with transaction.atomic():
+        post = serializer.save(**kwargs)
+        touch_post(post.pk)
+    cache.bump(cache.posts_resource(), cache.post_resource(post.pk))
+    return post
+
+
+def delete_post(post):
+    # hidden at once, the rows are removed in batches by the deletion job (deletion.py)
+    with transaction.atomic():
+        Post.all_objects.filter(pk=post.pk).update(is_deleted=True, version=F('version') + 1)
+        deletion.schedule(DeletionJob.POST, post.pk)
+    cache.bump(cache.posts_resource(), cache.post_resource(post.pk))
+
+
+def like_post(user, post):
+    with transaction.atomic():
+        # one idempotent INSERT, a concurrent double tap can't raise or count twice
+        created = insert_ignore(Like, user=user, post=post)
+        if created:
+            adjust_counters(post.pk, like_count=1)
+            trending.record_activity([post.pk], likes=1)
+    if created:
+        cache.bump(cache.post_resource(post.pk))
+    return created, get_like_count(post.pk)
+
+
+def unlike_post(user, post):
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, post=post).delete()
+        if deleted:
+            adjust_counters(post.pk, like_count=-deleted)
+            trending.record_activity([post.pk], likes=-deleted)
+    if deleted:
+        cache.bump(cache.post_resource(post.pk))
+    return bool(deleted), get_like_count(post.pk)
+
+
+def _like_state(user, post_ids):
+    # validation and the current state of every requested post in one query
+    liked = Like.objects.filter(user=user, post=OuterRef('pk'))
+    return dict(Post.objects.filter(pk__in=post_ids).annotate(liked=Exists(liked)).values_list('pk', 'liked'))
+
+
+def _recount_likes(post_ids):
+    """
+    Set like_count from the Like table in one grouped UPDATE. Recounting instead of adding
+    deltas keeps the counter right when a concurrent request inserted or removed the same row.
+    """
+    if post_ids:
+        Post.all_objects.filter(pk__in=post_ids).update(
+            score=score_change(like_count=counted(Like)),
+            like_count=counted(Like), version=F('version') + 1, last_modified=timezone.now())
+
+
+def _like_results(post_ids, state, changed, done, unchanged):
+    counts = dict(Post.objects.filter(pk__in=list(state)).values_list('pk', 'like_count'))
+    results = []
+    for post_id in post_ids:
+        if post_id not in state:
+            results.append({'post_id': post_id, 'status': 'not_found', 'likes_count': None})
+        else:
+            results.append({'post_id': post_id, 'status': done if post_id in changed else unchanged,
+                            'likes_count': counts[post_id]})
+    return results
+
+
+def bulk_like(user, post_ids):
+    """Like many posts at once, returns one result per post id in request order."""
+    with transaction.atomic():
+        state = _like_state(user, post_ids)
+        changed = [post_id for post_id, liked in state.items() if not liked]
+        # unique_together (user, post) turns a concurrent duplicate into a no-op
+        Like.objects.bulk_create([Like(user=user, post_id=post_id) for post_id in changed], ignore_conflicts=True)
+        _recount_likes(changed)
+        trending.record_activity(changed, likes=1)
+    if changed:
+        cache.bump(*[cache.post_resource(post_id) for post_id in changed])
+    return _like_results(post_ids, state, set(changed), 'liked', 'already_liked')
+
+
+def bulk_unlike(user, post_ids):
+    """Unlike many posts at once, returns one result per post id in request order."""
+    with transaction.atomic():
+        state = _like_state(user, post_ids)
+        changed = [post_id for post_id, liked in state.items() if liked]
+        if changed:
+            Like.objects.filter(user=user, post_id__in=changed).delete()
+        _recount_likes(changed)
+        trending.record_activity(changed, likes=-1)
+    if changed:
+        cache.bump(*[cache.post_resource(post_id) for post_id in changed])
+    return _like_results(post_ids, state, set(changed), 'unliked', 'not_liked')
+
+
+def create_comment(serializer, user, post):
+    with transaction.atomic():
+        comment = serializer.save(user=user, post=post)
+        adjust_counters(post.pk, comment_count=1)
+        trending.record_activity([post.pk], comments=1)
+    cache.bump(cache.post_resource(post.pk))
+    return comment
+
+
+def update_comment(serializer):
+    with transaction.atomic():
+        comment = serializer.save()
+        touch_post(comment.post_id)
+    cache.bump(cache.post_resource(comment.post_id))
+    return comment
+
+
+def delete_comment(comment):
+    # replies go with their parent, so the counter drops by the whole subtree
+    with transaction.atomic():
+        _, deleted = comment.delete()
+        count = deleted.get(Comment._meta.label, 0)
+        adjust_counters(comment.post_id, comment_count=-count)
+        trending.record_activity([comment.post_id], comments=-count)
+    cache.bump(cache.post_resource(comment.post_id))
+
+
+def counted(model):
+    return Coalesce(Subquery(
+        model._base_manager.filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('pk')).values('total')
+    ), Value(0))
+
+
+def reconcile_counters(queryset=None):
+    """Recompute the counters from the Like/Comment tables, returns the ids of posts that had drifted."""
+    queryset = Post.all_objects.all() if queryset is None else queryset
+    drifted = list(
+        queryset.annotate(actual_likes=counted(Like), actual_comments=counted(Comment))
+        .exclude(like_count=F('actual_likes'), comment_count=F('actual_comments'))
+        .values_list('pk', flat=True)
+    )
+    for start in range(0, len(drifted), 500):
+        Post.all_objects.filter(pk__in=drifted[start:start + 500]).update(
+            like_count=counted(Like), comment_count=counted(Comment))
+    recompute_scores(Post.all_objects.filter(pk__in=drifted))
+    return drifted
+
+
+def recompute_scores(queryset=None, batch_size=500):
+    """Set the score from the counters from scratch, e.g. after changing settings.FEED_RANKING."""
+    queryset = Post.all_objects.all() if queryset is None else queryset
+    batch, total = [], 0
+    for post in queryset.only('pk', 'like_count', 'comment_count', 'created').iterator(chunk_size=batch_size):
+        post.score = rank_score(post.like_count, post.comment_count, post.created)
+        batch.append(post)
+        if len(batch) == batch_size:
+            total += Post.all_objects.bulk_update(batch, ['score'])
+            batch = []
+    return total + Post.all_objects.bulk_update(batch, ['score'])
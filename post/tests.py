@@ -1,3 +1,978 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import random
+import tempfile
+from base64 import urlsafe_b64encode
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import Follow
+from social_media import fast_json
+from social_media.testing import APITestCase, APITransactionTestCase, reset_caches, run_concurrently, strict_budgets
+from . import cache, deletion, serializers, trending
+from .models import Comment, DeletionJob, Like, Post, PostActivityBucket, TimelineEntry
+from .ranking import rank_score
+from .services import reconcile_counters, recompute_scores
+from .timeline import DatabaseTimelineStore, get_timeline_store
+
+
+class CommentTreeTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice')
+        self.post = Post.objects.create(user=self.user, title='title', content='content')
+        self.root = self.comment('root')
+        self.reply = self.comment('reply', self.root)
+        self.nested = self.comment('nested', self.reply)
+        self.other_root = self.comment('other root')
+
+    def comment(self, content, parent=None, post=None):
+        return Comment.objects.create(user=self.user, post=post or self.post, content=content, parent=parent)
+
+    def test_path_and_depth(self):
+        self.assertEqual(self.root.depth, 0)
+        self.assertEqual(self.nested.depth, 2)
+        self.assertTrue(self.nested.path.startswith(self.reply.path))
+        self.assertTrue(self.root.is_ancestor_of(self.nested))
+        self.assertFalse(self.nested.is_ancestor_of(self.root))
+
+    def test_descendants_in_thread_order(self):
+        sibling = self.comment('sibling', self.root)
+        self.assertEqual(list(self.root.get_descendants()), [self.reply, self.nested, sibling])
+        self.assertEqual(list(self.root.get_descendants(include_self=True))[0], self.root)
+        self.assertEqual(list(self.other_root.get_descendants()), [])
+
+    def test_descendants_use_a_path_range(self):
+        with CaptureQueriesContext(connection) as queries:
+            list(self.root.get_descendants())
+        sql = queries[0]['sql']
+        self.assertNotIn('LIKE', sql)
+        self.assertIn('"post_id" =', sql)
+
+    def test_reparent_moves_the_subtree(self):
+        self.reply.parent = self.other_root
+        self.reply.save()
+        self.nested.refresh_from_db()
+        self.assertTrue(self.nested.path.startswith(self.other_root.path))
+        self.assertEqual(self.nested.depth, 2)
+        self.assertEqual(list(self.root.get_descendants()), [])
+        self.assertEqual(list(self.other_root.get_descendants()), [self.reply, self.nested])
+
+    def test_reparent_under_own_reply_is_rejected(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('comment-detail', args=[self.post.pk, self.root.pk])
+        response = self.client.patch(url, {'parent': self.nested.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_delete_removes_the_subtree(self):
+        deleted, _ = self.root.delete()
+        self.assertEqual(deleted, 3)
+        self.assertEqual(list(Comment.objects.values_list('pk', flat=True)), [self.other_root.pk])
+
+    def test_detail_children(self):
+        response = self.client.get(reverse('comment-detail', args=[self.post.pk, self.root.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(child['id'], child['depth']) for child in response.data['children']],
+                         [(self.reply.pk, 1), (self.nested.pk, 2)])
+
+
+class RecentCommentsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice')
+        self.client.force_authenticate(self.user)
+
+    def create_post(self, comments):
+        post = Post.objects.create(user=self.user, title='title', content='content')
+        for index in range(comments):
+            self.client.post(reverse('comment-list', args=[post.pk]), {'content': f'comment {index}'}, format='json')
+        return post
+
+    def test_newest_top_level_comments_with_reply_counts(self):
+        post = self.create_post(serializers.RECENT_COMMENTS_LIMIT + 2)
+        newest = Comment.objects.filter(post=post).latest('id')
+        for index in range(2):
+            self.client.post(reverse('comment-list', args=[post.pk]),
+                             {'content': f'reply {index}', 'parent': newest.pk}, format='json')
+        data = self.client.get(reverse('post-detail', args=[post.pk])).data
+        self.assertEqual(data['comment_count'], serializers.RECENT_COMMENTS_LIMIT + 4)
+        self.assertEqual([comment['content'] for comment in data['comment_set']],
+                         [f'comment {index}' for index in range(6, 1, -1)])
+        self.assertEqual([comment['reply_count'] for comment in data['comment_set']], [2, 0, 0, 0, 0])
+
+    def test_one_query_for_the_comments_of_every_post(self):
+        def serialize(posts):
+            queryset = serializers.PostDetailSerializer.setup_queryset(
+                Post.objects.filter(pk__in=[post.pk for post in posts]), None)
+            with CaptureQueriesContext(connection) as queries:
+                data = serializers.PostDetailSerializer(queryset, many=True).data
+            self.assertEqual([len(post['comment_set']) for post in data], [2] * len(posts))
+            return len(queries)
+
+        self.assertEqual(serialize([self.create_post(2)]), serialize([self.create_post(2) for _ in range(4)]))
+
+    def test_update_response_has_the_comments(self):
+        post = self.create_post(1)
+        response = self.client.patch(reverse('post-detail', args=[post.pk]), {'title': 'new'}, format='json')
+        self.assertEqual([comment['content'] for comment in response.data['comment_set']], ['comment 0'])
+
+class CommentThreadTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice')
+        self.post = Post.objects.create(user=self.user, title='title', content='content')
+        self.roots = []
+        for index in range(2):
+            root = Comment.objects.create(user=self.user, post=self.post, content=f'root {index}')
+            parent = root
+            for depth in range(5):
+                parent = Comment.objects.create(user=self.user, post=self.post, content=f'reply {depth}', parent=parent)
+            self.roots.append(root)
+
+    def test_threads_embed_the_first_replies(self):
+        url = reverse('comment-threads', args=[self.post.pk])
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'replies': 2})
+        threads = response.data['results']
+        self.assertEqual([thread['id'] for thread in threads], [root.pk for root in reversed(self.roots)])
+        for thread in threads:
+            self.assertEqual([reply['depth'] for reply in thread['replies']], [1, 2])
+            self.assertIsNotNone(thread['more_replies'])
+
+    def test_replies_follow_the_more_replies_cursor(self):
+        root = self.roots[0]
+        response = self.client.get(reverse('comment-threads', args=[self.post.pk]), {'replies': 2})
+        thread = next(thread for thread in response.data['results'] if thread['id'] == root.pk)
+        seen = [reply['id'] for reply in thread['replies']]
+        url = thread['more_replies']
+        while url:
+            with self.assertNumQueries(2):
+                page = self.client.get(url).data
+            seen += [reply['id'] for reply in page['results']]
+            url = page['next']
+        self.assertEqual(seen, [comment.pk for comment in root.get_descendants()])
+
+    def test_replies_of_an_unknown_comment(self):
+        other = Post.objects.create(user=self.user, title='other', content='other')
+        response = self.client.get(reverse('comment-replies', args=[other.pk, self.roots[0].pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice')
+        self.post = Post.objects.create(user=self.user, title='title', content='content')
+
+    def get(self, url):
+        response = self.client.get(url)
+        return response, response['X-Cache']
+
+    def test_anonymous_reads_are_cached(self):
+        url = reverse('post-detail', args=[self.post.pk])
+        self.assertEqual(self.get(url)[1], 'MISS')
+        with self.assertNumQueries(1):
+            # the condition lookup, the body comes from the cache
+            self.assertEqual(self.get(url)[1], 'HIT')
+
+    def test_writes_bump_the_list_and_the_detail(self):
+        list_url, detail_url = reverse('post-list'), reverse('post-detail', args=[self.post.pk])
+        self.get(list_url), self.get(detail_url)
+        other = User.objects.create_user('bob')
+        self.client.force_authenticate(other)
+        self.client.post(reverse('post-like', args=[self.post.pk]))
+        self.client.post(reverse('post-list'), {'title': 'new', 'content': 'new'}, format='json')
+        self.client.force_authenticate(None)
+        response, state = self.get(detail_url)
+        self.assertEqual((state, response.data['like_count']), ('MISS', 1))
+        response, state = self.get(list_url)
+        self.assertEqual((state, len(response.data['results'])), ('MISS', 2))
+
+    def test_profile_update_retires_cached_pages(self):
+        detail_url = reverse('post-detail', args=[self.post.pk])
+        self.get(detail_url)
+        etag = self.client.get(detail_url)['ETag']
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('profile'), {'username': 'alice2'}, format='json')
+        self.client.force_authenticate(None)
+        response, state = self.get(detail_url)
+        self.assertEqual((state, response.data['user']), ('MISS', 'alice2'))
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ConditionalRequestTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice')
+        self.post = Post.objects.create(user=self.user, title='title', content='content')
+        self.url = reverse('post-detail', args=[self.post.pk])
+        self.client.force_authenticate(self.user)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        self.assertFalse(response.content)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT').status_code,
+                         200)
+
+    def test_profile_change_moves_last_modified(self):
+        an_hour_ago = timezone.now() - datetime.timedelta(hours=1)
+        Post.objects.filter(pk=self.post.pk).update(last_modified=an_hour_ago)
+        cache.get_cache().set('resp-changed:users', an_hour_ago.timestamp(), None)
+        last_modified = self.client.get(self.url)['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('profile'), {'username': 'alice2'}, format='json')
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual((response.status_code, response.data['user']), (200, 'alice2'))
+
+    def test_likes_and_viewers_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        bob = User.objects.create_user('bob')
+        self.client.force_authenticate(bob)
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+        self.client.post(reverse('post-like', args=[self.post.pk]))
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data['like_count']), (200, 1))
+
+    def test_stale_if_match_is_rejected(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, {'title': 'first'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.patch(self.url, {'title': 'second'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.title, 'first')
+
+    def test_comment_etag_follows_its_post(self):
+        comment = Comment.objects.create(post=self.post, user=self.user, content='comment')
+        url = reverse('comment-detail', args=[self.post.pk, comment.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.post(reverse('comment-list', args=[self.post.pk]),
+                         {'content': 'reply', 'parent': comment.pk}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, len(response.data['children'])), (200, 1))
+        other = reverse('comment-detail', args=[self.post.pk + 1, comment.pk])
+        self.assertEqual(self.client.get(other).status_code, 404)
+
+class PostSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice')
+        self.title_match = Post.objects.create(user=self.user, title='Django caching', content='notes')
+        self.content_match = Post.objects.create(user=self.user, title='notes', content='some django tips')
+        Post.objects.create(user=self.user, title='unrelated', content='nothing here')
+
+    def search(self, query):
+        return self.client.get(reverse('post-list'), {'search': query}).data['results']
+
+    def test_ranked_prefix_matches(self):
+        results = self.search('djan')
+        self.assertEqual([result['title'] for result in results], ['Django caching', 'notes'])
+
+    def test_index_follows_updates_and_deletes(self):
+        Post.objects.filter(pk=self.title_match.pk).update(title='Flask caching')
+        Post.all_objects.filter(pk=self.content_match.pk).delete()
+        self.assertEqual(self.search('django'), [])
+        self.assertEqual(len(self.search('flask')), 1)
+
+    def test_snippet_escapes_the_post_text(self):
+        Post.objects.create(user=self.user, title='xss', content='<script>alert(1)</script> django <b>bold</b>')
+        snippet = next(result['snippet'] for result in self.search('django') if result['title'] == 'xss')
+        self.assertNotIn('<script>', snippet)
+        self.assertNotIn('<b>', snippet)
+        self.assertIn('&lt;script&gt;', snippet)
+        self.assertIn('<mark>django</mark>', snippet)
+
+
+
+
+
+class ValuesSerializerTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = User.objects.create_user('alice'), User.objects.create_user('bob')
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        for index in range(4):
+            Post.objects.create(user=self.bob if index % 2 else self.alice, title=f'post {index}', content='content')
+        get_timeline_store().rebuild(self.alice)
+        self.client.force_authenticate(self.alice)
+
+    def model_serialized(self, queryset):
+        request = Request(APIRequestFactory().get('/'))
+        return serializers.PostSerializer(queryset, many=True, context={'request': request}).data
+
+    def test_same_output_as_the_model_serializer(self):
+        queryset = Post.objects.select_related('user').order_by('-created', '-id')
+        values = serializers.PostValuesSerializer({'request': Request(APIRequestFactory().get('/'))})
+        self.assertEqual(values.serialize(values.prepare(queryset)), self.model_serialized(queryset))
+
+    def test_list_endpoints_match_the_model_serializer(self):
+        cases = [
+            (reverse('post-list') + '?ordering=title', Post.objects.order_by('title')),
+            (reverse('profile-post-list'), Post.objects.filter(user=self.alice).order_by('-created')),
+            (reverse('profile_other_post_list', args=['bob']), Post.objects.filter(user=self.bob).order_by('-created')),
+            (reverse('post-feed'), Post.objects.filter(user=self.bob).order_by('-created')),
+        ]
+        for url, queryset in cases:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).json()['results'], self.model_serialized(queryset))
+
+    def test_sparse_fields_apply_to_the_rows(self):
+        results = self.client.get(reverse('post-list') + '?fields=title,user').json()['results']
+        self.assertEqual(results[0], {'title': 'post 3', 'user': 'bob'})
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = User.objects.create_user('alice'), User.objects.create_user('bob')
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        self.post = Post.objects.create(user=self.bob, title='title', content='content', comment_count=1)
+        Comment.objects.create(post=self.post, user=self.alice, content='comment')
+        self.url = reverse('post-detail', args=[self.post.pk])
+        self.client.force_authenticate(self.alice)
+
+    def test_fields_drop_the_rest_and_their_queries(self):
+        with CaptureQueriesContext(connection) as full:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as sparse:
+            data = self.client.get(self.url + '?fields=title,like_count,unknown').data
+        self.assertEqual(data, {'title': 'title', 'like_count': 0})
+        # no comments prefetch, no like lookup
+        self.assertEqual(len(full) - len(sparse), 2)
+
+    def test_expand_nests_the_profile(self):
+        user = self.client.get(self.url + '?expand=user').data['user']
+        self.assertEqual((user['username'], user['is_following'], user['is_follower']), ('bob', True, False))
+        results = self.client.get(reverse('post-list') + '?expand=user&fields=user').json()['results']
+        self.assertEqual([(set(result), result['user']['username']) for result in results], [({'user'}, 'bob')])
+        # not expandable, left alone
+        self.assertEqual(self.client.get(self.url + '?expand=title').data['title'], 'title')
+
+    def test_writes_get_the_full_serializer(self):
+        self.client.force_authenticate(self.bob)
+        response = self.client.patch(self.url + '?fields=title&expand=user', {'title': 'new'}, format='json')
+        self.assertEqual((response.data['title'], response.data['user']), ('new', 'bob'))
+        self.assertIn('comment_set', response.data)
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice')
+        posts = [Post.objects.create(user=self.user, title=f'post {index}', content='content') for index in range(7)]
+        # ties on created, the id decides
+        Post.objects.filter(pk__in=[post.pk for post in posts[2:5]]).update(created=timezone.now())
+        self.expected = [post.pk for post in Post.objects.order_by('-created', '-id')]
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [int(post['detail_url'].rstrip('/').rsplit('/', 1)[1]) for post in response.data['results']], response
+
+    def walk(self, url):
+        seen = []
+        while url:
+            ids, response = self.get(url)
+            seen += ids
+            url = response.data['next']
+        return seen
+
+    def test_pages_cover_every_row_once_in_order(self):
+        self.assertEqual(self.walk(reverse('post-list') + '?page_size=2'), self.expected)
+
+    def test_previous_returns_the_same_page(self):
+        first, response = self.get(reverse('post-list') + '?page_size=3')
+        second, response = self.get(response.data['next'])
+        self.assertEqual(second, self.expected[3:6])
+        back, _ = self.get(response.data['previous'])
+        self.assertEqual(back, first)
+
+    def test_ordering_parameter(self):
+        self.assertEqual(self.walk(reverse('post-list') + '?page_size=2&ordering=title'),
+                         [post.pk for post in Post.objects.order_by('title', 'id')])
+
+    def test_cursor_of_another_ordering_is_rejected(self):
+        _, response = self.get(reverse('post-list') + '?page_size=2')
+        cursor = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+        url = reverse('post-list') + f'?page_size=2&ordering=title&cursor={cursor}'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('post-list') + '?cursor=garbage').status_code, 404)
+
+    def test_tampered_cursor_values_are_rejected(self):
+        def cursor(ordering, values):
+            payload = json.dumps({'o': ordering, 'v': values, 'r': False}).encode()
+            return urlsafe_b64encode(payload).decode()
+
+        for ordering, values in [(['-created', '-id'], ['abc', 1]), (['-created', '-id'], [['dt', 'x'], 1]),
+                                 (['-created', '-id'], [['dt', '2024-01-01T00:00:00'], 'abc']),
+                                 (['-created', '-id'], [{'a': 1}, 1]), (['title', 'id'], ['post', {'a': 1}])]:
+            with self.subTest(values=values):
+                query = f'?page_size=2&cursor={cursor(ordering, values)}'
+                if ordering[0] == 'title':
+                    query += '&ordering=title'
+                self.assertEqual(self.client.get(reverse('post-list') + query).status_code, 404)
+
+    def test_no_count_and_no_offset(self):
+        _, response = self.get(reverse('post-list') + '?page_size=2')
+        with CaptureQueriesContext(connection) as queries:
+            self.get(response.data['next'])
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+
+class CounterTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = User.objects.create_user('alice'), User.objects.create_user('bob')
+        self.post = Post.objects.create(user=self.alice, title='title', content='content')
+
+    def counters(self):
+        self.post.refresh_from_db()
+        return self.post.like_count, self.post.comment_count
+
+    def test_likes_and_comments_keep_the_counters(self):
+        like_url = reverse('post-like', args=[self.post.pk])
+        for user in (self.alice, self.bob, self.bob):
+            self.client.force_authenticate(user)
+            self.client.post(like_url)
+        self.assertEqual(self.counters(), (2, 0))
+        self.client.delete(like_url)
+        self.client.delete(like_url)
+        self.assertEqual(self.counters(), (1, 0))
+
+        comments_url = reverse('comment-list', args=[self.post.pk])
+        root = self.client.post(comments_url, {'content': 'root'}, format='json').data['id']
+        self.client.post(comments_url, {'content': 'reply', 'parent': root}, format='json')
+        self.client.post(comments_url, {'content': 'other'}, format='json')
+        self.assertEqual(self.counters(), (1, 3))
+        self.client.delete(reverse('comment-detail', args=[self.post.pk, root]))
+        self.assertEqual(self.counters(), (1, 1))
+
+        response = self.client.get(reverse('post-detail', args=[self.post.pk]))
+        self.assertEqual((response.data['like_count'], response.data['comment_count']), (1, 1))
+
+    def test_reconcile_fixes_drifted_counters(self):
+        Like.objects.create(user=self.bob, post=self.post)
+        Comment.objects.create(user=self.bob, post=self.post, content='missed')
+        other = Post.objects.create(user=self.alice, title='other', content='other', like_count=5)
+        self.assertEqual(sorted(reconcile_counters()), sorted([self.post.pk, other.pk]))
+        self.assertEqual(self.counters(), (1, 1))
+        other.refresh_from_db()
+        self.assertEqual(other.like_count, 0)
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_reconcile_command(self):
+        Post.objects.filter(pk=self.post.pk).update(comment_count=4)
+        call_command('reconcile_post_counters', stdout=StringIO())
+        self.assertEqual(self.counters(), (0, 0))
+
+
+class BulkLikeTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice')
+        self.posts = [Post.objects.create(user=self.user, title=f'post {index}', content='content')
+                      for index in range(3)]
+        self.deleted = Post.objects.create(user=self.user, title='deleted', content='content', is_deleted=True)
+        self.client.force_authenticate(self.user)
+        self.url = reverse('post-bulk-like')
+
+    def send(self, method, post_ids):
+        response = getattr(self.client, method)(self.url, {'post_ids': post_ids}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(result['post_id'], result['status'], result['likes_count']) for result in response.data]
+
+    def test_results_follow_the_request_order(self):
+        first, second, third = (post.pk for post in self.posts)
+        Like.objects.create(user=self.user, post=self.posts[1])
+        Post.objects.filter(pk=second).update(like_count=1)
+        results = self.send('post', [third, second, self.deleted.pk, third, 9999])
+        self.assertEqual(results, [(third, 'liked', 1), (second, 'already_liked', 1),
+                                   (self.deleted.pk, 'not_found', None), (9999, 'not_found', None)])
+        results = self.send('delete', [first, second, third])
+        self.assertEqual(results, [(first, 'not_liked', 0), (second, 'unliked', 0), (third, 'unliked', 0)])
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(list(Post.objects.values_list('like_count', flat=True).distinct()), [0])
+
+    def test_a_batch_runs_a_fixed_number_of_queries(self):
+        def like_all(posts):
+            with CaptureQueriesContext(connection) as queries:
+                self.send('post', [post.pk for post in posts])
+            return len(queries)
+
+        more = [Post.objects.create(user=self.user, title=f'more {index}', content='content') for index in range(10)]
+        self.assertEqual(like_all(self.posts), like_all(more))
+        self.assertEqual(Like.objects.count(), 13)
+
+    def test_invalid_batches(self):
+        self.assertEqual(self.client.post(self.url, {'post_ids': []}, format='json').status_code, 400)
+        too_many = list(range(1, serializers.BULK_LIKE_LIMIT + 2))
+        self.assertEqual(self.client.post(self.url, {'post_ids': too_many}, format='json').status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.post(self.url, {'post_ids': [self.posts[0].pk]}, format='json').status_code, 401)
+
+
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = User.objects.create_user('alice'), User.objects.create_user('bob')
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        self.posts = [Post.objects.create(user=self.bob, title=f'post {index}', content='content')
+                      for index in range(3)]
+        get_timeline_store().rebuild(self.alice)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.alice).key}')
+
+    def test_feed_matches_the_sync_view(self):
+        for query in ('', '?order=ranked', '?page_size=2'):
+            expected = self.client.get(reverse('post-feed') + query)
+            response = self.client.get(reverse('async-post-feed') + query)
+            self.assertEqual(response.status_code, 200)
+            # same page and cursor, only the path of the links differs
+            self.assertEqual(response.json()['results'], expected.json()['results'])
+            self.assertEqual(parse_qs(urlparse(response.json()['next'] or '').query),
+                             parse_qs(urlparse(expected.json()['next'] or '').query))
+
+    def test_like_and_unlike(self):
+        url = reverse('async-post-like', args=[self.posts[0].pk])
+        responses = [self.client.post(url), self.client.post(url), self.client.delete(url), self.client.delete(url)]
+        self.assertEqual([(response.status_code, response.json()['likes_count']) for response in responses],
+                         [(201, 1), (200, 1), (200, 0), (404, 0)])
+        self.assertEqual(self.client.post(reverse('async-post-like', args=[9999])).status_code, 404)
+
+    def test_token_authentication(self):
+        self.client.credentials()
+        response = self.client.get(reverse('async-post-feed'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+        self.client.credentials(HTTP_AUTHORIZATION='Token unknown')
+        response = self.client.post(reverse('async-post-like', args=[self.posts[0].pk]))
+        self.assertEqual((response.status_code, response.json()['detail']), (401, 'Invalid token.'))
+        self.assertFalse(Like.objects.exists())
+
+@override_settings(TIMELINE={'OPTIONS': {'depth': 3, 'batch_size': 2, 'slack': 1}})
+class TimelineTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob, self.carol = (User.objects.create_user(name) for name in ('alice', 'bob', 'carol'))
+        for follower in (self.alice, self.carol):
+            self.follow(follower, 'bob')
+
+    def follow(self, follower, username, method='post'):
+        self.client.force_authenticate(follower)
+        with self.captureOnCommitCallbacks(execute=True):
+            getattr(self.client, method)(reverse('follow', args=[username]))
+
+    def publish(self, user, title):
+        self.client.force_authenticate(user)
+        self.client.post(reverse('post-list'), {'title': title, 'content': title}, format='json')
+
+    def feed(self, user):
+        self.client.force_authenticate(user)
+        return [post['title'] for post in self.client.get(reverse('post-feed')).data['results']]
+
+    def test_a_post_fans_out_to_the_followers(self):
+        self.publish(self.bob, 'first')
+        self.publish(self.bob, 'second')
+        self.assertEqual(self.feed(self.alice), ['second', 'first'])
+        self.assertEqual(self.feed(self.carol), ['second', 'first'])
+        self.assertEqual(self.feed(self.bob), [])
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        self.publish(self.carol, 'carol')
+        self.follow(self.alice, 'carol')
+        self.assertEqual(self.feed(self.alice), ['carol'])
+        self.follow(self.alice, 'carol', method='delete')
+        self.assertEqual(self.feed(self.alice), [])
+
+    def test_trim_keeps_the_newest_depth_entries(self):
+        for index in range(4):
+            self.publish(self.bob, f'post {index}')
+        # within depth + slack, nothing to trim
+        self.assertEqual(get_timeline_store().trim_overgrown(), 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.publish(self.bob, 'post 4')
+        self.assertNotIn('ROW_NUMBER', ' '.join(query['sql'] for query in queries))
+        self.assertEqual(TimelineEntry.objects.filter(user=self.carol).count(), 5)
+        call_command('trim_timelines', stdout=StringIO())
+        self.assertEqual(self.feed(self.alice), ['post 4', 'post 3', 'post 2'])
+        self.assertEqual(TimelineEntry.objects.filter(user=self.carol).count(), 3)
+
+    def test_failed_fan_out_publishes_nothing(self):
+        with mock.patch.object(DatabaseTimelineStore, 'fan_out', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.publish(self.bob, 'lost')
+        self.assertFalse(Post.objects.filter(title='lost').exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+
+
+class RankedFeedTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = User.objects.create_user('alice'), User.objects.create_user('bob')
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        now = timezone.now()
+        self.posts = []
+        for hours in (30, 20, 10, 0):
+            post = Post.objects.create(user=self.bob, title=f'{hours}h', content='content')
+            Post.objects.filter(pk=post.pk).update(created=now - timezone.timedelta(hours=hours))
+            self.posts.append(post)
+        recompute_scores()
+        get_timeline_store().rebuild(self.alice)
+        self.fans = [User.objects.create_user(f'fan{index}') for index in range(10)]
+
+    def engage(self, post, likes=0, comments=0):
+        for fan in self.fans[:likes]:
+            self.client.force_authenticate(fan)
+            self.client.post(reverse('post-like', args=[post.pk]))
+        for index in range(comments):
+            self.client.post(reverse('comment-list', args=[post.pk]), {'content': f'comment {index}'}, format='json')
+
+    def ranked(self, page_size=10):
+        self.client.force_authenticate(self.alice)
+        url, titles = reverse('post-feed') + f'?order=ranked&page_size={page_size}', []
+        while url:
+            data = self.client.get(url).data
+            titles += [post['title'] for post in data['results']]
+            url = data['next']
+        return titles
+
+    def test_scores_follow_the_counters(self):
+        self.engage(self.posts[0], likes=7, comments=2)
+        self.client.force_authenticate(self.fans[0])
+        self.client.delete(reverse('post-like', args=[self.posts[0].pk]))
+        post = Post.objects.get(pk=self.posts[0].pk)
+        self.assertEqual((post.like_count, post.comment_count), (6, 2))
+        self.assertAlmostEqual(post.score, rank_score(6, 2, post.created), places=6)
+
+    def test_engagement_outranks_recency_within_the_gravity(self):
+        self.assertEqual(self.ranked(), ['0h', '10h', '20h', '30h'])
+        # 10 likes are worth log10(10) = 1, i.e. GRAVITY seconds (12.5h) of recency
+        self.engage(self.posts[2], likes=10)
+        self.assertEqual(self.ranked(), ['10h', '0h', '20h', '30h'])
+        self.engage(self.posts[3], likes=10)
+        self.assertEqual(self.ranked(page_size=1), ['0h', '10h', '20h', '30h'])
+        # 10 likes make up for 12.5 hours, enough to pass the 20h post only
+        self.engage(self.posts[0], likes=10)
+        self.assertEqual(self.ranked(page_size=1), ['0h', '10h', '30h', '20h'])
+
+    @override_settings(FEED_RANKING={'GRAVITY': 3600})
+    def test_recompute_after_a_settings_change(self):
+        self.engage(self.posts[2], likes=10)
+        recompute_scores()
+        self.assertEqual(self.ranked(), ['0h', '10h', '20h', '30h'])
+
+
+class TrendingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice')
+        self.post = Post.objects.create(user=self.user, title='title', content='content')
+        self.other = Post.objects.create(user=self.user, title='other', content='other')
+        self.client.force_authenticate(self.user)
+
+    def top(self):
+        return {post_id: (likes, comments) for post_id, likes, comments, _ in trending.compute_top(24)}
+
+    def test_unlike_takes_the_like_back(self):
+        self.client.post(reverse('post-like', args=[self.post.pk]))
+        self.assertEqual(self.top(), {self.post.pk: (1, 0)})
+        self.client.delete(reverse('post-like', args=[self.post.pk]))
+        self.assertEqual(self.top(), {})
+
+    def test_bulk_unlike_takes_the_likes_back(self):
+        post_ids = [self.post.pk, self.other.pk]
+        self.client.post(reverse('post-bulk-like'), {'post_ids': post_ids}, format='json')
+        self.assertEqual(self.top(), {self.post.pk: (1, 0), self.other.pk: (1, 0)})
+        self.client.delete(reverse('post-bulk-like'), {'post_ids': post_ids}, format='json')
+        self.assertEqual(self.top(), {})
+
+    def test_deleted_thread_takes_its_comments_back(self):
+        url = reverse('comment-list', args=[self.post.pk])
+        root = self.client.post(url, {'content': 'root'}, format='json').data['id']
+        self.client.post(url, {'content': 'reply', 'parent': root}, format='json')
+        self.client.post(reverse('post-like', args=[self.post.pk]))
+        self.assertEqual(self.top(), {self.post.pk: (1, 2)})
+        self.client.delete(reverse('comment-detail', args=[self.post.pk, root]))
+        self.assertEqual(self.top(), {self.post.pk: (1, 0)})
+
+
+class DeletionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob, self.carol = (User.objects.create_user(name) for name in ('alice', 'bob', 'carol'))
+        self.alice_post = Post.objects.create(user=self.alice, title='alice', content='alice')
+        self.bob_post = Post.objects.create(user=self.bob, title='bob', content='bob')
+        self.client.force_authenticate(self.alice)
+        self.client.post(reverse('post-like', args=[self.bob_post.pk]))
+        self.client.post(reverse('comment-list', args=[self.bob_post.pk]), {'content': 'hi'}, format='json')
+        Follow.objects.create(follower=self.carol, following=self.alice)
+        self.token = Token.objects.create(user=self.alice)
+
+    def delete_alice(self):
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(reverse('profile_delete')).status_code, 200)
+        self.client.credentials()
+
+    def test_deleted_account_is_hidden_right_away(self):
+        self.client.force_authenticate(None)
+        # cached anonymous pages that show alice
+        self.client.get(reverse('post-list'))
+        self.client.get(reverse('comment-list', args=[self.bob_post.pk]))
+        self.delete_alice()
+
+        titles = [post['title'] for post in self.client.get(reverse('post-list')).data['results']]
+        self.assertEqual(titles, ['bob'])
+        self.assertEqual(self.client.get(reverse('post-detail', args=[self.alice_post.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('comment-list', args=[self.bob_post.pk])).data['results'], [])
+        self.assertEqual(self.client.get(reverse('profile_other', args=['alice'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('profile_following', args=['carol'])).data['following_count'], 0)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+    def test_job_runs_in_batches_and_resumes(self):
+        self.delete_alice()
+        job = deletion.claim()
+        self.assertFalse(deletion.run(job, max_batches=2, batch_size=1))
+        job = DeletionJob.objects.get(pk=job.pk)
+        self.assertEqual((job.status, job.phase, job.progress), (DeletionJob.PENDING, 'likes', {'follows': 1, 'likes': 1}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(deletion.run(job, batch_size=1))
+        self.assertEqual(DeletionJob.objects.get(pk=job.pk).status, DeletionJob.DONE)
+        self.assertFalse(User.objects.filter(pk=self.alice.pk).exists())
+        self.assertFalse(Post.all_objects.filter(pk=self.alice_post.pk).exists())
+        self.bob_post.refresh_from_db()
+        self.assertEqual((self.bob_post.like_count, self.bob_post.comment_count), (0, 0))
+
+    def test_deactivated_account_keeps_its_content(self):
+        User.objects.filter(pk=self.alice.pk).update(is_active=False)
+        self.client.force_authenticate(None)
+        titles = [post['title'] for post in self.client.get(reverse('post-list')).data['results']]
+        self.assertEqual(sorted(titles), ['alice', 'bob'])
+        self.assertEqual(len(self.client.get(reverse('comment-list', args=[self.bob_post.pk])).data['results']), 1)
+        # visibility is a column of the row, no join with auth_user
+        with CaptureQueriesContext(connection) as queries:
+            list(Post.objects.all()), list(Comment.objects.all())
+        self.assertNotIn('auth_user', ' '.join(query['sql'] for query in queries))
+
+    def test_deleted_account_leaves_trending(self):
+        self.assertEqual(trending.compute_top(24), [(self.bob_post.pk, 1, 1, 3.0)])
+        self.delete_alice()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(deletion.run(deletion.claim()))
+        self.assertEqual(trending.compute_top(24), [])
+        bucket = PostActivityBucket.objects.get(post=self.bob_post)
+        self.assertEqual((bucket.likes, bucket.comments), (0, 0))
+
+    def test_deleted_post_is_removed_by_its_job(self):
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.client.delete(reverse('post-detail', args=[self.bob_post.pk])).status_code, 204)
+        self.assertEqual(self.client.get(reverse('post-detail', args=[self.bob_post.pk])).status_code, 404)
+        self.assertTrue(Post.all_objects.filter(pk=self.bob_post.pk).exists())
+        self.assertTrue(deletion.run(deletion.claim()))
+        self.assertFalse(Post.all_objects.filter(pk=self.bob_post.pk).exists())
+        self.assertFalse(Comment.all_objects.filter(post=self.bob_post.pk).exists())
+
+class BenchmarkDatasetTests(APITestCase):
+    SEED = ['--users', '12', '--posts-per-user', '2', '--max-following', '6', '--likes-per-post', '2',
+            '--threads', '2', '--comments-per-thread', '8', '--days', '2']
+
+    def seed(self, *extra):
+        call_command('seed_social_graph', *self.SEED, *extra, stdout=StringIO())
+        return self.snapshot()
+
+    @staticmethod
+    def snapshot():
+        return {
+            'follows': sorted(Follow.objects.values_list('follower__username', 'following__username')),
+            'posts': sorted(Post.objects.values_list('user__username', 'title', 'content', 'like_count',
+                                                     'comment_count')),
+            'likes': sorted(Like.objects.values_list('user__username', 'post__title')),
+            'comments': sorted(Comment.objects.values_list('post__title', 'user__username', 'content', 'depth')),
+        }
+
+    def test_same_seed_same_dataset(self):
+        first = self.seed()
+        self.assertTrue(all(first.values()))
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.assertEqual(self.seed('--clear'), first)
+        self.assertNotEqual(self.seed('--clear', '--seed', '7'), first)
+
+    def test_seeded_counters_and_paths_are_consistent(self):
+        self.seed()
+        posts = Post.objects.annotate(likes=Count('like', distinct=True), comments=Count('comment', distinct=True))
+        for post in posts:
+            self.assertEqual((post.like_count, post.comment_count), (post.likes, post.comments))
+        for comment in Comment.objects.select_related('parent'):
+            parent_path = comment.parent.path if comment.parent else ''
+            self.assertTrue(comment.path.startswith(parent_path))
+            self.assertEqual(comment.depth, comment.parent.depth + 1 if comment.parent else 0)
+
+    def test_benchmarks_leave_the_dataset_alone(self):
+        dataset = self.seed()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            call_command('run_benchmarks', '--iterations', '1', '--warmup', '0', '--output', output,
+                         stdout=StringIO(), stderr=StringIO())
+            with open(output) as report:
+                results = json.load(report)['results']
+        self.assertIn('post-feed', results)
+        self.assertEqual([name for name, result in results.items() if result['status'] >= 500], [])
+        self.assertEqual(self.snapshot(), dataset)
+
+@skipUnless(fast_json.orjson, 'orjson is not installed')
+class FastJSONTests(APITestCase):
+    DATA = {
+        'created': datetime.datetime(2024, 1, 1, 10, 0, 0, 123456, tzinfo=datetime.timezone.utc),
+        'day': datetime.date(2024, 1, 1),
+        'price': Decimal('1.50'),
+        'label': gettext_lazy('Not found.'),
+        'text': 'caf\u00e9 \u2028 line',
+        'nested': [{'ratio': 1.5, 'none': None, 'flag': True}, (1, 2)],
+        'big': 2 ** 70,
+        1: 'integer key',
+    }
+
+    def test_output_matches_the_stdlib_renderer(self):
+        expected = JSONRenderer().render(self.DATA)
+        self.assertEqual(fast_json.FastJSONRenderer().render(self.DATA), expected)
+        self.assertIn(b'\\u2028', expected)
+        small = {key: value for key, value in self.DATA.items() if key != 'big'}
+        self.assertEqual(fast_json.FastJSONRenderer().render(small), JSONRenderer().render(small))
+        self.assertEqual(fast_json.FastJSONRenderer().render(None), b'')
+
+    def test_indented_and_disabled_use_the_stdlib(self):
+        context = {'indent': 2}
+        self.assertEqual(fast_json.FastJSONRenderer().render(self.DATA, renderer_context=context),
+                         JSONRenderer().render(self.DATA, renderer_context=context))
+        with override_settings(FAST_JSON={'ENABLED': False}), mock.patch.object(fast_json.orjson, 'dumps') as dumps:
+            fast_json.FastJSONRenderer().render({'a': 1})
+        dumps.assert_not_called()
+
+    def test_parser(self):
+        parser = fast_json.FastJSONParser()
+        self.assertEqual(parser.parse(BytesIO('{"title": "caf\u00e9", "ids": [1, 2]}'.encode())),
+                         {'title': 'caf\u00e9', 'ids': [1, 2]})
+        self.assertEqual(parser.parse(BytesIO('{"title": "caf\u00e9"}'.encode('latin-1')),
+                                      parser_context={'encoding': 'latin-1'}), {'title': 'caf\u00e9'})
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b'{"title": '))
+
+    def test_endpoints_go_through_it(self):
+        self.client.force_authenticate(User.objects.create_user('alice'))
+        response = self.client.post(reverse('post-list'), '{"title": "t", ', content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['detail'][:16]), (400, 'JSON parse error'))
+        response = self.client.post(reverse('post-list'), '{"title": "caf\u00e9", "content": "c"}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+@strict_budgets()
+class QueryBudgetTests(APITestCase):
+    # every request starts with cold caches and a token the cache hasn't seen. Alice has
+    # followers, so a new post fans out to their timelines, and follows bob, whose post is
+    # in her feed and is read with the follow flags of ?expand=user
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice')
+        bob, *fans = [User.objects.create_user(name) for name in ('bob', 'fan1', 'fan2', 'fan3')]
+        Follow.objects.bulk_create([Follow(follower=fan, following=self.user) for fan in fans])
+        self.post = Post.objects.create(user=self.user, title='title', content='content', comment_count=2)
+        self.other = Post.objects.create(user=bob, title='bob', content='content')
+        get_timeline_store().follow(self.user, bob)
+        trending.record_activity([self.other.pk], likes=1)
+        Follow.objects.create(follower=self.user, following=bob)
+        self.comment = Comment.objects.create(user=self.user, post=self.post, content='root')
+        Comment.objects.create(user=self.user, post=self.post, content='reply', parent=self.comment)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def request(self, method, url, data=None, cold=True, **headers):
+        if cold:
+            reset_caches()
+        response = getattr(self.client, method)(url, data, format='json', **headers)
+        self.assertLess(response.status_code, 400)
+        return response
+
+    def test_posts(self):
+        for query in ('', '?expand=user'):
+            self.request('get', reverse('post-list') + query)
+            self.request('get', reverse('post-feed') + query)
+            self.request('get', reverse('post-trending') + query)
+        self.request('post', reverse('post-list'), {'title': 'new', 'content': 'new'})
+        self.request('get', reverse('post-detail', args=[self.other.pk]) + '?expand=user')
+        url = reverse('post-detail', args=[self.post.pk])
+        self.request('patch', url, {'title': 'changed'})
+        self.request('patch', url, {'title': 'changed again'}, HTTP_IF_MATCH='*')
+        # the ETag holds the cached resource versions, which a cold cache starts over
+        etag = self.request('get', url)['ETag']
+        self.request('patch', url, {'title': 'and again'}, cold=False, HTTP_IF_MATCH=etag)
+        self.request('delete', url)
+
+    def test_comments(self):
+        comment_kwargs = {'post_id': self.post.pk, 'comment_id': self.comment.pk}
+        self.request('get', reverse('comment-list', args=[self.post.pk]))
+        self.request('get', reverse('comment-threads', args=[self.post.pk]))
+        self.request('get', reverse('comment-replies', kwargs=comment_kwargs))
+        self.request('post', reverse('comment-list', args=[self.post.pk]), {'content': 'reply', 'parent': self.comment.pk})
+        self.request('get', reverse('comment-detail', kwargs=comment_kwargs))
+        self.request('patch', reverse('comment-detail', kwargs=comment_kwargs), {'content': 'changed'})
+        self.request('delete', reverse('comment-detail', kwargs=comment_kwargs))
+
+    def test_likes(self):
+        other = Post.objects.create(user=self.user, title='other', content='other')
+        self.request('post', reverse('post-like', args=[self.post.pk]))
+        self.request('delete', reverse('post-like', args=[self.post.pk]))
+        self.request('post', reverse('post-bulk-like'), {'post_ids': [self.post.pk, other.pk]})
+        self.request('delete', reverse('post-bulk-like'), {'post_ids': [self.post.pk, other.pk]})
+        self.request('post', reverse('async-post-like', args=[self.post.pk]))
+        self.request('delete', reverse('async-post-like', args=[self.post.pk]))
+
+
+class ConcurrentLikeTests(APITransactionTestCase):
+    def test_double_taps_count_once(self):
+        author = User.objects.create_user('author')
+        post = Post.objects.create(user=author, title='title', content='content')
+        keys = [Token.objects.create(user=User.objects.create_user(f'user{index}')).key for index in range(3)]
+        url = reverse('post-like', args=[post.pk])
+        rng = random.Random(42)
+        requests = [('delete' if rng.random() < 0.3 else 'post', url, rng.choice(keys)) for _ in range(100)]
+
+        statuses, errors = run_concurrently(requests)
+
+        self.assertEqual(errors, [])
+        self.assertFalse([status for status in statuses if status >= 500])
+        self.assertFalse(Like.objects.filter(post=post).values('user').annotate(n=Count('pk')).filter(n__gt=1))
+        self.assertEqual(reconcile_counters(Post.objects.filter(pk=post.pk)), [])
@@ -0,0 +1,46 @@
+import operator
+from functools import reduce
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber, Substr
+
+from .models import Comment, COMMENT_PATH_STEP, comment_subtree
+
+# Threaded comments: a page of top-level comments, each with the first few
+# comments of its subtree (in thread order) and a cursor to the rest. The
+# replies of the whole page come from one windowed query over the (post, path)
+# index, so a page costs the same number of queries however big its threads are.
+
+REPLIES_LIMIT = 3
+MAX_REPLIES_LIMIT = 20
+# thread order, the ordering of the comment-replies endpoint its cursors are for
+REPLY_ORDERING = ('path', 'id')
+
+
+def attach_replies(roots, limit=REPLIES_LIMIT):
+    """
+    Set `first_replies` (up to `limit` descendants in thread order) and `has_more_replies`
+    on every top-level comment in `roots`.
+    """
+    roots = [root for root in roots if root.path]
+    for root in roots:
+        root.first_replies, root.has_more_replies = [], False
+    if not roots:
+        return
+    by_prefix = {root.path: root for root in roots}
+    # the first path segment is the id of the top-level comment a reply belongs to
+    thread = Substr('path', 1, COMMENT_PATH_STEP + 1)
+    subtrees = reduce(operator.or_, (comment_subtree(root.path, include_self=False) for root in roots))
+    replies = (Comment.objects.filter(subtrees, post_id=roots[0].post_id)
+               .select_related('user')
+               .annotate(position=Window(RowNumber(), partition_by=thread,
+                                         order_by=[F(field).asc() for field in REPLY_ORDERING]))
+               # one more than needed tells whether there is a next page
+               .filter(position__lte=limit + 1)
+               .order_by(*REPLY_ORDERING))
+    for reply in replies:
+        root = by_prefix[reply.path[:COMMENT_PATH_STEP + 1]]
+        if len(root.first_replies) < limit:
+            root.first_replies.append(reply)
+        else:
+            root.has_more_replies = True
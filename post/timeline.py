@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils.module_loading import import_string
+
+from accounts.graph import get_follow_graph
+from .models import Post, TimelineEntry
+
+DEFAULT_TIMELINE = {
+    'BACKEND': 'post.timeline.DatabaseTimelineStore',
+    'OPTIONS': {
+        'depth': 800,
+        'batch_size': 500,
+        'slack': 200,
+    },
+}
+
+
+class DatabaseTimelineStore:
+    """
+    Fan-out-on-write timelines kept in the TimelineEntry table.
+
+    Publishing a post writes one entry per follower of the author, so reading a
+    feed is a range scan over the reader's own (user, created) index instead of
+    a join over everything the people they follow ever posted.
+
+    Publishing doesn't trim: a timeline may grow to `depth + slack` entries
+    before trim_overgrown() (the trim_timelines command) cuts it back to the
+    newest `depth`, so the write path stays one INSERT per chunk of followers.
+    """
+
+    def __init__(self, depth=800, batch_size=500, slack=200):
+        self.depth = depth
+        self.batch_size = batch_size
+        self.slack = slack
+
+    def feed(self, user, ranked=False):
+        if ranked:
+            # Post.score is maintained on write (post/ranking.py), and a timeline holds at most depth + slack entries
+            return (Post.objects.filter(timeline_entries__user=user)
+                    .select_related('user')
+                    .order_by('-score', '-id'))
+        return (Post.objects.filter(timeline_entries__user=user)
+                .annotate(timeline_created=F('timeline_entries__created'))
+                .select_related('user')
+                .order_by('-timeline_created', '-id'))
+
+    def fan_out(self, post):
+        follower_ids = list(get_follow_graph().followers(post.user_id))
+        for start in range(0, len(follower_ids), self.batch_size):
+            chunk = follower_ids[start:start + self.batch_size]
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(user_id=follower_id, post_id=post.pk, created=post.created) for follower_id in chunk],
+                ignore_conflicts=True,
+            )
+
+    def follow(self, follower, following):
+        posts = Post.objects.filter(user=following).order_by('-created').values_list('pk', 'created')[:self.depth]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=follower.pk, post_id=pk, created=created) for pk, created in posts],
+            ignore_conflicts=True,
+            batch_size=self.batch_size,
+        )
+        self.trim([follower.pk])
+
+    def unfollow(self, follower, following):
+        TimelineEntry.objects.filter(user=follower, post__user=following).delete()
+
+    def rebuild(self, user):
+        following_ids = list(get_follow_graph().following(user.pk))
+        posts = Post.objects.filter(user__in=following_ids).order_by('-created').values_list('pk', 'created')[:self.depth]
+        TimelineEntry.objects.filter(user=user).delete()
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user.pk, post_id=pk, created=created) for pk, created in posts],
+            batch_size=self.batch_size,
+        )
+
+    def trim_overgrown(self):
+        """Trim every timeline longer than depth + slack, returns the number of timelines trimmed."""
+        user_ids = list(TimelineEntry.objects.values('user_id').annotate(entries=Count('pk'))
+                        .filter(entries__gt=self.depth + self.slack).values_list('user_id', flat=True))
+        for start in range(0, len(user_ids), self.batch_size):
+            self.trim(user_ids[start:start + self.batch_size])
+        return len(user_ids)
+
+    def trim(self, user_ids):
+        stale = (TimelineEntry.objects.filter(user_id__in=user_ids)
+                 .annotate(position=Window(RowNumber(), partition_by=F('user_id'),
+                                           order_by=(F('created').desc(), F('post_id').desc())))
+                 .filter(position__gt=self.depth)
+                 .values_list('pk', flat=True))
+        stale = list(stale)
+        if stale:
+            TimelineEntry.objects.filter(pk__in=stale).delete()
+
+
+def get_timeline_store():
+    config = getattr(settings, 'TIMELINE', DEFAULT_TIMELINE)
+    options = {**DEFAULT_TIMELINE['OPTIONS'], **config.get('OPTIONS', {})}
+    return import_string(config.get('BACKEND', DEFAULT_TIMELINE['BACKEND']))(**options)
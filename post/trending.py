@@ -0,0 +1,161 @@
+import datetime
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Sum, Value
+from django.utils import timezone
+
+from .models import Post, PostActivityBucket
+from .ranking import get_config as get_ranking_config
+
+# Trending posts: the most liked and commented posts of the last N hours.
+#
+# Every like and comment adds one to the post's PostActivityBucket row for the
+# current BUCKET_SECONDS slice of time (see post/services.py), every unlike and
+# deleted comment takes one off, so the activity of a window is a SUM over a few
+# rows per post instead of a scan of Like/Comment.
+# The window slides one bucket at a time and buckets older than the longest
+# window are pruned.
+#
+# The top TOP_K of every window is computed from the buckets at most once per
+# REFRESH_SECONDS (by the refresh_trending command, or by the first request that
+# finds it stale) and kept in the cache, so a read is a cache get plus one
+# query for the posts, however much activity there was.
+
+DEFAULT_TRENDING = {
+    'CACHE_ALIAS': 'default',
+    'BUCKET_SECONDS': 300,
+    'WINDOWS': [1, 6, 24],
+    'DEFAULT_WINDOW': 24,
+    'TOP_K': 50,
+    'REFRESH_SECONDS': 60,
+    'LOCK_TIMEOUT': 30,
+}
+
+
+def get_config():
+    return {**DEFAULT_TRENDING, **getattr(settings, 'TRENDING', {})}
+
+
+def get_cache():
+    return caches[get_config()['CACHE_ALIAS']]
+
+
+def bucket_start(moment=None):
+    moment = moment or timezone.now()
+    size = get_config()['BUCKET_SECONDS']
+    return datetime.datetime.fromtimestamp(moment.timestamp() // size * size, tz=datetime.timezone.utc)
+
+
+def record_activity(post_ids, likes=0, comments=0):
+    """
+    Add likes/comments (negative ones take them off) to the current bucket of every
+    post, inside the write's transaction.
+    """
+    post_ids = list(post_ids)
+    if not post_ids or not (likes or comments):
+        return
+    bucket = bucket_start()
+    increments = {'likes': F('likes') + likes, 'comments': F('comments') + comments}
+    rows = PostActivityBucket.objects.filter(bucket=bucket, post_id__in=post_ids)
+    # the bucket of an active post already exists, then this is the only query
+    if rows.update(**increments) == len(post_ids):
+        return
+    existing = set(rows.values_list('post_id', flat=True))
+    missing = [post_id for post_id in post_ids if post_id not in existing]
+    # empty rows first, a concurrent request may create the same ones and its increment must not be lost
+    PostActivityBucket.objects.bulk_create([PostActivityBucket(post_id=post_id, bucket=bucket) for post_id in missing],
+                                           ignore_conflicts=True)
+    PostActivityBucket.objects.filter(bucket=bucket, post_id__in=missing).update(**increments)
+
+
+def retract_activity(rows, field):
+    """
+    Take deleted likes or comments, (post_id, created) pairs, off the buckets they were
+    counted in; `field` is 'likes' or 'comments'. Rows older than every window are skipped.
+    """
+    oldest = bucket_start(timezone.now() - datetime.timedelta(hours=max(get_config()['WINDOWS'])))
+    counts = Counter((bucket_start(created), post_id) for post_id, created in rows if created >= oldest)
+    # one UPDATE per bucket and count, the rows of one batch fall into few of them
+    groups = defaultdict(list)
+    for (bucket, post_id), count in counts.items():
+        groups[bucket, count].append(post_id)
+    for (bucket, count), post_ids in groups.items():
+        PostActivityBucket.objects.filter(bucket=bucket, post_id__in=post_ids).update(**{field: F(field) - count})
+
+
+def _snapshot_key(hours):
+    return f'trending:{hours}'
+
+
+def _lock_key(hours):
+    return f'trending-lock:{hours}'
+
+
+def compute_top(hours, now=None):
+    """[(post_id, likes, comments, score)] of the TOP_K most active posts of the last `hours`, best first."""
+    config = get_config()
+    ranking = get_ranking_config()
+    now = now or timezone.now()
+    since = bucket_start(now - datetime.timedelta(hours=hours))
+    score = (Sum('likes') * Value(float(ranking['LIKE_WEIGHT']))
+             + Sum('comments') * Value(float(ranking['COMMENT_WEIGHT'])))
+    rows = (PostActivityBucket.objects.filter(bucket__gte=since).values('post_id')
+            .annotate(total_likes=Sum('likes'), total_comments=Sum('comments'),
+                      activity=score)
+            .filter(activity__gt=0)
+            .order_by('-activity', '-post_id')
+            .values_list('post_id', 'total_likes', 'total_comments', 'activity')[:config['TOP_K']])
+    return [(post_id, likes, comments, float(activity)) for post_id, likes, comments, activity in rows]
+
+
+def refresh(hours, now=None):
+    now = now or timezone.now()
+    snapshot = {'computed': now.timestamp(), 'items': compute_top(hours, now)}
+    get_cache().set(_snapshot_key(hours), snapshot, None)
+    return snapshot
+
+
+def refresh_all(now=None):
+    now = now or timezone.now()
+    return {hours: refresh(hours, now) for hours in get_config()['WINDOWS']}
+
+
+def prune(now=None):
+    """Delete the buckets no window reaches any more, returns how many."""
+    now = now or timezone.now()
+    oldest = bucket_start(now - datetime.timedelta(hours=max(get_config()['WINDOWS'])))
+    deleted, _ = PostActivityBucket.objects.filter(bucket__lt=oldest).delete()
+    return deleted
+
+
+def get_snapshot(hours):
+    config = get_config()
+    cache = get_cache()
+    snapshot = cache.get(_snapshot_key(hours))
+    if snapshot is not None and snapshot['computed'] > timezone.now().timestamp() - config['REFRESH_SECONDS']:
+        return snapshot
+    if snapshot is None:
+        return refresh(hours)
+    # one request recomputes a stale snapshot, the others keep serving the old one meanwhile
+    if cache.add(_lock_key(hours), 1, config['LOCK_TIMEOUT']):
+        try:
+            snapshot = refresh(hours)
+        finally:
+            cache.delete(_lock_key(hours))
+    return snapshot
+
+
+def get_trending(hours, limit=None):
+    """The trending posts of a window as Post instances with activity_likes/activity_comments/activity_score set."""
+    items = get_snapshot(hours)['items'][:limit]
+    posts = Post.objects.select_related('user').in_bulk([item[0] for item in items])
+    result = []
+    # a post deleted since the refresh is skipped
+    for post_id, likes, comments, score in items:
+        post = posts.get(post_id)
+        if post is not None:
+            post.activity_likes, post.activity_comments, post.activity_score = likes, comments, score
+            result.append(post)
+    return result
@@ -1,11 +1,19 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path('', views.PostListCreateView.as_view(), name='post-list'),
     path('<int:pk>/', views.PostDetailView.as_view(), name='post-detail'),
     path('<int:post_id>/comments/', views.PostCommentListView.as_view(), name='comment-list'),
+    path('<int:post_id>/comments/threads/', views.PostCommentThreadListView.as_view(), name='comment-threads'),
     path('<int:post_id>/comments/<int:comment_id>/', views.PostCommentDetailView.as_view(), name='comment-detail'),
+    path('<int:post_id>/comments/<int:comment_id>/replies/', views.PostCommentReplyListView.as_view(),
+         name='comment-replies'),
     path('<int:post_id>/like/', views.PostLikeView.as_view(), name='post-like'),
+    path('likes/', views.PostBulkLikeView.as_view(), name='post-bulk-like'),
     path('feed/', views.PostFeedView.as_view(), name='post-feed'),
+    path('trending/', views.TrendingPostListView.as_view(), name='post-trending'),
+
+    path('async/feed/', async_views.AsyncPostFeedView.as_view(), name='async-post-feed'),
+    path('async/<int:post_id>/like/', async_views.AsyncPostLikeView.as_view(), name='async-post-like'),
 ]
\ No newline at end of file
@@ -1,15 +1,23 @@
 from django.contrib.auth.models import User
 from django.shortcuts import render, get_object_or_404
 from drf_spectacular.types import OpenApiTypes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status, mixins, generics, permissions, filters
 
-from accounts.models import Follow
 from . import serializers
-from .models import Post, Like, Comment
+from .models import Post, Like, Comment, comment_subtree
+from . import services
+from .cache import AnonymousResponseCacheMixin, get_version_and_changed, post_resource, users_resource
+from .conditional import ConditionalRequestMixin, make_etag
+from .timeline import get_timeline_store
+from .search import PostSearchFilter
+from . import threads, trending
 from accounts import permissions as my_permissions
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiResponse
+from social_media import sparse_fields
+from social_media.fast_serializers import ValuesListMixin
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiParameter, OpenApiResponse
 
 
 
@@ -39,19 +47,26 @@ from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExam
 
     )
 )
-class PostListCreateView(generics.ListCreateAPIView):
+class PostListCreateView(AnonymousResponseCacheMixin, ValuesListMixin, generics.ListCreateAPIView):
     queryset = Post.objects.all().order_by('-created').select_related('user')
     # serializer_class = serializers.PostSerializer  # just for get
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['title', 'content']
+    filter_backends = [PostSearchFilter, filters.OrderingFilter]
     ordering_fields = ['created', 'title']
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return serializers.PostCreateSerializer
+        if self.request.query_params.get(PostSearchFilter.search_param):
+            return serializers.PostSearchSerializer
         return serializers.PostSerializer
 
+    def get_values_serializer_class(self):
+        # search results carry an annotated snippet, they go through PostSearchSerializer
+        if self.request.query_params.get(PostSearchFilter.search_param):
+            return None
+        return serializers.PostValuesSerializer
+
     """
     there is two ways to set different serializers for different methods:
         1- create def get_serializer_class(self) and return different serializers for different methods in request
@@ -67,7 +82,7 @@ class PostListCreateView(generics.ListCreateAPIView):
     #     return self.create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        services.create_post(serializer, self.request.user)
 # endregion
 
 # region PostDetailView - RetrieveUpdateDestroy - generics
@@ -75,6 +90,7 @@ class PostListCreateView(generics.ListCreateAPIView):
     get=extend_schema(
         tags=['Posts - post'],
         description='Retrieve a post with specific id in url',
+        parameters=sparse_fields.PARAMETERS,
         responses=serializers.PostDetailSerializer
     ),
     put=extend_schema(
@@ -117,10 +133,32 @@ class PostListCreateView(generics.ListCreateAPIView):
         description='Delete a post with specific id in url',
     )
 )
-class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PostDetailView(ConditionalRequestMixin, AnonymousResponseCacheMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, my_permissions.IsOwnerOrReadOnly, ]
-    queryset = Post.objects.all().select_related('user')
     serializer_class = serializers.PostDetailSerializer
+
+    def get_queryset(self):
+        return serializers.PostDetailSerializer.setup_queryset(Post.objects.all(), self.request)
+
+    def get_condition_state(self, for_update=False):
+        posts = Post.objects.select_for_update() if for_update else Post.objects
+        row = posts.filter(pk=self.kwargs['pk']).values_list('version', 'last_modified').first()
+        if row is None:
+            return None
+        version, last_modified = row
+        # the body shows usernames, a profile change is a new representation too
+        users_version, users_changed = get_version_and_changed(users_resource())
+        return (make_etag('post', self.kwargs['pk'], version, users_version, self.viewer_key()),
+                max(last_modified, users_changed))
+
+    def get_cache_resources(self):
+        return [post_resource(self.kwargs['pk'])]
+
+    def perform_update(self, serializer):
+        services.update_post(serializer)
+
+    def perform_destroy(self, instance):
+        services.delete_post(instance)
 # endregion
 
 # region PostLike - Like(post) Unlike(delete) - APIView
@@ -201,21 +239,99 @@ class PostLikeView(APIView):
 
     def post(self, request, post_id):
         post = get_object_or_404(Post, pk=post_id)
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        created, likes_count = services.like_post(request.user, post)
         if created:
-            return Response({'detail': 'Post liked!', 'likes_count': post.like_set.count()},
+            return Response({'detail': 'Post liked!', 'likes_count': likes_count},
                             status=status.HTTP_201_CREATED)
         else:
-            return Response({'detail': 'You already liked this post.', 'likes_count': post.like_set.count()},
+            return Response({'detail': 'You already liked this post.', 'likes_count': likes_count},
                             status=status.HTTP_200_OK)
 
     def delete(self, request, post_id):
         post = get_object_or_404(Post, pk=post_id)
-        deleted, _ = Like.objects.filter(user=request.user, post=post).delete()
+        deleted, likes_count = services.unlike_post(request.user, post)
         if deleted:
-            return Response({'detail': 'Post unliked!', 'likes_count': post.like_set.count()},
+            return Response({'detail': 'Post unliked!', 'likes_count': likes_count},
                             status=status.HTTP_200_OK)
-        return Response({'detail': 'Not Liked', 'likes_count': post.like_set.count()}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'detail': 'Not Liked', 'likes_count': likes_count}, status=status.HTTP_404_NOT_FOUND)
+# endregion
+
+# region PostBulkLikeView - APIView
+@extend_schema_view(
+    post=extend_schema(
+        tags=['Likes - post'],
+        description='Like many posts at once (e.g. likes replayed by an offline client)',
+        request=serializers.PostBulkLikeSerializer,
+        responses=serializers.PostBulkLikeResultSerializer(many=True),
+        examples=[
+            OpenApiExample(
+                'Bulk like',
+                value={'post_ids': [1, 2, 3]},
+                request_only=True,
+            ),
+            OpenApiExample(
+                'Bulk like result',
+                value=[
+                    {'post_id': 1, 'status': 'liked', 'likes_count': 5},
+                    {'post_id': 2, 'status': 'already_liked', 'likes_count': 2},
+                    {'post_id': 3, 'status': 'not_found', 'likes_count': None},
+                ],
+                response_only=True,
+            ),
+        ]
+    ),
+    delete=extend_schema(
+        tags=['Likes - post'],
+        description='Unlike many posts at once',
+        request=serializers.PostBulkLikeSerializer,
+        responses=serializers.PostBulkLikeResultSerializer(many=True),
+    )
+)
+class PostBulkLikeView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_post_ids(self, request):
+        serializer = serializers.PostBulkLikeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['post_ids']
+
+    def post(self, request):
+        return Response(services.bulk_like(request.user, self.get_post_ids(request)), status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        return Response(services.bulk_unlike(request.user, self.get_post_ids(request)), status=status.HTTP_200_OK)
+# endregion
+
+# region TrendingPostListView - most active posts of the last hours
+@extend_schema(
+    tags=['Posts - post'],
+    description='Posts with the most likes and comments in the last hours, refreshed about once a minute',
+    parameters=[
+        OpenApiParameter('hours', int, enum=trending.DEFAULT_TRENDING['WINDOWS'], description='Default: 24'),
+        OpenApiParameter('limit', int, description='Number of posts (max 50)'),
+    ],
+    responses=serializers.TrendingPostSerializer(many=True),
+)
+class TrendingPostListView(generics.ListAPIView):
+    serializer_class = serializers.TrendingPostSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+
+    def get_queryset(self):
+        config = trending.get_config()
+        hours = self.request.query_params.get('hours', config['DEFAULT_WINDOW'])
+        try:
+            hours = int(hours)
+        except ValueError:
+            hours = None
+        if hours not in config['WINDOWS']:
+            raise ValidationError({'hours': f"Must be one of {', '.join(map(str, config['WINDOWS']))}."})
+        try:
+            limit = min(int(self.request.query_params.get('limit', 20)), config['TOP_K'])
+        except ValueError:
+            limit = 20
+        # a precomputed top list, see post/trending.py
+        return trending.get_trending(hours, max(limit, 1))
 # endregion
 
 # region CommentList - ListCreate - generics
@@ -256,7 +372,10 @@ class PostCommentListView(generics.ListCreateAPIView):
     # serializer_class = serializers.CommentSerializer(many=True, context={'request': request, 'post':post })
     # we use this way to add context to serializers in simple APIViews
     def get_post(self):
-        return get_object_or_404(Post, pk=self.kwargs['post_id'])
+        # the serializer context and perform_create both need it, fetch it once per request
+        if getattr(self, '_post', None) is None:
+            self._post = get_object_or_404(Post, pk=self.kwargs['post_id'])
+        return self._post
 
     def get_queryset(self):
         comments = Comment.objects.all().select_related('user', 'parent').filter(post=self.get_post()).order_by(
@@ -264,7 +383,7 @@ class PostCommentListView(generics.ListCreateAPIView):
         return comments
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user, post=self.get_post())
+        services.create_comment(serializer, self.request.user, self.get_post())
 
     # in generics and Viewsets, context with request, view and format automatically will be added to context and for extra data should override blow def
     def get_serializer_context(self):
@@ -273,6 +392,52 @@ class PostCommentListView(generics.ListCreateAPIView):
         return tmp
 # endregion
 
+# region CommentThreads - top-level comments with their first replies - generics
+@extend_schema(
+    tags=['Comment - post'],
+    description='Top-level comments of a post, newest first, each with the first replies of its thread '
+                'and a more_replies link to the rest',
+    parameters=[OpenApiParameter('replies', int, description=f'Replies per thread (default {threads.REPLIES_LIMIT}, '
+                                                             f'max {threads.MAX_REPLIES_LIMIT})')],
+)
+class PostCommentThreadListView(generics.ListAPIView):
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    serializer_class = serializers.CommentThreadSerializer
+
+    def get_queryset(self):
+        post = get_object_or_404(Post, pk=self.kwargs['post_id'])
+        return Comment.objects.filter(post=post, parent=None).select_related('user').order_by('-created', '-id')
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        try:
+            limit = min(int(self.request.query_params.get('replies', threads.REPLIES_LIMIT)), threads.MAX_REPLIES_LIMIT)
+        except ValueError:
+            limit = threads.REPLIES_LIMIT
+        # the replies of every thread on the page in one query
+        threads.attach_replies(page, max(limit, 1))
+        return page
+# endregion
+
+# region CommentReplies - one thread, page by page - generics
+@extend_schema(
+    tags=['Comment - post'],
+    description='All replies under a comment in thread order (parents before their replies, with depth), '
+                'page by page',
+    responses=serializers.CommentTreeSerializer(many=True),
+)
+class PostCommentReplyListView(generics.ListAPIView):
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    serializer_class = serializers.CommentTreeSerializer
+
+    def get_queryset(self):
+        comment = get_object_or_404(Comment.objects.only('path'), pk=self.kwargs['comment_id'],
+                                    post=self.kwargs['post_id'])
+        # the same (post, path) range scan as the first replies of the threads endpoint
+        return (Comment.objects.filter(comment_subtree(comment.path, include_self=False), post=self.kwargs['post_id'])
+                .select_related('user').order_by(*threads.REPLY_ORDERING))
+# endregion
+
 # region CommentDetail - RetrieveUpdateDestroy - generics
 # region schema
 @extend_schema_view(
@@ -323,25 +488,36 @@ class PostCommentListView(generics.ListCreateAPIView):
     )
 )
 # endregion
-class PostCommentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PostCommentDetailView(ConditionalRequestMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, my_permissions.IsOwnerOrReadOnly]
     # queryset = Comment.objects.all().select_related('user')
     serializer_class = serializers.CommentDetailSerializer
     lookup_url_kwarg = 'comment_id'
 
-    def get_post(self):
-        return get_object_or_404(Post, pk=self.kwargs['post_id'])
-
-    def get_serializer_context(self):
-        tmp = super().get_serializer_context()
-        tmp['post'] = self.get_post()
-        return tmp
+    def get_condition_state(self, for_update=False):
+        # every comment write bumps the post version, and the body is the comment plus its replies
+        posts = Post.objects.select_for_update() if for_update else Post.objects
+        row = posts.filter(pk=self.kwargs['post_id'], comment__pk=self.kwargs['comment_id']).values_list(
+            'version', 'last_modified').first()
+        if row is None:
+            return None
+        version, last_modified = row
+        users_version, users_changed = get_version_and_changed(users_resource())
+        return (make_etag('comment', self.kwargs['comment_id'], version, users_version),
+                max(last_modified, users_changed))
 
     def get_queryset(self):
+        # a comment of another post is a 404, and validate_parent checks against the comment's own post
         comments = Comment.objects.filter(post=self.kwargs['post_id']).order_by('-created').select_related('user',
                                                                                                            'post')
         return comments
 
+    def perform_update(self, serializer):
+        services.update_comment(serializer)
+
+    def perform_destroy(self, instance):
+        services.delete_comment(instance)
+
 # endregion
 
 # region ProfilePostListView - all post of logged-in user - url is in accounts app urls
@@ -349,13 +525,14 @@ class PostCommentDetailView(generics.RetrieveUpdateDestroyAPIView):
     tags=['Profile - post'],
     description='All user posts',
                )
-class ProfilePostListView(generics.ListCreateAPIView):
+class ProfilePostListView(ValuesListMixin, generics.ListCreateAPIView):
     serializer_class = serializers.PostSerializer
+    values_serializer_class = serializers.PostValuesSerializer
     permission_classes = [permissions.IsAuthenticated]
     def get_queryset(self):
-        return Post.objects.filter(user=self.request.user)
+        return Post.objects.filter(user=self.request.user).select_related('user').order_by('-created')
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        services.create_post(serializer, self.request.user)
 # endregion
 
 # region ProfilePostDetailView - logged-in users post (by url) - url is in accounts app urls
@@ -364,27 +541,40 @@ class ProfilePostDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.PostDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
     def get_queryset(self):
-        return Post.objects.filter(user=self.request.user)
+        return serializers.PostDetailSerializer.setup_queryset(Post.objects.filter(user=self.request.user),
+                                                               self.request)
 
     def perform_update(self, serializer):
-        serializer.save(user=self.request.user)
+        services.update_post(serializer, user=self.request.user)
+
+    def perform_destroy(self, instance):
+        services.delete_post(instance)
 # endregion
 
 # region ProfileOtherPostListView - all posts of other users - (username in url) - url is in accounts app urls
 @extend_schema(tags=['Profile others - accounts'])
-class ProfileOtherPostListView(generics.ListAPIView):
+class ProfileOtherPostListView(ValuesListMixin, generics.ListAPIView):
     serializer_class = serializers.PostSerializer
+    values_serializer_class = serializers.PostValuesSerializer
     def get_queryset(self):
-        user = get_object_or_404(User, username=self.kwargs['username'])
-        return Post.objects.filter(user = user)
+        user = get_object_or_404(User, username=self.kwargs['username'], is_active=True)
+        return Post.objects.filter(user = user).select_related('user').order_by('-created')
 # endregion
 
 # region feed - filter post by whoever is in following
-class PostFeedView(generics.ListAPIView):
+@extend_schema(
+    tags=['Posts - post'],
+    description='Posts of the users you follow, newest first or ranked by time-decayed engagement',
+    parameters=[OpenApiParameter('order', str, enum=['recent', 'ranked'], description='Default: recent'),
+                *sparse_fields.PARAMETERS],
+)
+class PostFeedView(ValuesListMixin, generics.ListAPIView):
     serializer_class = serializers.PostSerializer
+    values_serializer_class = serializers.PostValuesSerializer
+    permission_classes = [permissions.IsAuthenticated]
     def get_queryset(self):
-        following_users = Follow.objects.filter(follower=self.request.user).values_list('following', flat=True)
-        posts = Post.objects.filter(user__in = following_users).select_related('user').order_by('-created')
-        return posts
+        # timelines are filled on write (see post/timeline.py), so this is a scan of one user's entries
+        ranked = self.request.query_params.get('order') == 'ranked'
+        return get_timeline_store().feed(self.request.user, ranked=ranked)
 
 
@@ -0,0 +1,61 @@
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from accounts.authentication import CachedTokenAuthentication
+
+# DRF's APIView is sync only; under ASGI every request to it hops into the thread
+# pool. AsyncAPIView is a plain Django async view with the bits of APIView the hot
+# paths need: token authentication from the shared auth cache, an authenticated
+# check and DRF-shaped JSON errors. Reads use the async ORM; a write that needs a
+# transaction runs as one sync_to_async call, Django has no async transactions.
+# Those calls share the one thread sensitive executor, so they run one at a time.
+
+
+def json_response(data, status=200):
+    # rendered like the DRF views so both versions return the same bytes
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return HttpResponse(renderer.render(data), status=status, content_type='application/json')
+
+
+class AsyncAPIView(View):
+    authentication_class = CachedTokenAuthentication
+    require_authentication = True
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # token authenticated like APIView, so no CSRF check
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.request = request
+        authenticator = self.authentication_class()
+        try:
+            result = await authenticator.aauthenticate(request)
+        except exceptions.AuthenticationFailed as error:
+            return self.error_response(error.detail, 401, authenticator)
+        # like the DRF views only the token counts, the session user of AuthenticationMiddleware is ignored
+        request.user, request.auth = result if result is not None else (AnonymousUser(), None)
+        if self.require_authentication and not request.user.is_authenticated:
+            return self.error_response(exceptions.NotAuthenticated.default_detail, 401, authenticator)
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404 as error:
+            return json_response({'detail': str(error) or exceptions.NotFound.default_detail}, status=404)
+        except exceptions.APIException as error:
+            return json_response({'detail': error.detail}, status=error.status_code)
+
+    @staticmethod
+    def error_response(detail, status, authenticator):
+        response = json_response({'detail': detail}, status=status)
+        response['WWW-Authenticate'] = authenticator.authenticate_header(None)
+        return response
+
+    def drf_request(self):
+        # query_params and friends for helpers written against DRF, e.g. the paginator
+        return Request(self.request)
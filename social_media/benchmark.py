@@ -0,0 +1,146 @@
+import asyncio
+import json
+import platform
+import statistics
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+from django.db import connection, transaction
+
+from .instrumentation import record_queries
+
+# Shared helpers for the benchmark management commands (run_benchmarks and
+# friends). Results are plain dicts so they can be written as JSON and diffed
+# between runs with compare_reports().
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(timings, **extra):
+    timings_ms = [timing * 1000 for timing in timings]
+    return {
+        'iterations': len(timings_ms),
+        'mean_ms': round(statistics.fmean(timings_ms), 3) if timings_ms else 0.0,
+        'min_ms': round(min(timings_ms), 3) if timings_ms else 0.0,
+        'p50_ms': round(percentile(timings_ms, 0.50), 3),
+        'p90_ms': round(percentile(timings_ms, 0.90), 3),
+        'p99_ms': round(percentile(timings_ms, 0.99), 3),
+        'max_ms': round(max(timings_ms), 3) if timings_ms else 0.0,
+        **extra,
+    }
+
+
+def measure(fn, iterations=20, warmup=2, rollback=True, before=None):
+    """
+    Call `fn` repeatedly and time it. With `rollback` every call runs in a transaction
+    that is rolled back, so write endpoints can be measured without changing the dataset;
+    leave it off for reads, on SQLite every transaction takes the write lock (settings.py).
+    `fn` returns the size in bytes of what it produced (or None).
+    """
+    timings, queries, sizes = [], [], []
+    for iteration in range(warmup + iterations):
+        if before is not None:
+            before()
+        try:
+            with transaction.atomic() if rollback else nullcontext():
+                # counted inside the transaction, its BEGIN/ROLLBACK are not the endpoint's queries
+                with record_queries() as recorder:
+                    start = time.perf_counter()
+                    size = fn()
+                    elapsed = time.perf_counter() - start
+                if rollback:
+                    raise Rollback
+        except Rollback:
+            pass
+        if iteration >= warmup:
+            timings.append(elapsed)
+            queries.append(recorder.count)
+            sizes.append(size or 0)
+    return summarize(
+        timings,
+        queries=int(statistics.median(queries)) if queries else 0,
+        bytes=int(statistics.median(sizes)) if sizes else 0,
+    )
+
+
+async def asgi_request(app, method, path, headers=None, body=b''):
+    """
+    Send one HTTP request straight to an ASGI application (e.g. social_media.asgi.application)
+    the way an ASGI server would, returns (status, body size).
+    """
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': method.upper(), 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'root_path': '', 'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+        'headers': [(b'host', b'testserver'), (b'content-type', b'application/json')]
+                   + [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            # the request is complete, block like a client that keeps the connection open
+            await asyncio.Event().wait()
+        received = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    response = {'status': None, 'size': 0}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['size'] += len(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return response['status'], response['size']
+
+
+def build_report(results, label='', **meta):
+    return {
+        'meta': {
+            'label': label,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            **meta,
+        },
+        'results': results,
+    }
+
+
+def write_report(report, path):
+    with open(path, 'w') as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+
+
+def compare_reports(baseline, current, metric='p50_ms'):
+    """Per scenario change of `metric` (and query count) between two reports."""
+    rows = []
+    for name, result in sorted(current['results'].items()):
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        old, new = before.get(metric, 0), result.get(metric, 0)
+        rows.append({
+            'name': name,
+            'before': old,
+            'after': new,
+            'change': round((new - old) / old * 100, 1) if old else None,
+            'queries_before': before.get('queries'),
+            'queries_after': result.get('queries'),
+        })
+    return rows
@@ -0,0 +1,19 @@
+from django.db import IntegrityError, router, transaction
+
+
+def insert_ignore(model, using=None, **values):
+    """
+    Insert one row and return False instead of raising if it violates a unique
+    constraint. Returns True when this call inserted the row.
+
+    Unlike get_or_create there is no SELECT first: the INSERT runs in its own
+    savepoint, so of two concurrent callers exactly one gets True and the other's
+    IntegrityError only rolls back that savepoint, not the caller's transaction.
+    """
+    using = using or router.db_for_write(model)
+    try:
+        with transaction.atomic(using=using):
+            model(**values).save(force_insert=True, using=using)
+    except IntegrityError:
+        return False
+    return True
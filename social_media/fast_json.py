@@ -0,0 +1,72 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# DRF's JSON renderer and parser on top of orjson, when it is installed, with the
+# stdlib json DRF uses as the fallback. Selected in REST_FRAMEWORK's
+# DEFAULT_RENDERER_CLASSES / DEFAULT_PARSER_CLASSES.
+#
+# The output matches JSONRenderer's: compact, UTF-8, U+2028/U+2029 escaped, and
+# every type orjson does not handle the same way (datetime, date, time, Decimal,
+# lazy strings, querysets...) goes through DRF's JSONEncoder.default, so e.g. a
+# datetime still becomes '2024-01-01T10:00:00.123456Z'. Only the spelling of some
+# floats differs ('0.00001' instead of '1e-05'). Indented output (the browsable
+# API), integers beyond 64 bits and FAST_JSON = {'ENABLED': False} use the stdlib path;
+# the parser reads such integers as floats.
+
+DEFAULT_FAST_JSON = {
+    'ENABLED': True,
+}
+
+
+def get_config():
+    return {**DEFAULT_FAST_JSON, **getattr(settings, 'FAST_JSON', {})}
+
+
+def is_enabled():
+    return orjson is not None and get_config()['ENABLED']
+
+
+_encoder = JSONEncoder()
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not is_enabled() or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # like JSONRenderer, keep the output safe to embed in a <script>
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if not is_enabled():
+            return super().parse(stream, media_type, parser_context)
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                data = data.decode(encoding)
+            return orjson.loads(data)
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
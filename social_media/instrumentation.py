@@ -0,0 +1,244 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from drf_spectacular.utils import extend_schema
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_INSTRUMENTATION = {
+    'ENABLED': True,
+    # the X-Query-* headers show internals, development only
+    'HEADERS': False,
+    # the same SQL shape running this many times with different parameters is an N+1
+    'N_PLUS_ONE_THRESHOLD': 3,
+    # raise QueryBudgetExceeded instead of logging, meant for test settings
+    'STRICT_BUDGETS': False,
+    # url name -> {method: max queries per request}, views can also set a `query_budget` dict
+    'BUDGETS': {},
+}
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+NUMBER_RE = re.compile(r'(?<![\w."])\d+(?:\.\d+)?(?![\w"])')
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+SPACE_RE = re.compile(r'\s+')
+
+
+def get_config():
+    return {**DEFAULT_QUERY_INSTRUMENTATION, **getattr(settings, 'QUERY_INSTRUMENTATION', {})}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalize_sql(sql):
+    # parameters are already placeholders; also fold literals and variable length IN lists
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()[:12]
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that records every statement of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.params = defaultdict(set)
+        self.samples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            key = fingerprint(sql)
+            self.shapes[key] += 1
+            self.samples.setdefault(key, sql)
+            try:
+                self.params[key].add(repr(params))
+            except Exception:
+                pass
+
+    def repeated(self):
+        return {key: count for key, count in self.shapes.items() if count > 1}
+
+    def n_plus_one(self, threshold):
+        return {key: count for key, count in self.shapes.items()
+                if count >= threshold and len(self.params[key]) > 1}
+
+
+class QueryStats:
+    """Per view aggregates of this process, served by QueryStatsView."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+
+    def record(self, view_name, recorder, n_plus_one, over_budget):
+        with self._lock:
+            stats = self.views.setdefault(view_name, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0,
+                'n_plus_one_requests': 0, 'over_budget_requests': 0, 'n_plus_one': {},
+            })
+            stats['requests'] += 1
+            stats['queries'] += recorder.count
+            stats['max_queries'] = max(stats['max_queries'], recorder.count)
+            stats['db_ms'] += recorder.duration * 1000
+            stats['over_budget_requests'] += over_budget
+            if n_plus_one:
+                stats['n_plus_one_requests'] += 1
+                for key, count in n_plus_one.items():
+                    shape = stats['n_plus_one'].setdefault(key, {'sql': normalize_sql(recorder.samples[key]),
+                                                                 'requests': 0, 'max_per_request': 0})
+                    shape['requests'] += 1
+                    shape['max_per_request'] = max(shape['max_per_request'], count)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    **stats,
+                    'avg_queries': round(stats['queries'] / stats['requests'], 2),
+                    'avg_db_ms': round(stats['db_ms'] / stats['requests'], 3),
+                    'db_ms': round(stats['db_ms'], 3),
+                    'n_plus_one': dict(stats['n_plus_one']),
+                }
+                for name, stats in self.views.items()
+            }
+
+
+query_stats = QueryStats()
+
+
+def install_recorder(recorder):
+    """Wrap the connections of the current thread, closing the returned ExitStack removes the wrappers."""
+    stack = ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(recorder))
+    return stack
+
+
+@contextmanager
+def record_queries():
+    recorder = QueryRecorder()
+    with install_recorder(recorder):
+        yield recorder
+
+
+def get_budget(request, config):
+    match = request.resolver_match
+    if match is None:
+        return None
+    view_class = getattr(match.func, 'view_class', None) or getattr(match.func, 'cls', None)
+    budgets = config['BUDGETS'].get(match.view_name, getattr(view_class, 'query_budget', None)) or {}
+    return budgets.get(request.method)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records query count, DB time and repeated SQL shapes per request.
+
+    Adds X-Query-Count / X-Query-Time-Ms / X-Query-Repeated / X-N-Plus-One headers,
+    aggregates per view for QueryStatsView and enforces per-view query budgets.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_config()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        return self.process(request, response, recorder)
+
+    async def __acall__(self, request):
+        # connections are per thread and the ORM runs this request's queries in its
+        # thread sensitive executor, so the wrappers have to be installed there
+        recorder = QueryRecorder()
+        stack = await sync_to_async(install_recorder)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.process(request, response, recorder)
+
+    def process(self, request, response, recorder):
+        # read per request, so tests can switch on STRICT_BUDGETS with override_settings
+        config = get_config()
+        match = request.resolver_match
+        view_name = match.view_name if match is not None else request.path
+        n_plus_one = recorder.n_plus_one(config['N_PLUS_ONE_THRESHOLD'])
+        budget = get_budget(request, config)
+        over_budget = budget is not None and recorder.count > budget
+        query_stats.record(view_name, recorder, n_plus_one, over_budget)
+
+        if config['HEADERS']:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Time-Ms'] = f'{recorder.duration * 1000:.3f}'
+            response['X-Query-Repeated'] = str(len(recorder.repeated()))
+            response['X-N-Plus-One'] = str(len(n_plus_one))
+        if n_plus_one:
+            logger.warning('Possible N+1 in %s: %s', view_name, '; '.join(
+                f'{count}x {normalize_sql(recorder.samples[key])}' for key, count in n_plus_one.items()))
+        if over_budget:
+            message = f'{request.method} {view_name} ran {recorder.count} queries, its budget is {budget}'
+            if config['STRICT_BUDGETS']:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+@contextmanager
+def query_budget(limit):
+    """Fail with QueryBudgetExceeded when the block runs more than `limit` queries, for tests."""
+    with record_queries() as recorder:
+        yield recorder
+    if recorder.count > limit:
+        raise QueryBudgetExceeded(f'{recorder.count} queries, the budget is {limit}')
+
+
+@extend_schema(tags=['Stats'], description='Per view query statistics of this process (admin only)')
+class QueryStatsView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+    pagination_class = None
+
+    def get(self, request):
+        return Response(query_stats.snapshot())
+
+    def delete(self, request):
+        query_stats.reset()
+        return Response(status=204)
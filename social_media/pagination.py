@@ -0,0 +1,165 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over the full ordering of the queryset (e.g. `(created, id)`).
+
+    DRF's CursorPagination keys on the first ordering field only and falls back to
+    an OFFSET for ties. Here the cursor carries the values of every ordering field,
+    the primary key is always appended as a tie-breaker, and each page is a plain
+    `WHERE (a, b) < (x, y) ORDER BY a, b LIMIT n` - so page 1000 costs the same as
+    page 1 and no COUNT(*) is ever issued.
+
+    The ordering is taken from the queryset after filtering, so `?ordering=` from
+    OrderingFilter keeps working; a cursor built for one ordering is rejected for
+    another.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, the page is fetched with the async ORM."""
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page([row async for row in page_queryset])
+
+    def get_paginated_data(self, data):
+        return {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+
+    def get_page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = bool(self.cursor and self.cursor['r'])
+        queryset = queryset.order_by(*(self._invert(self.ordering) if reverse else self.ordering))
+        if self.cursor:
+            try:
+                queryset = queryset.filter(self.keyset_filter(self.cursor['v'], reverse))
+            except (TypeError, ValueError, ValidationError):
+                # values of the wrong type for their column, a forged cursor
+                raise NotFound(self.invalid_cursor_message)
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if self.cursor and self.cursor['r']:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        ordering = (ordering or list(getattr(view, 'ordering', None) or ())
+                    or list(queryset.model._meta.ordering) or list(self.ordering))
+        ordering = ['-id' if field == '-pk' else 'id' if field == 'pk' else field for field in ordering]
+        if not {'id', '-id'} & set(ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return tuple(ordering)
+
+    def keyset_filter(self, values, reverse):
+        # (a, b, c) > (x, y, z)  ==  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor({'v': self._values(self.page[-1]), 'r': False})
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor({'v': self._values(self.page[0]), 'r': True})
+
+    def get_link_after(self, url, ordering, row):
+        """Link to the page of `url` that follows `row`, e.g. to continue a list embedded in another response."""
+        self.base_url, self.ordering = url, tuple(ordering)
+        return self.encode_cursor({'v': self._values(row), 'r': False})
+
+    def encode_cursor(self, cursor):
+        payload = {'o': self.ordering, 'v': [self._dump(value) for value in cursor['v']], 'r': cursor['r']}
+        encoded = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()))
+            if tuple(payload['o']) != self.ordering or len(payload['v']) != len(self.ordering):
+                raise ValueError
+            return {'v': [self._load(value) for value in payload['v']], 'r': bool(payload['r'])}
+        except (TypeError, ValueError, KeyError, InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _values(self, row):
+        values = []
+        for field in self.ordering:
+            value = row
+            for attr in field.lstrip('-').split('__'):
+                value = value[attr] if isinstance(value, dict) else getattr(value, attr)
+            values.append(value)
+        return values
+
+    @staticmethod
+    def _invert(ordering):
+        return [field[1:] if field.startswith('-') else '-' + field for field in ordering]
+
+    @staticmethod
+    def _dump(value):
+        if isinstance(value, datetime):
+            return ['dt', value.isoformat()]
+        if isinstance(value, date):
+            return ['d', value.isoformat()]
+        if isinstance(value, Decimal):
+            return ['dec', str(value)]
+        return value
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, list):
+            kind, raw = value
+            parsed = {'dt': parse_datetime, 'd': parse_date, 'dec': Decimal}[kind](raw)
+            if parsed is None:
+                raise ValueError
+            return parsed
+        if value is None:
+            raise ValueError
+        return value
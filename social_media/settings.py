@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'social_media.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,10 +88,59 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # SQLite only. Take the write lock at BEGIN and wait for it, instead of failing
+            # with "database is locked" when two transactions upgrade from read to write.
+            # The cost: every atomic() block takes the write lock, read-only ones too, and
+            # holds it to the end, so only writes go in atomic() (post/services.py,
+            # accounts/services.py, the If-Match update in post/conditional.py) and reads
+            # never do, benchmarks included (social_media/benchmark.py measure(rollback=)).
+            # Drop it with the move to Postgres.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # a file, not the shared in-memory database: the concurrency tests write from
+        # several threads and in-memory tables lock without waiting for the timeout
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'responses' holds rendered anonymous reads (post/cache.py). Swap the backend for
+# 'django.core.cache.backends.filebased.FileBasedCache' or
+# 'django.core.cache.backends.redis.RedisCache' to share it between processes.
+# 'shared' holds what every worker process must see the same: the versions that
+# retire in-process copies of tokens and follow lists. Use Redis in production.
+# The file backend unpickles whatever it finds in its directory, so that must be
+# private to the app: SHARED_CACHE_DIR or .cache/shared in the project, never a
+# shared temp directory.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SHARED_CACHE_DIR', BASE_DIR / '.cache' / 'shared'),
+    },
+}
+
+RESPONSE_CACHE = {
+    'CACHE_ALIAS': 'responses',
+    'TIMEOUT': 300,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -135,8 +186,122 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
-    )
+        'accounts.authentication.CachedTokenAuthentication',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'social_media.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+    # orjson when installed, stdlib json otherwise, see social_media/fast_json.py
+    'DEFAULT_RENDERER_CLASSES': (
+        'social_media.fast_json.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'social_media.fast_json.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+}
+
+FAST_JSON = {
+    'ENABLED': True,
+}
+
+# Token -> user lookups cached in-process and in the Django cache, see accounts/authentication.py
+TOKEN_AUTH_CACHE = {
+    'CACHE_ALIAS': 'shared',
+    'TIMEOUT': 300,
+    'LOCAL_MAXSIZE': 1024,
+    'LOCAL_TIMEOUT': 30,
+}
+
+# Per request query counting, N+1 detection and budgets, see social_media/instrumentation.py.
+# Set STRICT_BUDGETS to True in test settings so a view going over its budget fails the test.
+QUERY_INSTRUMENTATION = {
+    'ENABLED': True,
+    'HEADERS': DEBUG,
+    'N_PLUS_ONE_THRESHOLD': 3,
+    'STRICT_BUDGETS': False,
+    # the most queries any path of the view ran in the QueryBudgetTests of post/tests.py and
+    # accounts/tests.py, which run with STRICT_BUDGETS: cold caches, token and follow graph
+    # included, ?expand= (two follow flag queries), If-Match (the row is read for update and
+    # the new ETag read after) and an author with followers. Likes and comments include
+    # creating the post's trending bucket (post/trending.py), two more. A new post fans out
+    # with one INSERT per TIMELINE batch_size followers, the budget allows one batch
+    'BUDGETS': {
+        'post-list': {'GET': 4, 'POST': 6},
+        'post-detail': {'GET': 7, 'PUT': 12, 'PATCH': 12, 'DELETE': 7},
+        'post-feed': {'GET': 4},
+        'post-trending': {'GET': 5},
+        'post-like': {'POST': 13, 'DELETE': 10},
+        'post-bulk-like': {'POST': 11, 'DELETE': 10},
+        'comment-list': {'GET': 3, 'POST': 15},
+        'comment-threads': {'GET': 4},
+        'comment-replies': {'GET': 3},
+        'comment-detail': {'GET': 4, 'PUT': 8, 'PATCH': 8, 'DELETE': 11},
+        'async-post-feed': {'GET': 2},
+        'async-post-like': {'POST': 13, 'DELETE': 10},
+        'signup': {'POST': 3},
+        'auth_token': {'POST': 5},
+        'logout': {'POST': 5},
+        'profile': {'GET': 1, 'PUT': 6, 'PATCH': 6},
+        'profile_other': {'GET': 4},
+        'profile_follower': {'GET': 6},
+        'profile_following': {'GET': 6},
+        'profile_export': {'GET': 5},
+        'profile_delete': {'DELETE': 9},
+        'change_password': {'PATCH': 6},
+        'follow': {'POST': 11, 'DELETE': 7},
+        'async-follow': {'POST': 11, 'DELETE': 7},
+        'follow_suggestions': {'GET': 2},
+    },
+}
+
+
+# In-process follow graph cache, see accounts/graph.py. Versions live in CACHE_ALIAS,
+# which must be shared by all worker processes (e.g. Redis) in production.
+FOLLOW_GRAPH = {
+    'CACHE_ALIAS': 'shared',
+    'MAXSIZE': 10000,
+    'TIMEOUT': 300,
+}
+
+# "Who to follow", see accounts/suggestions.py and the compute_follow_suggestions command
+FOLLOW_SUGGESTIONS = {
+    'LIMIT': 50,
+    'HIGH_DEGREE_CAP': 1000,
+    'BATCH_SIZE': 500,
+}
+
+# Ranked feed (?order=ranked), see post/ranking.py. Run reconcile_post_counters --scores after changing it.
+FEED_RANKING = {
+    'LIKE_WEIGHT': 1.0,
+    'COMMENT_WEIGHT': 2.0,
+    'GRAVITY': 45000,
+}
+
+# Sliding-window trending posts, see post/trending.py
+TRENDING = {
+    'BUCKET_SECONDS': 300,
+    'WINDOWS': [1, 6, 24],
+    'DEFAULT_WINDOW': 24,
+    'TOP_K': 50,
+    'REFRESH_SECONDS': 60,
+}
+
+# Deleted posts and accounts are hidden at once and removed in batches by
+# `manage.py process_deletions`, see post/deletion.py
+DELETION = {
+    'BATCH_SIZE': 500,
+    'LEASE_SECONDS': 300,
+    'MAX_ATTEMPTS': 5,
+}
+
+# Fan-out-on-write feed timelines, see post/timeline.py
+TIMELINE = {
+    'BACKEND': 'post.timeline.DatabaseTimelineStore',
+    'OPTIONS': {
+        'depth': 800,
+    },
 }
 
 SPECTACULAR_SETTINGS = {
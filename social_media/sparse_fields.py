@@ -0,0 +1,72 @@
+from django.utils.module_loading import import_string
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.permissions import SAFE_METHODS
+
+# Sparse fieldsets and expansion for read requests, shared by the post and
+# account serializers:
+#
+#   ?fields=title,user   only these top-level fields are rendered
+#   ?expand=user         a field listed in Meta.expandable_fields is rendered with
+#                        the nested serializer given there instead of its default
+#                        (e.g. the author's profile instead of the username)
+#
+# A dropped field is removed from the serializer, so its method or nested
+# serializer never runs; views call wants_field() to also leave out the joins
+# and prefetches behind it. Writes always get the full serializer.
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+PARAMETERS = [
+    OpenApiParameter(FIELDS_PARAM, str, description='Comma separated fields to return, default all'),
+    OpenApiParameter(EXPAND_PARAM, str, description='Comma separated fields to return as nested objects'),
+]
+
+
+def _names(request, param):
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    value = request.GET.get(param)
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def requested_fields(request):
+    """The names in ?fields=, None when the client did not ask for a subset."""
+    return _names(request, FIELDS_PARAM)
+
+
+def expanded_fields(request):
+    return _names(request, EXPAND_PARAM) or set()
+
+
+def wants_field(request, name):
+    fields = requested_fields(request)
+    return fields is None or name in fields
+
+
+def wants_expanded(request, name):
+    return wants_field(request, name) and name in expanded_fields(request)
+
+
+class SparseFieldsMixin:
+    """
+    Applies ?fields= and ?expand= of the request in the context. Only the serializer
+    the view creates is affected (nested serializers are built without a context).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = requested_fields(request)
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in expanded_fields(request) & set(expandable) & set(self.fields):
+            serializer_class = expandable[name]
+            if isinstance(serializer_class, str):
+                serializer_class = import_string(serializer_class)
+            source = self.fields[name].source
+            self.fields[name] = serializer_class(read_only=True, **({} if source == name else {'source': source}))
@@ -0,0 +1,80 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.test import override_settings
+from rest_framework import test
+
+# Shared base of the app test suites (post/tests.py, accounts/tests.py). Every
+# cache these tests touch is process local or per test, so one test's cached
+# responses, tokens or follow graph never leak into the next.
+
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+    for alias in ('default', 'responses', 'shared')
+}
+
+
+def reset_caches():
+    from accounts.authentication import get_local_cache
+    from accounts.graph import get_follow_graph
+
+    for cache in caches.all():
+        cache.clear()
+    get_local_cache().clear()
+    get_follow_graph().clear()
+
+
+def strict_budgets():
+    """override_settings that fails the request running over its QUERY_INSTRUMENTATION budget."""
+    return override_settings(QUERY_INSTRUMENTATION={**getattr(settings, 'QUERY_INSTRUMENTATION', {}),
+                                                    'STRICT_BUDGETS': True})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class APITestCase(test.APITestCase):
+    def setUp(self):
+        super().setUp()
+        reset_caches()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class APITransactionTestCase(test.APITransactionTestCase):
+    # for tests whose requests run on other threads, each with its own connection
+    def setUp(self):
+        super().setUp()
+        reset_caches()
+
+
+def run_concurrently(requests, threads=8):
+    """
+    Send `requests` [(method, url, token key)] from `threads` threads that start
+    together, returns the status codes and the exceptions the requests raised.
+    """
+    statuses, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(chunk):
+        client = test.APIClient()
+        try:
+            barrier.wait()
+            for method, url, key in chunk:
+                try:
+                    status = getattr(client, method)(url, HTTP_AUTHORIZATION=f'Token {key}').status_code
+                except Exception as error:
+                    with lock:
+                        errors.append(error)
+                else:
+                    with lock:
+                        statuses.append(status)
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=worker, args=(requests[index::threads],)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return statuses, errors